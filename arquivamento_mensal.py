@@ -0,0 +1,213 @@
+import os
+import sqlite3
+from datetime import date
+
+from conexao_banco import TEMPO_ESPERA_LOCK, obter_conexao
+from ingestao_txt import BANCO_LEITURAS, tabela_existe
+from migracoes import COLUNA_DATA_ISO, tabela_alteracoes
+
+# Pasta dos bancos de arquivo mensal (um banco por mês: banco_dados_AAAA_MM.db)
+PASTA_ARQUIVO_MENSAL = 'banco_dados_arquivo'
+
+# Tabelas arquivadas e a coluna de data de cada uma
+TABELAS_ARQUIVADAS = {
+    'dados_placa_geral': 'dt_data',
+    'placas_completas_slu_bh': 'data',
+}
+
+# Mês ('AAAA-MM') e filtro de um mês pela data normalizada (data_iso), que
+# aceita DD/MM/AAAA e os demais formatos gravados na coluna de data; o
+# filtro é uma faixa, para usar o índice de data_iso
+MES_DATA_ISO = f"substr({COLUNA_DATA_ISO}, 1, 7)"
+FILTRO_MES = f"{COLUNA_DATA_ISO} >= ? || '-01' AND {COLUNA_DATA_ISO} < date(? || '-01', '+1 month')"
+
+
+def caminho_arquivo_mes(mes, pasta=PASTA_ARQUIVO_MENSAL):
+    """
+    Caminho do banco de arquivo do mês ('AAAA-MM').
+    """
+    return os.path.join(pasta, f"banco_dados_{mes.replace('-', '_')}.db")
+
+
+def listar_meses_banco(conn):
+    """
+    Conta as linhas de cada tabela arquivada por mês ('AAAA-MM') da data
+    normalizada (data_iso). Linhas com data que não pode ser normalizada
+    ficam com mês None e nunca são arquivadas.
+    Retorna lista de (tabela, mes, linhas).
+    """
+    meses = []
+    for tabela in TABELAS_ARQUIVADAS:
+        if not tabela_existe(conn, tabela):
+            continue
+        meses.extend(
+            (tabela, mes, linhas)
+            for mes, linhas in conn.execute(f"""
+                SELECT {MES_DATA_ISO} AS mes, COUNT(*)
+                FROM {tabela}
+                GROUP BY mes
+                ORDER BY mes""")
+        )
+    return meses
+
+
+def listar_arquivos_mensais(pasta=PASTA_ARQUIVO_MENSAL):
+    """
+    Retorna a lista ordenada de (mes, caminho) dos bancos de arquivo existentes.
+    """
+    if not os.path.isdir(pasta):
+        return []
+    arquivos = []
+    for nome in sorted(os.listdir(pasta)):
+        if nome.startswith('banco_dados_') and nome.endswith('.db'):
+            ano, _, mes = nome[len('banco_dados_'):-len('.db')].partition('_')
+            arquivos.append((f"{ano}-{mes}", os.path.join(pasta, nome)))
+    return arquivos
+
+
+def _preparar_tabela_arquivo(conn, caminho_arquivo, tabela):
+    """
+    Cria no banco de arquivo a tabela com a mesma estrutura do banco principal
+    e acrescenta colunas que tenham sido criadas depois no principal.
+    """
+    sql_tabela = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                              (tabela,)).fetchone()[0]
+    colunas = conn.execute(f"PRAGMA main.table_info({tabela})").fetchall()
+
+    conn_arquivo = sqlite3.connect(caminho_arquivo, timeout=TEMPO_ESPERA_LOCK)
+    try:
+        if not tabela_existe(conn_arquivo, tabela):
+            conn_arquivo.execute(sql_tabela)
+        existentes = {coluna[1] for coluna in conn_arquivo.execute(f"PRAGMA table_info({tabela})")}
+        for _, nome, tipo, _, _, _ in colunas:
+            if nome not in existentes:
+                conn_arquivo.execute(f"ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}")
+        conn_arquivo.commit()
+    finally:
+        conn_arquivo.close()
+    return [coluna[1] for coluna in colunas]
+
+
+def _ultimo_seq_alteracoes(conn, tabela):
+    linha = conn.execute("SELECT seq FROM main.sqlite_sequence WHERE name = ?",
+                         (tabela_alteracoes(tabela),)).fetchone() if tabela_existe(conn, 'sqlite_sequence') else None
+    return linha[0] if linha else 0
+
+
+def fechar_mes(mes_ativo, caminho_banco=BANCO_LEITURAS, pasta=PASTA_ARQUIVO_MENSAL, compactar=True):
+    """
+    Fechamento do mês: move para os bancos de arquivo mensal todas as linhas de
+    dados_placa_geral e placas_completas_slu_bh anteriores ao mês ativo ('AAAA-MM').
+    Cada mês é copiado (mantendo o id) e apagado do banco principal na mesma
+    transação; repetir o fechamento não duplica linhas no arquivo.
+    O registro 'arquivos' continua no banco principal, para que os TXT já
+    processados não sejam gravados de novo.
+    As exclusões feitas pelo fechamento são retiradas do registro de
+    alterações, para a sincronização não apagá-las do banco completo.
+    Retorna lista de (mes, tabela, linhas movidas).
+    """
+    os.makedirs(pasta, exist_ok=True)
+    movidos = []
+
+    conn = obter_conexao(caminho_banco, isolation_level=None)
+    try:
+        meses = sorted({mes for _, mes, _ in listar_meses_banco(conn) if mes and mes < mes_ativo})
+        for mes in meses:
+            caminho_arquivo = caminho_arquivo_mes(mes, pasta)
+            tabelas = {tabela: _preparar_tabela_arquivo(conn, caminho_arquivo, tabela)
+                       for tabela in TABELAS_ARQUIVADAS if tabela_existe(conn, tabela)}
+
+            conn.execute("ATTACH DATABASE ? AS arquivo_mes", (caminho_arquivo,))
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for tabela, colunas in tabelas.items():
+                        ultimo_seq = _ultimo_seq_alteracoes(conn, tabela)
+                        lista_colunas = ", ".join(colunas)
+                        conn.execute(f"""INSERT OR IGNORE INTO arquivo_mes.{tabela} ({lista_colunas})
+                                         SELECT {lista_colunas} FROM main.{tabela} WHERE {FILTRO_MES}""",
+                                     (mes, mes))
+                        linhas = conn.execute(f"DELETE FROM main.{tabela} WHERE {FILTRO_MES}",
+                                              (mes, mes)).rowcount
+                        if tabela_existe(conn, tabela_alteracoes(tabela)):
+                            conn.execute(f"DELETE FROM main.{tabela_alteracoes(tabela)} "
+                                         f"WHERE seq > ? AND operacao = 'D'", (ultimo_seq,))
+                        if linhas:
+                            movidos.append((mes, tabela, linhas))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.execute("DETACH DATABASE arquivo_mes")
+
+        if movidos and compactar:
+            # Devolve ao sistema o espaço das linhas movidas
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+    return movidos
+
+
+def anexar_arquivos_mensais(conn, meses=None, pasta=PASTA_ARQUIVO_MENSAL):
+    """
+    Anexa à conexão, somente para leitura, os bancos de arquivo dos meses
+    informados (todos, se None), com os nomes arq_AAAA_MM. A conexão precisa
+    ter sido aberta com uri=True.
+    Cria também as views temporárias historico_<tabela>, que juntam o banco
+    principal e os meses anexados.
+    Retorna a lista dos nomes anexados.
+    """
+    arquivos = [(mes, caminho) for mes, caminho in listar_arquivos_mensais(pasta)
+                if meses is None or mes in meses]
+    limite = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(arquivos) > limite:
+        raise ValueError(f"É possível anexar no máximo {limite} meses por conexão; "
+                         f"selecione os meses desejados ({len(arquivos)} pedidos).")
+
+    anexados = []
+    for mes, caminho in arquivos:
+        nome = f"arq_{mes.replace('-', '_')}"
+        uri = f"file:{os.path.abspath(caminho)}?mode=ro"
+        conn.execute("ATTACH DATABASE ? AS " + nome, (uri,))
+        anexados.append(nome)
+
+    for tabela in TABELAS_ARQUIVADAS:
+        esquemas = ['main'] if tabela_existe(conn, tabela) else []
+        esquemas += [nome for nome in anexados
+                     if conn.execute(f"SELECT 1 FROM {nome}.sqlite_master WHERE type = 'table' AND name = ?",
+                                     (tabela,)).fetchone()]
+        if not esquemas:
+            continue
+        # Colunas comuns a todos os bancos (arquivos antigos podem ter menos colunas)
+        comuns = None
+        for esquema in esquemas:
+            colunas = [coluna[1] for coluna in conn.execute(f"PRAGMA {esquema}.table_info({tabela})")]
+            comuns = colunas if comuns is None else [c for c in comuns if c in colunas]
+        lista_colunas = ", ".join(comuns)
+        uniao = " UNION ALL ".join(f"SELECT {lista_colunas} FROM {esquema}.{tabela}" for esquema in esquemas)
+        conn.execute(f"DROP VIEW IF EXISTS temp.historico_{tabela}")
+        conn.execute(f"CREATE TEMP VIEW historico_{tabela} AS {uniao}")
+    return anexados
+
+
+def abrir_conexao_historico(meses=None, caminho_banco=BANCO_LEITURAS, pasta=PASTA_ARQUIVO_MENSAL):
+    """
+    Abre o banco principal e os bancos de arquivo mensal somente para leitura,
+    com as views historico_dados_placa_geral e historico_placas_completas_slu_bh.
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(caminho_banco)}?mode=ro", uri=True,
+                           timeout=TEMPO_ESPERA_LOCK)
+    try:
+        anexar_arquivos_mensais(conn, meses, pasta)
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+def mes_atual():
+    """
+    Mês corrente no formato 'AAAA-MM'.
+    """
+    return date.today().strftime('%Y-%m')
@@ -0,0 +1,145 @@
+import os
+import sqlite3
+import threading
+
+from migracoes import MIGRACOES_COMPLETO, MIGRACOES_PRINCIPAL, aplicar_migracoes
+
+# Bancos usados pelo aplicativo (o registro de arquivos fica em banco_dados.db)
+BANCO_PRINCIPAL = 'banco_dados.db'
+BANCO_COMPLETO = os.path.join('banco_dados_completo', 'banco_dados.db')
+
+# Tempo (s) que uma conexão espera por um lock antes de desistir
+TEMPO_ESPERA_LOCK = 30
+
+# Ajustes aplicados a toda conexão aberta pelo aplicativo
+PRAGMAS_CONEXAO = (
+    "PRAGMA journal_mode=WAL",          # leitores não bloqueiam quem grava (e vice-versa)
+    "PRAGMA synchronous=NORMAL",        # seguro com WAL e bem mais rápido que FULL
+    "PRAGMA cache_size=-65536",         # 64 MB de cache de páginas
+    "PRAGMA mmap_size=268435456",       # até 256 MB do arquivo mapeados em memória
+    "PRAGMA temp_store=MEMORY",         # ordenações e tabelas temporárias em memória
+)
+
+# Conexões ociosas mantidas por banco em cada processo
+MAX_CONEXOES_LIVRES = 4
+
+
+class ConexaoReutilizavel(sqlite3.Connection):
+    """
+    Conexão SQLite do pool do processo. close() não fecha: desfaz o que
+    ficou sem commit e devolve a conexão ao pool para a próxima chamada.
+    """
+
+    def close(self):
+        pool = getattr(self, 'pool', None)
+        if pool is None:
+            super().close()
+        else:
+            self.pool = None
+            pool.devolver(self)
+
+    def fechar_definitivamente(self):
+        self.pool = None
+        super().close()
+
+
+class PoolConexoes:
+    """
+    Conexões ociosas de um banco. Cada conexão é usada por uma chamada de cada
+    vez (obter -> close), mesmo vindo de threads diferentes do Streamlit.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.livres = []
+        self.trava = threading.Lock()
+        # As migrações são conferidas só na primeira conexão do processo
+        self.migrado = False
+
+    def obter(self, isolation_level=''):
+        with self.trava:
+            conn = self.livres.pop() if self.livres else None
+        if conn is None:
+            conn = abrir_conexao(self.caminho, migrar=not self.migrado,
+                                 factory=ConexaoReutilizavel, check_same_thread=False)
+            self.migrado = True
+        conn.isolation_level = isolation_level
+        conn.pool = self
+        return conn
+
+    def devolver(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, nome, _ in conn.execute("PRAGMA database_list").fetchall():
+                if nome not in ('main', 'temp'):
+                    conn.execute(f"DETACH DATABASE {nome}")
+            conn.row_factory = None
+            conn.text_factory = str
+            conn.isolation_level = ''
+        except sqlite3.Error:
+            conn.fechar_definitivamente()
+            return
+
+        with self.trava:
+            if len(self.livres) < MAX_CONEXOES_LIVRES:
+                self.livres.append(conn)
+                return
+        conn.fechar_definitivamente()
+
+
+_pools = {}
+_trava_pools = threading.Lock()
+
+
+def configurar_conexao(conn):
+    """
+    Aplica WAL, cache, mmap e temp_store à conexão.
+    """
+    for pragma in PRAGMAS_CONEXAO:
+        conn.execute(pragma)
+    return conn
+
+
+def migracoes_do_banco(caminho):
+    """
+    Lista de migrações do banco (principal ou completo), ou None para outros bancos.
+    """
+    caminho = os.path.abspath(caminho)
+    if caminho == os.path.abspath(BANCO_PRINCIPAL):
+        return MIGRACOES_PRINCIPAL
+    if caminho == os.path.abspath(BANCO_COMPLETO):
+        return MIGRACOES_COMPLETO
+    return None
+
+
+def abrir_conexao(caminho=BANCO_PRINCIPAL, migrar=True, **kwargs):
+    """
+    Abre uma conexão nova e ajustada (fora do pool). Use para scripts e para
+    conexões que ficam abertas por muito tempo.
+    Com migrar=True, aplica as migrações pendentes do banco principal ou completo.
+    """
+    pasta = os.path.dirname(caminho)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+    kwargs.setdefault('timeout', TEMPO_ESPERA_LOCK)
+    conn = configurar_conexao(sqlite3.connect(caminho, **kwargs))
+    migracoes = migracoes_do_banco(caminho) if migrar else None
+    if migracoes:
+        aplicar_migracoes(conn, migracoes)
+    return conn
+
+
+def obter_conexao(caminho=BANCO_PRINCIPAL, isolation_level=''):
+    """
+    Retorna uma conexão ajustada do pool do processo (uma por chamada, reaproveitada
+    entre chamadas e entre sessões do Streamlit). Feche com close() como de costume:
+    a conexão volta para o pool.
+    isolation_level=None deixa as transações por conta de quem chama (BEGIN/COMMIT).
+    """
+    chave = os.path.abspath(caminho)
+    with _trava_pools:
+        pool = _pools.get(chave)
+        if pool is None:
+            pool = _pools[chave] = PoolConexoes(chave)
+    return pool.obter(isolation_level)
@@ -0,0 +1,137 @@
+import itertools
+import sqlite3
+import threading
+import time
+
+# Limites padrão das consultas do console SQL (página 1)
+TEMPO_LIMITE_PADRAO = 10        # segundos
+LIMITE_LINHAS_PADRAO = 1000
+TAMANHO_LOTE = 200              # linhas lidas por fetchmany
+
+# A cada quantas instruções da VM do SQLite o tempo e o cancelamento são conferidos
+INSTRUCOES_POR_VERIFICACAO = 1000
+
+# Consultas em execução no processo: {id: {'sql', 'inicio', 'cancelar'}}.
+# Qualquer sessão pode cancelar uma consulta que esteja travando o aplicativo.
+CONSULTAS_EM_EXECUCAO = {}
+_trava_consultas = threading.Lock()
+_ids_consulta = itertools.count(1)
+
+
+def listar_consultas_em_execucao():
+    """
+    Retorna a lista de (id, sql, segundos em execução) das consultas do console.
+    """
+    agora = time.monotonic()
+    with _trava_consultas:
+        return [(id_consulta, consulta['sql'], agora - consulta['inicio'])
+                for id_consulta, consulta in CONSULTAS_EM_EXECUCAO.items()]
+
+
+def cancelar_consulta(id_consulta):
+    """
+    Pede o cancelamento da consulta; ela para na próxima verificação do
+    progress handler. Retorna False se a consulta já terminou.
+    """
+    with _trava_consultas:
+        consulta = CONSULTAS_EM_EXECUCAO.get(id_consulta)
+    if consulta is None:
+        return False
+    consulta['cancelar'].set()
+    return True
+
+
+def plano_consulta(conn, sql, parametros=()):
+    """
+    Linhas do EXPLAIN QUERY PLAN como texto indentado, ou None quando o
+    comando não tem plano (PRAGMA, CREATE, etc.).
+    """
+    try:
+        linhas = conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros).fetchall()
+    except sqlite3.Error:
+        return None
+    niveis = {0: 0}
+    plano = []
+    for id_no, pai, _, detalhe in linhas:
+        niveis[id_no] = niveis.get(pai, 0) + 1
+        plano.append("  " * (niveis[id_no] - 1) + detalhe)
+    return "\n".join(plano)
+
+
+def executar_consulta(conn, sql, parametros=(), tempo_limite=TEMPO_LIMITE_PADRAO,
+                      limite_linhas=LIMITE_LINHAS_PADRAO, somente_leitura=True):
+    """
+    Executa um comando SQL do console com proteções:
+    - o progress handler do SQLite interrompe o comando ao passar do
+      tempo_limite ou quando a consulta é cancelada (cancelar_consulta);
+    - resultados são lidos em lotes e param em limite_linhas, sem carregar o
+      resto do resultado;
+    - com somente_leitura=True, PRAGMA query_only impede qualquer gravação.
+    Comandos que alteram dados são confirmados só se terminarem a tempo.
+    Retorna um dicionário com 'colunas', 'linhas', 'truncado',
+    'linhas_afetadas', 'plano', 'tempo', 'instrucoes' (instruções da VM,
+    aproximado: medida do trabalho feito, incluindo as linhas percorridas) e
+    'interrompida' (None, 'tempo' ou 'cancelada').
+    """
+    cancelar = threading.Event()
+    id_consulta = next(_ids_consulta)
+    inicio = time.monotonic()
+    verificacoes = 0
+    motivo = []
+
+    def verificar():
+        nonlocal verificacoes
+        verificacoes += 1
+        if cancelar.is_set():
+            motivo.append('cancelada')
+            return 1
+        if time.monotonic() - inicio > tempo_limite:
+            motivo.append('tempo')
+            return 1
+        return 0
+
+    resultado = {
+        'id': id_consulta, 'colunas': [], 'linhas': [], 'truncado': False, 'linhas_afetadas': None,
+        'plano': plano_consulta(conn, sql, parametros), 'interrompida': None,
+    }
+    with _trava_consultas:
+        CONSULTAS_EM_EXECUCAO[id_consulta] = {'sql': sql, 'inicio': inicio, 'cancelar': cancelar}
+    if somente_leitura:
+        conn.execute("PRAGMA query_only = ON")
+    conn.set_progress_handler(verificar, INSTRUCOES_POR_VERIFICACAO)
+    try:
+        cursor = conn.execute(sql, parametros)
+        if cursor.description is not None:
+            resultado['colunas'] = [descricao[0] for descricao in cursor.description]
+            while len(resultado['linhas']) < limite_linhas:
+                lote = cursor.fetchmany(min(TAMANHO_LOTE, limite_linhas - len(resultado['linhas'])))
+                if not lote:
+                    break
+                resultado['linhas'].extend(lote)
+            else:
+                resultado['truncado'] = cursor.fetchone() is not None
+            cursor.close()
+        else:
+            resultado['linhas_afetadas'] = cursor.rowcount
+        if conn.in_transaction:
+            conn.commit()
+    except sqlite3.OperationalError:
+        if conn.in_transaction:
+            conn.rollback()
+        if not motivo:
+            raise
+        resultado['interrompida'] = motivo[0]
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+        if somente_leitura:
+            conn.execute("PRAGMA query_only = OFF")
+        with _trava_consultas:
+            CONSULTAS_EM_EXECUCAO.pop(id_consulta, None)
+
+    resultado['tempo'] = time.monotonic() - inicio
+    resultado['instrucoes'] = verificacoes * INSTRUCOES_POR_VERIFICACAO
+    return resultado
@@ -0,0 +1,220 @@
+import re
+
+# Linhas por página oferecidas na navegação das tabelas
+TAMANHOS_PAGINA = [50, 100, 500, 1000]
+
+# Coluna com o rowid de cada linha nas páginas (chave da navegação e da edição)
+COLUNA_ROWID = '_rowid_'
+
+# Operadores de filtro: (operador exibido, expressão SQL, usa valor)
+OPERADORES_FILTRO = {
+    '=': ('{coluna} = ?', True),
+    '≠': ('{coluna} IS NOT ?', True),
+    '>': ('{coluna} > ?', True),
+    '≥': ('{coluna} >= ?', True),
+    '<': ('{coluna} < ?', True),
+    '≤': ('{coluna} <= ?', True),
+    'contém': ("{coluna} LIKE '%' || ? || '%'", True),
+    'começa com': ("{coluna} LIKE ? || '%'", True),
+    'é nulo': ('{coluna} IS NULL', False),
+    'não é nulo': ('{coluna} IS NOT NULL', False),
+}
+
+
+def citar(nome):
+    """
+    Nome de tabela ou coluna entre aspas, para uso seguro no SQL.
+    """
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+def colunas_tabela(conn, tabela):
+    """
+    Nomes das colunas da tabela, na ordem da tabela.
+    """
+    return [coluna[1] for coluna in conn.execute(f"PRAGMA table_info({citar(tabela)})")]
+
+
+def montar_filtros(colunas, filtros):
+    """
+    Converte a lista de filtros (coluna, operador, valor) em uma condição SQL
+    com parâmetros. Colunas que não são da tabela e operadores desconhecidos
+    são recusados, para que nenhum texto do usuário vá direto para o SQL.
+    Retorna (condição, parâmetros); condição vazia quando não há filtros.
+    """
+    condicoes = []
+    parametros = []
+    for coluna, operador, valor in filtros:
+        if coluna not in colunas:
+            raise ValueError(f"Coluna desconhecida: {coluna}")
+        if operador not in OPERADORES_FILTRO:
+            raise ValueError(f"Operador desconhecido: {operador}")
+        expressao, usa_valor = OPERADORES_FILTRO[operador]
+        condicoes.append(expressao.format(coluna=citar(coluna)))
+        if usa_valor:
+            parametros.append(valor)
+    return " AND ".join(condicoes), parametros
+
+
+def _condicao_cursor(coluna, valor, rowid, decrescente):
+    """
+    Condição das linhas depois do cursor (valor, rowid) na ordem
+    'coluna, rowid' (nulos primeiro na ordem crescente, por último na decrescente).
+    """
+    if coluna is None:
+        return ("rowid < ?" if decrescente else "rowid > ?"), [rowid]
+    coluna = citar(coluna)
+    if decrescente:
+        if valor is None:
+            return f"({coluna} IS NULL AND rowid < ?)", [rowid]
+        return (f"({coluna} < ? OR ({coluna} = ? AND rowid < ?) OR {coluna} IS NULL)",
+                [valor, valor, rowid])
+    if valor is None:
+        return f"(({coluna} IS NULL AND rowid > ?) OR {coluna} IS NOT NULL)", [rowid]
+    return f"({coluna} > ? OR ({coluna} = ? AND rowid > ?))", [valor, valor, rowid]
+
+
+def buscar_pagina(conn, tabela, filtros=(), ordenar_por=None, decrescente=False,
+                  tamanho=TAMANHOS_PAGINA[1], cursor=None):
+    """
+    Busca uma página da tabela por keyset: em vez de OFFSET, continua a partir
+    do cursor (valor da coluna de ordenação, rowid) da última linha da página
+    anterior, então qualquer página custa o mesmo que a primeira quando há
+    índice na coluna de ordenação. Filtros e ordenação rodam no SQLite.
+    Colunas geradas (ex.: data_iso) ficam de fora, pois não são editáveis.
+    Retorna (colunas, linhas, próximo cursor ou None na última página); a
+    primeira coluna é COLUNA_ROWID.
+    """
+    colunas = colunas_tabela(conn, tabela)
+    if ordenar_por is not None and ordenar_por not in colunas:
+        raise ValueError(f"Coluna desconhecida: {ordenar_por}")
+
+    condicao, parametros = montar_filtros(colunas, filtros)
+    condicoes = [condicao] if condicao else []
+    if cursor is not None:
+        condicao_cursor, parametros_cursor = _condicao_cursor(ordenar_por, *cursor, decrescente)
+        condicoes.append(condicao_cursor)
+        parametros += parametros_cursor
+
+    direcao = " DESC" if decrescente else ""
+    ordem = f"{citar(ordenar_por)}{direcao}, rowid{direcao}" if ordenar_por else f"rowid{direcao}"
+    onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    resultado = conn.execute(f"""
+        SELECT rowid AS {COLUNA_ROWID}, {', '.join(citar(c) for c in colunas)} FROM {citar(tabela)}
+        {onde}
+        ORDER BY {ordem}
+        LIMIT ?""", parametros + [tamanho + 1])
+    nomes = [descricao[0] for descricao in resultado.description]
+    linhas = resultado.fetchall()
+
+    proximo = None
+    if len(linhas) > tamanho:
+        linhas = linhas[:tamanho]
+        ultima = linhas[-1]
+        valor = ultima[nomes.index(ordenar_por, 1)] if ordenar_por else None
+        proximo = (valor, ultima[0])
+    return nomes, linhas, proximo
+
+
+def estimar_linhas(conn, tabela):
+    """
+    Quantidade aproximada de linhas sem percorrer a tabela: usa as estatísticas
+    do ANALYZE (sqlite_stat1) e, sem elas, o maior rowid (exato enquanto não
+    houver exclusões). Retorna (linhas, origem da estimativa).
+    """
+    tem_estatisticas = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone()
+    if tem_estatisticas:
+        linha = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL LIMIT 1",
+                             (tabela,)).fetchone()
+        if linha:
+            numero = re.match(r'\d+', linha[0])
+            if numero:
+                return int(numero.group()), 'estatísticas'
+    maior_rowid = conn.execute(f"SELECT max(rowid) FROM {citar(tabela)}").fetchone()[0]
+    return maior_rowid or 0, 'maior rowid'
+
+
+def contar_linhas(conn, tabela, filtros=()):
+    """
+    Contagem exata das linhas da tabela que atendem aos filtros.
+    """
+    condicao, parametros = montar_filtros(colunas_tabela(conn, tabela), filtros)
+    onde = f"WHERE {condicao}" if condicao else ""
+    return conn.execute(f"SELECT COUNT(*) FROM {citar(tabela)} {onde}", parametros).fetchone()[0]
+
+
+def atualizar_estatisticas(conn):
+    """
+    Recalcula as estatísticas usadas pelo otimizador e por estimar_linhas.
+    """
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def _valor_python(valor):
+    # Valores do DataFrame (numpy, NaN, NaT) convertidos para os tipos do sqlite3
+    if valor is None:
+        return None
+    try:
+        if valor != valor:
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(valor, 'item'):
+        return valor.item()
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat(sep=' ') if hasattr(valor, 'hour') else valor.isoformat()
+    return valor
+
+
+def calcular_alteracoes(colunas, linhas_originais, editado):
+    """
+    Compara a página carregada (linhas com COLUNA_ROWID na primeira posição)
+    com o DataFrame devolvido pelo editor e retorna só o que mudou:
+    - inseridos: lista de tuplas (valores das colunas), linhas sem rowid;
+    - atualizados: {colunas alteradas: [(valores..., rowid), ...]}, agrupados
+      para um executemany por conjunto de colunas;
+    - removidos: rowids que estavam na página e saíram do editor.
+    """
+    originais = {linha[0]: dict(zip(colunas, linha[1:])) for linha in linhas_originais}
+    inseridos = []
+    atualizados = {}
+    vistos = set()
+
+    for registro in editado.to_dict('records'):
+        rowid = _valor_python(registro.get(COLUNA_ROWID))
+        valores = {coluna: _valor_python(registro.get(coluna)) for coluna in colunas}
+        if rowid is None or rowid not in originais:
+            if any(valor is not None for valor in valores.values()):
+                inseridos.append(tuple(valores[coluna] for coluna in colunas))
+            continue
+        vistos.add(rowid)
+        alteradas = tuple(coluna for coluna in colunas if valores[coluna] != originais[rowid][coluna])
+        if alteradas:
+            atualizados.setdefault(alteradas, []).append(
+                tuple(valores[coluna] for coluna in alteradas) + (rowid,))
+
+    removidos = [rowid for rowid in originais if rowid not in vistos]
+    return inseridos, atualizados, removidos
+
+
+def aplicar_alteracoes(conn, tabela, colunas, inseridos, atualizados, removidos):
+    """
+    Grava o conjunto de alterações do editor com executemany parametrizado,
+    em uma única transação (tudo ou nada).
+    Retorna (inseridos, atualizados, removidos) efetivamente gravados.
+    """
+    tabela_sql = citar(tabela)
+    total_atualizados = 0
+    with conn:
+        total_removidos = conn.executemany(f"DELETE FROM {tabela_sql} WHERE rowid = ?",
+                                           [(rowid,) for rowid in removidos]).rowcount if removidos else 0
+        for alteradas, linhas in atualizados.items():
+            atribuicoes = ", ".join(f"{citar(coluna)} = ?" for coluna in alteradas)
+            total_atualizados += conn.executemany(f"UPDATE {tabela_sql} SET {atribuicoes} WHERE rowid = ?",
+                                                  linhas).rowcount
+        total_inseridos = conn.executemany(
+            f"INSERT INTO {tabela_sql} ({', '.join(citar(c) for c in colunas)}) "
+            f"VALUES ({', '.join('?' for _ in colunas)})", inseridos).rowcount if inseridos else 0
+    return total_inseridos, total_atualizados, total_removidos
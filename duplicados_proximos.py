@@ -0,0 +1,139 @@
+import math
+from itertools import groupby, product
+
+from ingestao_txt import BANCO_LEITURAS, COLUNA_ORIGEM, abrir_conexao_ingestao, transferir_leituras_ids
+
+# Distância máxima (m) entre duas leituras da mesma placa e dia para serem a mesma medição
+TOLERANCIA_PADRAO = 0.005
+
+# Quantidade de linhas lidas por vez do banco
+TAMANHO_LOTE = 50000
+
+# Colunas de cada leitura retornada pelo detector
+COLUNAS_DUPLICADOS = ['grupo', 'id', 'pl_placa', 'dt_data', 'cd_este', 'cd_norte', 'ct_cota',
+                      'lc_local', COLUNA_ORIGEM, 'manter']
+
+# Qual leitura de cada grupo é mantida: a gravada primeiro (menor id) ou a última
+CRITERIOS_MANTER = {
+    'primeira': min,
+    'ultima': max,
+}
+
+# Deslocamentos das 27 células vizinhas (incluindo a própria) na grade este x norte x cota
+_VIZINHANCA = list(product((-1, 0, 1), repeat=3))
+
+
+def _celula(coordenadas, tolerancia):
+    return tuple(math.floor(valor / tolerancia) for valor in coordenadas)
+
+
+def agrupar_proximos(leituras, tolerancia=TOLERANCIA_PADRAO):
+    """
+    Agrupa leituras (id, este, norte, cota, ...) que estão a até 'tolerancia'
+    uma da outra, direta ou indiretamente. Cada leitura vai para uma célula de
+    uma grade com lado 'tolerancia' e só é comparada com as leituras das 27
+    células vizinhas, em vez de com todas.
+    Retorna a lista de grupos com mais de uma leitura (listas de índices).
+    """
+    pai = list(range(len(leituras)))
+
+    def raiz(i):
+        while pai[i] != i:
+            pai[i] = pai[pai[i]]
+            i = pai[i]
+        return i
+
+    grade = {}
+    for i, leitura in enumerate(leituras):
+        coordenadas = leitura[1:4]
+        celula = _celula(coordenadas, tolerancia)
+        if grade:
+            x, y, z = celula
+            for dx, dy, dz in _VIZINHANCA:
+                for j in grade.get((x + dx, y + dy, z + dz), ()):
+                    if math.dist(coordenadas, leituras[j][1:4]) <= tolerancia:
+                        pai[raiz(i)] = raiz(j)
+        grade.setdefault(celula, []).append(i)
+
+    grupos = {}
+    for i in range(len(leituras)):
+        grupos.setdefault(raiz(i), []).append(i)
+    return [indices for indices in grupos.values() if len(indices) > 1]
+
+
+def encontrar_duplicados_proximos(conn, tolerancia=TOLERANCIA_PADRAO, manter='primeira'):
+    """
+    Procura em dados_placa_geral leituras quase iguais: mesma placa, mesmo dia
+    e coordenadas (este, norte, cota) a até 'tolerancia' metros, como as
+    geradas por reexportações ou arredondamentos diferentes do mesmo ponto.
+    Lê a tabela em lotes, ordenada por placa e dia (data normalizada, então
+    a mesma data gravada em formatos diferentes cai no mesmo dia; o índice
+    (pl_placa, data_iso) evita ordenar a tabela inteira), e agrupa cada
+    placa/dia com agrupar_proximos: o custo cresce linearmente com a tabela.
+    Retorna linhas com as colunas de COLUNAS_DUPLICADOS; 'manter' indica a
+    leitura que fica em cada grupo segundo o critério ('primeira' ou 'ultima').
+    """
+    if tolerancia <= 0:
+        raise ValueError("A tolerância deve ser maior que zero")
+    escolher = CRITERIOS_MANTER[manter]
+
+    cursor = conn.execute(f"""
+        SELECT id, cd_este, cd_norte, ct_cota, pl_placa, dt_data, lc_local, {COLUNA_ORIGEM},
+               COALESCE(data_iso, dt_data) AS dia
+        FROM dados_placa_geral
+        WHERE cd_este IS NOT NULL AND cd_norte IS NOT NULL AND ct_cota IS NOT NULL
+          AND pl_placa IS NOT NULL
+        ORDER BY pl_placa, dia""")
+
+    def leituras():
+        while True:
+            lote = cursor.fetchmany(TAMANHO_LOTE)
+            if not lote:
+                return
+            yield from lote
+
+    duplicados = []
+    grupo = 0
+    for _, leituras_dia in groupby(leituras(), key=lambda leitura: (leitura[4], leitura[8])):
+        leituras_dia = list(leituras_dia)
+        if len(leituras_dia) < 2:
+            continue
+        for indices in agrupar_proximos(leituras_dia, tolerancia):
+            grupo += 1
+            mantida = escolher(leituras_dia[i][0] for i in indices)
+            for i in sorted(indices, key=lambda i: leituras_dia[i][0]):
+                id_leitura, este, norte, cota, placa, data, local, origem, _ = leituras_dia[i]
+                duplicados.append((grupo, id_leitura, placa, data, este, norte, cota, local, origem,
+                                   id_leitura == mantida))
+    return duplicados
+
+
+def remover_duplicados(ids_remover, ids_manter=(), caminho_banco=BANCO_LEITURAS):
+    """
+    Apaga de dados_placa_geral as leituras informadas (as que não foram
+    mantidas em cada grupo), em uma única transação. As cópias dessas leituras
+    em placas_completas_slu_bh também são apagadas e só as leituras mantidas
+    dos mesmos grupos ('ids_manter') são transferidas de novo, para ocupar o
+    lugar delas; as demais leituras pendentes ficam para a transferência da
+    página 4.
+    Retorna {'removidos', 'removidos_completas', 'transferidos'}.
+    """
+    ids_remover = [(id_leitura,) for id_leitura in ids_remover]
+    conn = abrir_conexao_ingestao(caminho_banco)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removidos_completas = conn.executemany("""
+                DELETE FROM placas_completas_slu_bh
+                WHERE (tipo, placa, data, coordenada_este, coordenada_norte, elevacao) IN (
+                    SELECT lc_local, pl_placa, dt_data, cd_este, cd_norte, ct_cota
+                    FROM dados_placa_geral WHERE id = ?)""", ids_remover).rowcount
+            removidos = conn.executemany("DELETE FROM dados_placa_geral WHERE id = ?", ids_remover).rowcount
+            transferidos = transferir_leituras_ids(conn, ids_manter) if removidos_completas else 0
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return {'removidos': removidos, 'removidos_completas': removidos_completas, 'transferidos': transferidos}
@@ -0,0 +1,193 @@
+import csv
+import io
+import os
+import tempfile
+import time
+
+from consulta_tabelas import citar, colunas_tabela, montar_filtros
+from migracoes import COLUNA_DATA_ISO, COLUNAS_DATA
+
+# Parquet é opcional: só é oferecido quando o pyarrow está instalado
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+PARQUET_DISPONIVEL = pa is not None
+
+# Formatos de exportação: extensão e tipo MIME
+FORMATOS_EXPORTACAO = {'csv': ('.csv', 'text/csv')}
+if PARQUET_DISPONIVEL:
+    FORMATOS_EXPORTACAO['parquet'] = ('.parquet', 'application/vnd.apache.parquet')
+
+# Linhas lidas do cursor e gravadas por vez
+TAMANHO_LOTE = 20000
+
+# Pasta dos arquivos gerados para download; arquivos com mais de um dia são apagados
+PASTA_EXPORTACOES = os.path.join(tempfile.gettempdir(), 'app_slu_exportacoes')
+VALIDADE_EXPORTACAO = 24 * 60 * 60
+
+
+def coluna_filtro_data(conn, tabela, coluna_data):
+    """
+    Coluna usada no filtro de período: a data normalizada (data_iso, gerada e
+    indexada) quando a coluna escolhida é a coluna de data de uma tabela de
+    leituras que já a tem, já que a coluna original mistura AAAA-MM-DD e
+    DD/MM/AAAA e não pode ser comparada como texto; senão, a própria coluna.
+    """
+    if COLUNAS_DATA.get(tabela) == coluna_data and COLUNA_DATA_ISO in {
+            coluna[1] for coluna in conn.execute(f"PRAGMA table_xinfo({citar(tabela)})")}:
+        return COLUNA_DATA_ISO
+    return coluna_data
+
+
+def montar_consulta_exportacao(conn, tabela, colunas=None, coluna_data=None, data_inicio=None,
+                               data_fim=None, filtros=()):
+    """
+    Monta o SELECT da exportação: colunas escolhidas (todas, se None),
+    período opcional na coluna de data (inclusivo, comparado pela coluna de
+    coluna_filtro_data) e filtros no formato de consulta_tabelas.montar_filtros.
+    Retorna (sql, parâmetros, colunas).
+    """
+    existentes = colunas_tabela(conn, tabela)
+    colunas = list(colunas or existentes)
+    desconhecidas = [coluna for coluna in colunas + ([coluna_data] if coluna_data else [])
+                     if coluna not in existentes]
+    if desconhecidas:
+        raise ValueError(f"Colunas que não existem em {tabela}: {', '.join(desconhecidas)}")
+
+    condicao, parametros = montar_filtros(existentes, filtros)
+    condicoes = [condicao] if condicao else []
+    filtro_data = coluna_filtro_data(conn, tabela, coluna_data) if coluna_data else None
+    if filtro_data and data_inicio:
+        condicoes.append(f"{citar(filtro_data)} >= ?")
+        parametros.append(str(data_inicio))
+    if filtro_data and data_fim:
+        # Inclui o dia final inteiro, mesmo com hora na coluna
+        condicoes.append(f"{citar(filtro_data)} < date(?, '+1 day')")
+        parametros.append(str(data_fim))
+
+    onde = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    sql = f"SELECT {', '.join(citar(c) for c in colunas)} FROM {citar(tabela)} {onde} ORDER BY rowid"
+    return sql, parametros, colunas
+
+
+def iterar_lotes(conn, sql, parametros=(), tamanho_lote=TAMANHO_LOTE):
+    """
+    Executa a consulta e gera as linhas em lotes (fetchmany), sem carregar o
+    resultado inteiro.
+    """
+    cursor = conn.execute(sql, parametros)
+    try:
+        while True:
+            lote = cursor.fetchmany(tamanho_lote)
+            if not lote:
+                return
+            yield lote
+    finally:
+        cursor.close()
+
+
+def escrever_csv(lotes, colunas, destino, separador=',', cabecalhos=None):
+    """
+    Grava os lotes em CSV (UTF-8) no arquivo binário 'destino'.
+    Retorna o número de linhas gravadas.
+    """
+    texto = io.TextIOWrapper(destino, encoding='utf-8', newline='', write_through=True)
+    try:
+        escritor = csv.writer(texto, delimiter=separador, lineterminator='\n')
+        escritor.writerow([(cabecalhos or {}).get(coluna, coluna) for coluna in colunas])
+        total = 0
+        for lote in lotes:
+            escritor.writerows(lote)
+            total += len(lote)
+        texto.flush()
+    finally:
+        texto.detach()
+    return total
+
+
+def _tipo_arrow(tipo_declarado):
+    tipo = (tipo_declarado or '').upper()
+    if 'INT' in tipo:
+        return pa.int64()
+    if any(parte in tipo for parte in ('REAL', 'FLOA', 'DOUB')):
+        return pa.float64()
+    return pa.string()
+
+
+def escrever_parquet(lotes, colunas, destino, tipos_declarados):
+    """
+    Grava os lotes em Parquet no arquivo 'destino', um row group por lote.
+    O esquema vem dos tipos declarados das colunas (inteiro, real ou texto).
+    Retorna o número de linhas gravadas.
+    """
+    if not PARQUET_DISPONIVEL:
+        raise RuntimeError("Exportação em Parquet requer o pacote pyarrow")
+    esquema = pa.schema([(coluna, _tipo_arrow(tipos_declarados.get(coluna))) for coluna in colunas])
+    total = 0
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for lote in lotes:
+            arrays = []
+            for i, campo in enumerate(esquema):
+                valores = [linha[i] for linha in lote]
+                if campo.type == pa.string():
+                    valores = [None if valor is None else str(valor) for valor in valores]
+                try:
+                    arrays.append(pa.array(valores, type=campo.type))
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    raise ValueError(f"Coluna '{campo.name}' tem valores fora do tipo declarado: {e}")
+            escritor.write_batch(pa.record_batch(arrays, schema=esquema))
+            total += len(lote)
+    return total
+
+
+def _limpar_exportacoes_antigas():
+    limite = time.time() - VALIDADE_EXPORTACAO
+    for nome in os.listdir(PASTA_EXPORTACOES):
+        caminho = os.path.join(PASTA_EXPORTACOES, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+
+def exportar_tabela(conn, tabela, formato='csv', colunas=None, coluna_data=None, data_inicio=None,
+                    data_fim=None, filtros=(), cabecalhos=None, separador=','):
+    """
+    Exporta a tabela (ou parte dela) para um arquivo temporário em disco,
+    lendo o cursor em lotes: a memória usada é a de um lote, não a da tabela.
+    Retorna (caminho do arquivo, linhas exportadas, tipo MIME).
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação indisponível: {formato}")
+    extensao, mime = FORMATOS_EXPORTACAO[formato]
+    sql, parametros, colunas = montar_consulta_exportacao(conn, tabela, colunas, coluna_data,
+                                                          data_inicio, data_fim, filtros)
+
+    os.makedirs(PASTA_EXPORTACOES, exist_ok=True)
+    _limpar_exportacoes_antigas()
+    descritor, caminho = tempfile.mkstemp(prefix=f"{tabela}_", suffix=extensao, dir=PASTA_EXPORTACOES)
+    try:
+        with os.fdopen(descritor, 'wb') as destino:
+            lotes = iterar_lotes(conn, sql, parametros)
+            if formato == 'parquet':
+                tipos = {coluna[1]: coluna[2] for coluna in conn.execute(f"PRAGMA table_info({citar(tabela)})")}
+                linhas = escrever_parquet(lotes, colunas, destino, tipos)
+            else:
+                linhas = escrever_csv(lotes, colunas, destino, separador, cabecalhos)
+    except Exception:
+        os.remove(caminho)
+        raise
+    return caminho, linhas, mime
+
+
+def ler_exportacao(caminho):
+    """
+    Conteúdo do arquivo exportado, lido só quando o usuário clica em baixar
+    (para uso como data=lambda: ... no st.download_button).
+    """
+    with open(caminho, 'rb') as arquivo:
+        return arquivo.read()
@@ -6,6 +6,7 @@ from docx.oxml import OxmlElement
 from docx.oxml.ns import qn
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from conexao_banco import abrir_conexao
 
 # --- CONFIGURAÇÕES ---
 CAMINHO_BD = "banco_dados_completo/banco_dados.db"
@@ -146,20 +147,21 @@ def gerar_relatorio():
 
     # 2. Carregar dados do banco
     print(f"Conectando ao banco de dados: {CAMINHO_BD}")
-    conn = sqlite3.connect(CAMINHO_BD)
-    df = pd.read_sql_query(f"SELECT * FROM {TABELA_BD}", conn)
-    conn.close()
-    print("Dados carregados com sucesso.")
-
-    # 3. Processar e filtrar dados
-    df['data_datetime'] = pd.to_datetime(df['data'], errors='coerce', format='%Y-%m-%d')
-    data_maxima = df['data_datetime'].max()
-    if pd.isnull(data_maxima):
+    conn = abrir_conexao(CAMINHO_BD)
+    # data_iso: data normalizada (AAAA-MM-DD) e indexada; máximo e período saem do índice
+    data_maxima = conn.execute(f"SELECT MAX(data_iso) FROM {TABELA_BD}").fetchone()[0]
+    if data_maxima is None:
+        conn.close()
         print("ERRO: Nenhuma data válida encontrada no banco de dados.")
         return
-    
-    cinco_meses_atras = data_maxima - relativedelta(months=5)
-    df_filtrado = df[df['data_datetime'] >= cinco_meses_atras].copy()
+
+    # 3. Carregar só os últimos 5 meses
+    cinco_meses_atras = datetime.fromisoformat(data_maxima) - relativedelta(months=5)
+    df_filtrado = pd.read_sql_query(f"SELECT * FROM {TABELA_BD} WHERE data_iso >= ?", conn,
+                                    params=(cinco_meses_atras.date().isoformat(),))
+    conn.close()
+    print("Dados carregados com sucesso.")
+    df_filtrado['data_datetime'] = pd.to_datetime(df_filtrado['data_iso'], errors='coerce', format='%Y-%m-%d')
     df_filtrado['nome_tabela_final'] = df_filtrado['placa'].map(placa_to_table)
     print(f"Dados filtrados para o período a partir de {cinco_meses_atras.strftime('%d/%m/%Y')}.")
 
@@ -0,0 +1,209 @@
+import io
+from datetime import date, datetime
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from consulta_tabelas import citar
+
+# Linhas lidas e inseridas por bloco
+TAMANHO_BLOCO = 50000
+
+# Linhas rejeitadas guardadas para o relatório (as demais só são contadas)
+MAX_REJEITADAS = 1000
+
+
+def tipo_coluna(tipo_declarado):
+    """
+    Tipo usado na validação a partir do tipo declarado da coluna, pelas regras
+    de afinidade do SQLite (DATE e TIMESTAMP viram datas AAAA-MM-DD).
+    """
+    tipo = (tipo_declarado or '').upper()
+    if 'INT' in tipo:
+        return 'inteiro'
+    if 'DATE' in tipo or 'TIME' in tipo:
+        return 'data'
+    if any(parte in tipo for parte in ('CHAR', 'CLOB', 'TEXT')):
+        return 'texto'
+    if any(parte in tipo for parte in ('REAL', 'FLOA', 'DOUB', 'NUM', 'DEC')):
+        return 'real'
+    return 'texto'
+
+
+def _texto_celula(valor):
+    # Células do Excel convertidas para texto, como se viessem de um CSV
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _blocos_excel(arquivo, tamanho_bloco):
+    livro = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        planilha = livro.active
+        total = planilha.max_row or 0
+        linhas = planilha.iter_rows(values_only=True)
+        cabecalho = [str(valor) if valor is not None else f"coluna_{i + 1}"
+                     for i, valor in enumerate(next(linhas, ()))]
+        bloco = []
+        inicio = 0
+        for linha in linhas:
+            bloco.append([_texto_celula(valor) for valor in linha[:len(cabecalho)]])
+            if len(bloco) == tamanho_bloco:
+                fim = inicio + len(bloco)
+                yield (pd.DataFrame(bloco, columns=cabecalho, index=range(inicio, fim)),
+                       min((fim + 1) / total, 1.0) if total else None)
+                bloco = []
+                inicio = fim
+        if bloco:
+            yield pd.DataFrame(bloco, columns=cabecalho, index=range(inicio, inicio + len(bloco))), 1.0
+    finally:
+        livro.close()
+
+
+def _blocos_csv(arquivo, tamanho_bloco, separador, codificacao):
+    tamanho = arquivo.seek(0, io.SEEK_END)
+    arquivo.seek(0)
+    leitor = pd.read_csv(arquivo, sep=separador, encoding=codificacao, dtype=str,
+                         keep_default_na=False, chunksize=tamanho_bloco)
+    with leitor:
+        for bloco in leitor:
+            yield bloco, min(arquivo.tell() / tamanho, 1.0) if tamanho else None
+
+
+def ler_blocos_arquivo(arquivo, nome, tamanho_bloco=TAMANHO_BLOCO, separador=';', codificacao='utf-8'):
+    """
+    Lê um CSV ou XLSX (primeira planilha) em blocos de texto, sem carregar o
+    arquivo inteiro. Gera (DataFrame do bloco, fração lida do arquivo ou None).
+    """
+    if nome.lower().endswith(('.xlsx', '.xlsm')):
+        yield from _blocos_excel(arquivo, tamanho_bloco)
+    else:
+        yield from _blocos_csv(arquivo, tamanho_bloco, separador, codificacao)
+
+
+def colunas_arquivo(arquivo, nome, separador=';', codificacao='utf-8'):
+    """
+    Cabeçalho e primeiras linhas do arquivo, para o mapeamento de colunas.
+    """
+    bloco, _ = next(ler_blocos_arquivo(arquivo, nome, 20, separador, codificacao),
+                    (pd.DataFrame(), None))
+    arquivo.seek(0)
+    return bloco
+
+
+def _converter(valores, tipo, decimal):
+    """
+    Converte a coluna (texto) para o tipo da coluna de destino.
+    Retorna (valores convertidos, máscara das linhas com valor inválido).
+    """
+    vazios = valores.isna() | (valores.astype(str).str.strip() == '')
+    if tipo == 'texto':
+        return valores.where(~vazios, None), pd.Series(False, index=valores.index)
+
+    if tipo == 'data':
+        texto = valores.where(~vazios).astype(str).str.strip()
+        datas = pd.to_datetime(texto, format='ISO8601', errors='coerce')
+        faltando = datas.isna() & ~vazios
+        if faltando.any():
+            datas[faltando] = pd.to_datetime(texto[faltando], format='%d/%m/%Y', errors='coerce')
+        invalidos = datas.isna() & ~vazios
+        somente_data = (datas.dropna() == datas.dropna().dt.normalize()).all()
+        formatadas = datas.dt.strftime('%Y-%m-%d' if somente_data else '%Y-%m-%d %H:%M:%S')
+        return formatadas.astype(object).where(datas.notna(), None), invalidos
+
+    texto = valores.where(~vazios).astype(str).str.strip()
+    if decimal == ',':
+        # 1.234,56 -> 1234.56; números só com ponto (ex.: células do Excel) ficam como estão
+        com_virgula = texto.str.contains(',', regex=False, na=False)
+        texto = texto.where(~com_virgula, texto.str.replace('.', '', regex=False)
+                                               .str.replace(',', '.', regex=False))
+    numeros = pd.to_numeric(texto, errors='coerce')
+    invalidos = numeros.isna() & ~vazios
+    if tipo == 'inteiro':
+        invalidos |= numeros.notna() & (numeros % 1 != 0)
+    validos = numeros.notna() & ~invalidos
+    converter = int if tipo == 'inteiro' else float
+    convertidos = pd.Series(None, index=valores.index, dtype=object)
+    convertidos[validos] = [converter(numero) for numero in numeros[validos]]
+    return convertidos, invalidos
+
+
+def validar_bloco(bloco, mapeamento, tipos, obrigatorias=(), decimal=','):
+    """
+    Valida e converte um bloco lido do arquivo.
+    - mapeamento: {coluna da tabela: coluna do arquivo};
+    - tipos: {coluna da tabela: tipo de tipo_coluna};
+    - obrigatorias: colunas NOT NULL da tabela.
+    Retorna (linhas válidas como lista de tuplas na ordem do mapeamento,
+    DataFrame das linhas rejeitadas com a coluna 'motivo').
+    """
+    convertidas = {}
+    motivos = pd.Series('', index=bloco.index)
+    for coluna, coluna_arquivo in mapeamento.items():
+        valores, invalidos = _converter(bloco[coluna_arquivo], tipos[coluna], decimal)
+        convertidas[coluna] = valores
+        motivos[invalidos] += f"{coluna}: valor inválido para {tipos[coluna]}; "
+        if coluna in obrigatorias:
+            nulos = valores.isna() & ~invalidos
+            motivos[nulos] += f"{coluna}: obrigatória; "
+
+    validas = motivos == ''
+    linhas = list(zip(*(convertidas[coluna][validas].tolist() for coluna in mapeamento)))
+    rejeitadas = bloco[~validas].assign(motivo=motivos[~validas].str.rstrip('; '))
+    return linhas, rejeitadas
+
+
+def importar_blocos(conn, tabela, blocos, mapeamento, decimal=',', ignorar_existentes=True,
+                    ao_progresso=None):
+    """
+    Importa para a tabela os blocos lidos por ler_blocos_arquivo: valida cada
+    bloco e insere as linhas válidas com executemany, tudo em uma única
+    transação (conexão com isolation_level=None). Linhas que repetem uma chave
+    única já existente são ignoradas (ignorar_existentes=True) ou abortam a
+    importação.
+    ao_progresso(fração lida, linhas lidas, inseridas, rejeitadas) é chamado
+    a cada bloco.
+    Retorna {'lidas', 'inseridas', 'ignoradas', 'rejeitadas', 'amostra_rejeitadas'}.
+    """
+    estrutura = conn.execute(f"PRAGMA table_info({citar(tabela)})").fetchall()
+    tipos = {coluna[1]: tipo_coluna(coluna[2]) for coluna in estrutura}
+    obrigatorias = {coluna[1] for coluna in estrutura if coluna[3] and coluna[4] is None}
+    desconhecidas = set(mapeamento) - set(tipos)
+    if desconhecidas:
+        raise ValueError(f"Colunas que não existem em {tabela}: {', '.join(sorted(desconhecidas))}")
+
+    comando = "INSERT OR IGNORE" if ignorar_existentes else "INSERT"
+    sql = (f"{comando} INTO {citar(tabela)} ({', '.join(citar(c) for c in mapeamento)}) "
+           f"VALUES ({', '.join('?' for _ in mapeamento)})")
+
+    resumo = {'lidas': 0, 'inseridas': 0, 'ignoradas': 0, 'rejeitadas': 0}
+    amostra = []
+    guardadas = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for bloco, fracao in blocos:
+            linhas, rejeitadas = validar_bloco(bloco, mapeamento, tipos, obrigatorias, decimal)
+            inseridas = conn.executemany(sql, linhas).rowcount if linhas else 0
+            resumo['lidas'] += len(bloco)
+            resumo['inseridas'] += inseridas
+            resumo['ignoradas'] += len(linhas) - inseridas
+            resumo['rejeitadas'] += len(rejeitadas)
+            if guardadas < MAX_REJEITADAS and not rejeitadas.empty:
+                # Número da linha no arquivo (cabeçalho é a linha 1)
+                parte = rejeitadas.head(MAX_REJEITADAS - guardadas)
+                amostra.append(parte.assign(linha=parte.index + 2))
+                guardadas += len(parte)
+            if ao_progresso:
+                ao_progresso(fracao, resumo['lidas'], resumo['inseridas'], resumo['rejeitadas'])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    resumo['amostra_rejeitadas'] = pd.concat(amostra) if amostra else pd.DataFrame()
+    return resumo
@@ -0,0 +1,543 @@
+import csv
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import repeat
+
+import pandas as pd
+
+from conexao_banco import BANCO_PRINCIPAL, obter_conexao
+from migracoes import CHAVES_NATURAIS
+
+# Colunas do arquivo TXT da estação total: número, descrição, este, norte, cota
+COLUNAS_TXT = ['numero', 'descricao', 'este', 'norte', 'cota']
+
+# Faixas válidas das coordenadas (mesmas regras do antigo validar_registro)
+LIMITES_COORDENADAS = {
+    'este': (599000, 700000),
+    'norte': (6999999, 8000000),
+    'cota': (850, 999),
+}
+
+# Quantidade de linhas lidas por bloco
+TAMANHO_BLOCO = 50000
+
+# Banco das leituras; o registro de arquivos ('arquivos') fica no mesmo banco
+BANCO_LEITURAS = BANCO_PRINCIPAL
+
+# Coluna que liga cada leitura ao arquivo TXT de origem (arquivos.nome_arquivo)
+COLUNA_ORIGEM = 'arquivo_origem'
+
+# Leituras de dados_placa_geral que seguem para placas_completas_slu_bh
+# (dados completos e sem pontos de levantamento topográfico)
+FILTRO_LEITURAS_VALIDAS = """
+        cd_este IS NOT NULL
+        AND cd_norte IS NOT NULL
+        AND ct_cota IS NOT NULL
+        AND lc_local IS NOT NULL
+        AND pl_placa IS NOT NULL
+        AND pl_placa NOT LIKE '%LEV%'
+        AND pl_placa NOT LIKE '%TOP%'"""
+
+# Evita duas ingestões simultâneas no mesmo processo (observador da pasta x página 3)
+TRAVA_INGESTAO = threading.Lock()
+
+
+def formatar_placa(descricoes, tipo_arquivo):
+    """
+    Formata a coluna de descrições (pd.Series) no padrão de placa do tipo de arquivo.
+    Aplica as mesmas regras da versão linha a linha, mas sobre a coluna inteira.
+    """
+    descricoes = descricoes.astype(str).str.strip()
+
+    if tipo_arquivo == "CELULA EMERGENCIAL":
+        comeca_l = descricoes.str.startswith('L')
+        return descricoes.where(~comeca_l, "PR " + descricoes.str[1:])
+
+    if tipo_arquivo == "CELULA DE PESQUISA":
+        numero = pd.to_numeric(descricoes.str.extract(r'PR(\d+)', expand=False), errors='coerce')
+        formatada = "PR" + numero.astype('Int64').astype(str).str.zfill(2)
+        return formatada.where(numero.notna(), descricoes)
+
+    if tipo_arquivo == "PAMPULHA":
+        formatada = "PR " + descricoes
+        formatada = formatada.where(~descricoes.str.startswith('A'), "PR A." + descricoes.str[1:])
+        return formatada.where(~descricoes.str.startswith('D'), descricoes)
+
+    # INCLINOMETRO e demais tipos mantêm a descrição
+    return descricoes
+
+
+def validar_bloco(bloco):
+    """
+    Valida um bloco de linhas já separadas em colunas (todas como texto).
+    Converte as colunas numéricas e aplica as faixas de coordenadas como máscaras.
+    Retorna somente as linhas válidas.
+    """
+    bloco = bloco.apply(lambda coluna: coluna.str.strip())
+    # Descrição vazia é válida, como na versão antiga (vira '' ou 'PR ' em formatar_placa)
+    bloco['descricao'] = bloco['descricao'].fillna('')
+
+    # O número do ponto precisa ser inteiro (equivalente ao int() da versão antiga)
+    mascara = bloco['numero'].str.fullmatch(r'[+-]?\d+').fillna(False).astype(bool)
+
+    valores = {}
+    for coluna, (minimo, maximo) in LIMITES_COORDENADAS.items():
+        valores[coluna] = pd.to_numeric(bloco[coluna], errors='coerce')
+        mascara &= valores[coluna].between(minimo, maximo).fillna(False).astype(bool)
+
+    validos = pd.DataFrame({
+        'numero': pd.to_numeric(bloco['numero'][mascara]).astype('int64'),
+        'descricao': bloco['descricao'][mascara],
+        'este': valores['este'][mascara],
+        'norte': valores['norte'][mascara],
+        'cota': valores['cota'][mascara],
+    })
+    return validos
+
+
+def ler_blocos_txt(arquivo, tipo, data, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Lê o arquivo TXT em blocos de 'tamanho_bloco' linhas e devolve (gerador)
+    DataFrames com os registros válidos de cada bloco, já com placa formatada,
+    tipo e data preenchidos.
+    A linha de cabeçalho iniciada por 'M' é descartada pela própria validação.
+    Só campos vazios contam como ausentes: textos como 'NA', 'N/A' ou 'NULL'
+    são descrições válidas, não valores nulos.
+    """
+    try:
+        leitor = pd.read_csv(
+            arquivo,
+            header=None,
+            names=COLUNAS_TXT,
+            usecols=range(len(COLUNAS_TXT)),
+            dtype=str,
+            keep_default_na=False,
+            na_values=[''],
+            encoding='latin-1',
+            quoting=csv.QUOTE_NONE,
+            on_bad_lines='skip',
+            chunksize=tamanho_bloco,
+        )
+    except pd.errors.EmptyDataError:
+        # Arquivo vazio: nenhum registro
+        return
+
+    with leitor:
+        for bloco in leitor:
+            validos = validar_bloco(bloco)
+            if validos.empty:
+                continue
+            validos['descricao'] = formatar_placa(validos['descricao'], tipo)
+            validos['tipo'] = tipo
+            validos['data'] = data
+            yield validos
+
+
+def ler_registros_txt(arquivo, tipo, data, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Lê o arquivo TXT inteiro (em blocos) e retorna um único DataFrame
+    com todos os registros válidos.
+    """
+    blocos = list(ler_blocos_txt(arquivo, tipo, data, tamanho_bloco))
+    if not blocos:
+        return pd.DataFrame(columns=COLUNAS_TXT + ['tipo', 'data'])
+    return pd.concat(blocos, ignore_index=True)
+
+
+def abrir_conexao_ingestao(caminho_banco=BANCO_LEITURAS):
+    """
+    Abre a conexão usada na gravação em lote das leituras.
+    - Transações controladas manualmente (BEGIN/COMMIT explícitos);
+    - Conexão do pool compartilhado (WAL, synchronous=NORMAL), para que as
+      outras páginas continuem lendo enquanto a ingestão grava;
+    - Leituras e registro de arquivos no mesmo banco: cada arquivo grava suas
+      leituras e sua situação na mesma transação.
+    """
+    return obter_conexao(caminho_banco, isolation_level=None)
+
+
+def linhas_para_insercao(bloco, nome_arquivo):
+    """
+    Converte um bloco de registros válidos nas tuplas do INSERT de dados_placa_geral.
+    """
+    return zip(bloco['data'],
+               bloco['cota'].tolist(),
+               bloco['este'].tolist(),
+               bloco['norte'].tolist(),
+               bloco['tipo'],
+               bloco['descricao'],
+               repeat(nome_arquivo))
+
+
+def inserir_leituras(conn, nome_arquivo, blocos):
+    """
+    Insere os blocos de leituras de um arquivo com executemany, marcando cada
+    linha com o arquivo de origem. Leituras que já existem no banco (mesma
+    chave natural) são ignoradas. Não controla transação.
+    Retorna o número de registros inseridos.
+    """
+    total = 0
+    for bloco in blocos:
+        cursor = conn.executemany('''INSERT OR IGNORE INTO dados_placa_geral
+                                     (dt_data, ct_cota, cd_este, cd_norte, lc_local, pl_placa, arquivo_origem)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                  linhas_para_insercao(bloco, nome_arquivo))
+        total += cursor.rowcount
+    return total
+
+
+def gravar_leituras_arquivo(conn, nome_arquivo, blocos):
+    """
+    Grava os blocos de leituras de um arquivo com executemany e marca o arquivo
+    como processado, em uma única transação só deste arquivo.
+    Um arquivo 'alterado' (conteúdo mudou depois de gravado) ou com 'erro'
+    (falhou no processamento automático) tem as leituras da versão anterior
+    substituídas (substituir_leituras), mesmo que a nova versão não tenha
+    registros válidos.
+    Se o arquivo já estiver processado, se nenhum registro for válido ou se
+    ocorrer erro, a transação é desfeita. Um arquivo cujas leituras já estavam
+    todas no banco é marcado como processado com 0 registros gravados.
+    Retorna o número de registros gravados.
+    """
+    if isinstance(blocos, pd.DataFrame):
+        blocos = [blocos]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        total = 0
+        validos = sum(len(bloco) for bloco in blocos)
+        situacao = conn.execute("SELECT processamento FROM arquivos WHERE nome_arquivo = ?",
+                                (nome_arquivo,)).fetchone()
+        # Um arquivo com 'erro' pode ter falhado depois de alterado: também é substituído
+        alterado = situacao is not None and situacao[0] in ('alterado', 'erro')
+        # Marca antes de gravar: se outra execução já processou o arquivo, não grava de novo
+        marcado = (validos > 0 or alterado) and marcar_como_processado(conn, nome_arquivo)
+        if marcado and alterado:
+            total = substituir_leituras(conn, nome_arquivo, blocos)['gravados']
+        elif marcado:
+            total = inserir_leituras(conn, nome_arquivo, blocos)
+
+        conn.execute("COMMIT" if marcado else "ROLLBACK")
+        return total
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def marcar_como_processado(conn, nome_arquivo):
+    """
+    Marca o arquivo como processado no registro 'arquivos'.
+    Retorna False se o arquivo já estava processado.
+    """
+    cursor = conn.execute("""UPDATE arquivos SET processamento = 'processado'
+                             WHERE nome_arquivo = ?
+                               AND (processamento IS NULL
+                                    OR processamento IN ('nao_processado', 'alterado', 'erro'))""",
+                          (nome_arquivo,))
+    return cursor.rowcount > 0
+
+
+def analisar_arquivo(nome_arquivo, caminho, tipo, data):
+    """
+    Lê e valida um arquivo TXT inteiro. Executada nos processos do pool,
+    por isso não acessa o banco nem o Streamlit.
+    Retorna (nome_arquivo, DataFrame de registros válidos, segundos gastos).
+    """
+    inicio = time.perf_counter()
+    registros = ler_registros_txt(caminho, tipo, data)
+    return nome_arquivo, registros, time.perf_counter() - inicio
+
+
+def _gravar_fila(fila, resultados, erros):
+    """
+    Thread gravadora: consome da fila os arquivos já analisados e grava cada um
+    em sua própria transação, sempre pela mesma conexão. Um item None encerra a fila.
+    """
+    try:
+        conn = abrir_conexao_ingestao()
+    except Exception as e:
+        erros.append(str(e))
+        # Esvazia a fila para não travar quem está entregando os arquivos
+        while fila.get() is not None:
+            pass
+        return
+
+    try:
+        while True:
+            item = fila.get()
+            if item is None:
+                break
+            nome_arquivo, registros = item
+            inicio = time.perf_counter()
+            try:
+                gravados = gravar_leituras_arquivo(conn, nome_arquivo, registros)
+                resultados[nome_arquivo]['gravados'] = gravados
+                resultados[nome_arquivo]['situacao'] = 'gravado' if gravados else 'nada gravado'
+            except Exception as e:
+                resultados[nome_arquivo]['situacao'] = f"erro ao gravar: {e}"
+            resultados[nome_arquivo]['tempo_gravacao'] = time.perf_counter() - inicio
+    finally:
+        conn.close()
+
+
+def ingerir_arquivos(arquivos, processos=1, ao_progresso=None):
+    """
+    Ingere vários arquivos TXT: a análise (leitura e validação) roda em um pool
+    de 'processos' processos e uma única thread gravadora grava, arquivo a
+    arquivo, as leituras e a situação do arquivo em banco_dados.db.
+    'arquivos' é uma lista de (nome_arquivo, caminho, tipo, data).
+    'ao_progresso(nome_arquivo, concluidos, total)' é chamada na thread de quem
+    chamou a função a cada arquivo analisado.
+    Retorna (lista de resultados por arquivo, resumo da execução). Se não for
+    possível abrir o banco, o resumo traz 'erro' e nada é gravado.
+    """
+    inicio = time.perf_counter()
+    total = len(arquivos)
+    resultados = {
+        nome: {'arquivo': nome, 'validos': 0, 'gravados': 0, 'tempo_analise': 0.0,
+               'tempo_gravacao': 0.0, 'situacao': 'pendente'}
+        for nome, _, _, _ in arquivos
+    }
+    erros = []
+    fila = queue.Queue()
+    gravador = threading.Thread(target=_gravar_fila, args=(fila, resultados, erros), daemon=True)
+    gravador.start()
+
+    def entregar(nome_arquivo, registros, tempo, concluidos):
+        resultados[nome_arquivo]['validos'] = len(registros)
+        resultados[nome_arquivo]['tempo_analise'] = tempo
+        fila.put((nome_arquivo, registros))
+        if ao_progresso:
+            ao_progresso(nome_arquivo, concluidos, total)
+
+    try:
+        if processos > 1 and total > 1:
+            # 'spawn' evita copiar as threads do servidor Streamlit para os filhos
+            contexto = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(processos, total), mp_context=contexto) as pool:
+                futuros = {pool.submit(analisar_arquivo, *arquivo): arquivo[0] for arquivo in arquivos}
+                for concluidos, futuro in enumerate(as_completed(futuros), start=1):
+                    nome_arquivo = futuros[futuro]
+                    try:
+                        entregar(*futuro.result(), concluidos)
+                    except Exception as e:
+                        resultados[nome_arquivo]['situacao'] = f"erro ao ler: {e}"
+                        if ao_progresso:
+                            ao_progresso(nome_arquivo, concluidos, total)
+        else:
+            for concluidos, arquivo in enumerate(arquivos, start=1):
+                try:
+                    entregar(*analisar_arquivo(*arquivo), concluidos)
+                except Exception as e:
+                    resultados[arquivo[0]]['situacao'] = f"erro ao ler: {e}"
+                    if ao_progresso:
+                        ao_progresso(arquivo[0], concluidos, total)
+    finally:
+        fila.put(None)
+        gravador.join()
+
+    decorrido = time.perf_counter() - inicio
+    total_gravados = sum(r['gravados'] for r in resultados.values())
+    resumo = {
+        'arquivos': total,
+        'registros': total_gravados,
+        'segundos': decorrido,
+        'registros_por_segundo': total_gravados / decorrido if decorrido > 0 else 0,
+        'erro': erros[0] if erros else None,
+    }
+    if erros:
+        for resultado in resultados.values():
+            resultado['situacao'] = 'não gravado'
+    return list(resultados.values()), resumo
+
+
+def tabela_existe(conn, tabela):
+    """
+    Indica se a tabela existe no banco da conexão.
+    """
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (tabela,)).fetchone() is not None
+
+
+def contar_linhas_arquivo(conn, nome_arquivo):
+    """
+    Conta as linhas geradas pelo arquivo em dados_placa_geral e em
+    placas_completas_slu_bh (0 se a tabela não existir).
+    """
+    contagens = {}
+    for tabela in ('dados_placa_geral', 'placas_completas_slu_bh'):
+        if tabela_existe(conn, tabela):
+            contagens[tabela] = conn.execute(
+                f"SELECT COUNT(*) FROM {tabela} WHERE {COLUNA_ORIGEM} = ?", (nome_arquivo,)).fetchone()[0]
+        else:
+            contagens[tabela] = 0
+    return contagens
+
+
+# Colunas de placas_completas_slu_bh preenchidas a partir de dados_placa_geral
+MAPEAMENTO_TRANSFERENCIA = {
+    'data': 'dt_data',
+    'tipo': 'lc_local',
+    'descricao': "''",
+    'coordenada_este': 'cd_este',
+    'coordenada_norte': 'cd_norte',
+    'elevacao': 'ct_cota',
+    'placa': 'pl_placa',
+    COLUNA_ORIGEM: COLUNA_ORIGEM,
+}
+
+# Chave natural de placas_completas_slu_bh: a leitura inteira (tipo, placa, data e coordenadas)
+CHAVE_TRANSFERENCIA = CHAVES_NATURAIS['placas_completas_slu_bh']
+
+
+def _consulta_transferencia(nome_arquivo=None, colunas_adicionais=(), por_id=False):
+    """
+    SELECT DISTINCT das leituras válidas de dados_placa_geral (de todos os
+    arquivos ou só de 'nome_arquivo'; com por_id=True, só a leitura do id
+    passado como último parâmetro) que ainda não existem em
+    placas_completas_slu_bh pela chave natural (CHAVE_TRANSFERENCIA), com as
+    colunas já nomeadas como no destino.
+    Retorna (colunas do destino, sql, parâmetros).
+    """
+    mapeamento = dict(MAPEAMENTO_TRANSFERENCIA)
+    mapeamento.update((coluna, coluna) for coluna in colunas_adicionais if coluna not in mapeamento)
+
+    condicoes = [FILTRO_LEITURAS_VALIDAS]
+    parametros = []
+    if nome_arquivo is not None:
+        condicoes.append(f"{COLUNA_ORIGEM} = ?")
+        parametros.append(nome_arquivo)
+    if por_id:
+        condicoes.append("id = ?")
+
+    sql = f"""
+        SELECT DISTINCT {", ".join(f"{origem} AS {destino}" for destino, origem in mapeamento.items())}
+        FROM dados_placa_geral
+        WHERE {" AND ".join(f"({condicao})" for condicao in condicoes)}
+          AND NOT EXISTS (SELECT 1 FROM placas_completas_slu_bh p
+                          WHERE {" AND ".join(f"p.{destino} IS dados_placa_geral.{MAPEAMENTO_TRANSFERENCIA[destino]}"
+                                              for destino in CHAVE_TRANSFERENCIA)})"""
+    return list(mapeamento), sql, parametros
+
+
+def transferir_leituras(conn, nome_arquivo=None, colunas_adicionais=()):
+    """
+    Copia para placas_completas_slu_bh as leituras válidas de dados_placa_geral
+    (de todos os arquivos ou só de 'nome_arquivo') com um único
+    INSERT ... SELECT DISTINCT, deixando de fora as que já existem no destino
+    pela chave natural (CHAVE_TRANSFERENCIA). Pode ser repetida sem duplicar.
+    'colunas_adicionais' são colunas de mesmo nome nas duas tabelas copiadas
+    junto. Não controla transação.
+    Retorna o número de registros transferidos.
+    """
+    colunas, sql, parametros = _consulta_transferencia(nome_arquivo, colunas_adicionais)
+    cursor = conn.execute(f"INSERT OR IGNORE INTO placas_completas_slu_bh ({', '.join(colunas)}) {sql}",
+                          parametros)
+    return cursor.rowcount
+
+
+def contar_leituras_a_transferir(conn, nome_arquivo=None):
+    """
+    Quantidade de leituras que transferir_leituras copiaria agora (só as que
+    ainda não estão no destino), contada no banco, sem ler as linhas.
+    Conta leituras distintas pela chave do destino (CHAVE_TRANSFERENCIA), como
+    o INSERT OR IGNORE: a mesma leitura vinda de dois arquivos conta uma vez.
+    """
+    _, sql, parametros = _consulta_transferencia(nome_arquivo)
+    return conn.execute(f"SELECT COUNT(*) FROM (SELECT DISTINCT {', '.join(CHAVE_TRANSFERENCIA)} FROM ({sql}))",
+                        parametros).fetchone()[0]
+
+
+def amostra_leituras_a_transferir(conn, limite=100, nome_arquivo=None):
+    """
+    Primeiras 'limite' leituras que transferir_leituras copiaria agora.
+    Retorna (colunas, linhas).
+    """
+    colunas, sql, parametros = _consulta_transferencia(nome_arquivo)
+    return colunas, conn.execute(f"{sql} LIMIT ?", parametros + [limite]).fetchall()
+
+
+def transferir_leituras_ids(conn, ids):
+    """
+    Copia para placas_completas_slu_bh só as leituras válidas de
+    dados_placa_geral com os ids informados, com o mesmo filtro e a mesma
+    chave da transferência geral (um INSERT ... SELECT por id, pelo índice da
+    chave primária). Não controla transação.
+    Retorna o número de registros transferidos.
+    """
+    colunas, sql, parametros = _consulta_transferencia(por_id=True)
+    cursor = conn.executemany(f"INSERT OR IGNORE INTO placas_completas_slu_bh ({', '.join(colunas)}) {sql}",
+                              [parametros + [id_leitura] for id_leitura in ids])
+    return cursor.rowcount
+
+
+def transferir_leituras_arquivo(conn, nome_arquivo):
+    """
+    Copia para placas_completas_slu_bh as leituras válidas de um arquivo,
+    com o mesmo filtro da transferência geral (página 4). Não controla transação.
+    Retorna o número de registros transferidos.
+    """
+    return transferir_leituras(conn, nome_arquivo)
+
+
+def substituir_leituras(conn, nome_arquivo, blocos):
+    """
+    Troca as leituras de um arquivo pelas dos blocos:
+    - apaga as linhas do arquivo em dados_placa_geral e placas_completas_slu_bh;
+    - grava as leituras dos blocos;
+    - se o arquivo já tinha sido transferido, transfere de novo as leituras válidas.
+    Apenas as linhas marcadas com o arquivo de origem são alteradas. Não
+    controla transação: quem chama apaga e grava na mesma transação.
+    Retorna um dicionário com as quantidades removidas, gravadas e transferidas.
+    """
+    removidos = conn.execute(f"DELETE FROM dados_placa_geral WHERE {COLUNA_ORIGEM} = ?",
+                             (nome_arquivo,)).rowcount
+    removidos_completas = 0
+    if tabela_existe(conn, 'placas_completas_slu_bh'):
+        removidos_completas = conn.execute(
+            f"DELETE FROM placas_completas_slu_bh WHERE {COLUNA_ORIGEM} = ?",
+            (nome_arquivo,)).rowcount
+
+    gravados = inserir_leituras(conn, nome_arquivo, blocos)
+    transferidos = transferir_leituras_arquivo(conn, nome_arquivo) if removidos_completas else 0
+    return {
+        'removidos': removidos,
+        'removidos_completas': removidos_completas,
+        'gravados': gravados,
+        'transferidos': transferidos,
+    }
+
+
+def reprocessar_arquivo(nome_arquivo, caminho, tipo, data, caminho_banco=BANCO_LEITURAS):
+    """
+    Refaz a ingestão de um único arquivo TXT, em uma só transação:
+    - atualiza tipo e data do arquivo no registro 'arquivos';
+    - substitui as leituras do arquivo (substituir_leituras).
+    Retorna um dicionário com as quantidades removidas, gravadas e transferidas.
+    """
+    registros = ler_registros_txt(caminho, tipo, data)
+
+    conn = abrir_conexao_ingestao(caminho_banco)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute("""UPDATE arquivos
+                                     SET tipo = ?, dia = ?, mes = ?, ano = ?, processamento = 'processado'
+                                     WHERE nome_arquivo = ?""",
+                                  (tipo, data.day, data.month, data.year, nome_arquivo))
+            if cursor.rowcount == 0:
+                raise ValueError(f"Arquivo '{nome_arquivo}' não está registrado")
+
+            resultado = substituir_leituras(conn, nome_arquivo, [registros])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    return resultado
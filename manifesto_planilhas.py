@@ -0,0 +1,133 @@
+import hashlib
+from datetime import date, datetime
+
+# Colunas (A a J) e linhas finais dos dados que entram na impressão digital
+COLUNAS_IMPRESSAO = 10
+LINHAS_IMPRESSAO = 3
+
+
+def _valor(ws, row, col):
+    # Lê sem criar a célula (ws.cell cria células vazias e aumenta o max_row)
+    cell = ws._cells.get((row, col))
+    return cell.value if cell is not None else None
+
+
+def _normalizar(valor):
+    # Valores como voltam ao reabrir o arquivo: date vira datetime e 11.0 vira 11
+    if isinstance(valor, date) and not isinstance(valor, datetime):
+        return datetime(valor.year, valor.month, valor.day)
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def impressao_digital(ws, ultima_linha):
+    """
+    Impressão digital do fim dos dados da planilha: hash dos valores das
+    colunas A a J das últimas LINHAS_IMPRESSAO linhas até ultima_linha.
+    Muda quando alguém edita, apaga ou insere linhas no fim dos dados.
+    """
+    resumo = hashlib.sha1()
+    for row in range(max(1, ultima_linha - LINHAS_IMPRESSAO + 1), ultima_linha + 1):
+        valores = [_normalizar(_valor(ws, row, col)) for col in range(1, COLUNAS_IMPRESSAO + 1)]
+        resumo.update(repr((row, valores)).encode('utf-8'))
+    return resumo.hexdigest()
+
+
+def data_iso_celula(valor):
+    """
+    Data da célula como texto AAAA-MM-DD, ou None se a célula não for data.
+    """
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return None
+
+
+def ler_manifesto(conn, nome_arquivo=None):
+    """
+    Registros do manifesto (de um arquivo ou de todos):
+    {(nome_arquivo, nome_planilha): (ultima_linha, ultima_data, impressao_digital)}.
+    """
+    sql = "SELECT nome_arquivo, nome_planilha, ultima_linha, ultima_data, impressao_digital FROM manifesto_planilhas"
+    parametros = ()
+    if nome_arquivo is not None:
+        sql += " WHERE nome_arquivo = ?"
+        parametros = (nome_arquivo,)
+    return {(arquivo, planilha): (linha, data, impressao)
+            for arquivo, planilha, linha, data, impressao in conn.execute(sql, parametros)}
+
+
+def registro_confere(ws, registro):
+    """
+    True se o registro do manifesto ainda descreve a planilha: a impressão
+    digital bate e não há dados na coluna A logo abaixo da última linha.
+    """
+    if not registro:
+        return False
+    ultima_linha, _, impressao = registro
+    return (bool(ultima_linha) and impressao is not None
+            and _valor(ws, ultima_linha + 1, 1) is None
+            and impressao_digital(ws, ultima_linha) == impressao)
+
+
+def procurar_ultima_linha(ws, coluna=1):
+    """
+    Última linha com valor na coluna (A por padrão), de baixo para cima.
+    Retorna 0 se a coluna estiver vazia.
+    """
+    for row in range(ws.max_row, 0, -1):
+        if _valor(ws, row, coluna) is not None:
+            return row
+    return 0
+
+
+def localizar_fim_dados(ws, registro=None):
+    """
+    Última linha com dados da planilha e a data dessa linha (AAAA-MM-DD ou
+    None): as do manifesto quando ele confere com a planilha (sem varredura)
+    ou, se não conferir, uma única varredura.
+    Retorna (ultima_linha, ultima_data).
+    """
+    if registro_confere(ws, registro):
+        return registro[0], registro[1]
+    ultima_linha = procurar_ultima_linha(ws)
+    return ultima_linha, data_iso_celula(_valor(ws, ultima_linha, 1)) if ultima_linha else None
+
+
+def montar_registro(ws, nome_arquivo, nome_planilha, ultima_linha, ultima_data=None):
+    """
+    Registro do manifesto de uma planilha recém-gravada. Sem ultima_data,
+    usa a data da coluna A da última linha.
+    Retorna (nome_arquivo, nome_planilha, ultima_linha, ultima_data, impressao_digital).
+    """
+    if ultima_data is None and ultima_linha:
+        ultima_data = data_iso_celula(_valor(ws, ultima_linha, 1))
+    return (nome_arquivo, nome_planilha, ultima_linha, ultima_data,
+            impressao_digital(ws, ultima_linha) if ultima_linha else None)
+
+
+def atualizar_manifesto(conn, registros, etapa):
+    """
+    Grava (insere ou substitui) os registros de montar_registro no manifesto,
+    em uma única transação. 'etapa' identifica a página que gravou.
+    Deve ser chamada depois de salvar o arquivo: se falhar, a impressão
+    digital antiga não confere e a próxima etapa varre a planilha.
+    """
+    registros = list(registros)
+    if not registros:
+        return 0
+    with conn:
+        conn.executemany("""
+            INSERT INTO manifesto_planilhas
+                (nome_arquivo, nome_planilha, ultima_linha, ultima_data, impressao_digital, etapa, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (nome_arquivo, nome_planilha) DO UPDATE SET
+                ultima_linha = excluded.ultima_linha,
+                ultima_data = excluded.ultima_data,
+                impressao_digital = excluded.impressao_digital,
+                etapa = excluded.etapa,
+                atualizado_em = excluded.atualizado_em""",
+                         [registro + (etapa,) for registro in registros])
+    return len(registros)
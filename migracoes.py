@@ -0,0 +1,488 @@
+import os
+import sqlite3
+
+# Banco antigo do registro de arquivos, importado uma única vez para banco_dados.db
+BANCO_ARQUIVOS_LEGADO = 'arquivos.db'
+
+# Colunas de dados das tabelas de leituras (copiadas na sincronização e no registro de alterações)
+COLUNAS_LEITURAS = {
+    'dados_placa_geral': ('dt_data', 'ct_cota', 'cd_este', 'cd_norte', 'lc_local', 'pl_placa', 'arquivo_origem'),
+    'placas_completas_slu_bh': ('data', 'tipo', 'descricao', 'coordenada_este', 'coordenada_norte', 'elevacao',
+                                'placa', 'arquivo_origem'),
+}
+
+# Chave natural de cada tabela de leituras (índice único ux_<tabela>_chave): a
+# leitura inteira, já que uma placa pode ter mais de uma leitura no mesmo dia
+CHAVES_NATURAIS = {
+    'dados_placa_geral': ('pl_placa', 'dt_data', 'cd_este', 'cd_norte', 'ct_cota'),
+    'placas_completas_slu_bh': ('tipo', 'placa', 'data', 'coordenada_este', 'coordenada_norte', 'elevacao'),
+}
+
+# Índices simples das consultas por placa e data (idx_<tabela>_<colunas>)
+INDICES_CONSULTA = {
+    'placas_completas_slu_bh': ('tipo', 'placa', 'data'),
+}
+
+# Coluna de data de cada tabela de leituras, gravada em formatos variados
+# (AAAA-MM-DD, DD/MM/AAAA, ...), e a coluna calculada com a data normalizada
+COLUNAS_DATA = {
+    'dados_placa_geral': 'dt_data',
+    'placas_completas_slu_bh': 'data',
+}
+COLUNA_DATA_ISO = 'data_iso'
+
+
+def _colunas(conn, tabela):
+    return {coluna[1] for coluna in conn.execute(f"PRAGMA table_info({tabela})")}
+
+
+def _garantir_colunas(conn, tabela, colunas):
+    """
+    Acrescenta à tabela as colunas (nome -> definição) que ainda não existirem.
+    """
+    existentes = _colunas(conn, tabela)
+    for coluna, definicao in colunas.items():
+        if coluna not in existentes:
+            conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+
+
+def _isolar_duplicados(conn, tabela, chave):
+    """
+    Antes de criar uma chave única, move para <tabela>_duplicados as linhas que
+    repetem a chave de uma linha anterior (fica a de menor id).
+    Retorna o número de linhas movidas (contar_linhas_isoladas mostra o total).
+    """
+    lista_chave = ", ".join(chave)
+    repetidas = f"""id NOT IN (SELECT MIN(id) FROM {tabela} GROUP BY {lista_chave})
+                    AND {' AND '.join(f'{coluna} IS NOT NULL' for coluna in chave)}"""
+    if conn.execute(f"SELECT 1 FROM {tabela} WHERE {repetidas} LIMIT 1").fetchone() is None:
+        return 0
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela}_duplicados AS SELECT * FROM {tabela} WHERE 0")
+    # A tabela de duplicados criada por uma migração anterior pode não ter as colunas mais novas
+    colunas = ", ".join(c for c in _colunas(conn, f"{tabela}_duplicados") if c in _colunas(conn, tabela))
+    movidas = conn.execute(f"INSERT INTO {tabela}_duplicados ({colunas}) "
+                           f"SELECT {colunas} FROM {tabela} WHERE {repetidas}").rowcount
+    conn.execute(f"DELETE FROM {tabela} WHERE {repetidas}")
+    return movidas
+
+
+def contar_linhas_isoladas(conn):
+    """
+    Linhas que as migrações moveram para <tabela>_duplicados ao criar as
+    chaves únicas, por tabela de leituras (só as tabelas com linhas).
+    """
+    contagens = {}
+    for tabela in CHAVES_NATURAIS:
+        duplicados = f"{tabela}_duplicados"
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                        (duplicados,)).fetchone() is None:
+            continue
+        quantidade = conn.execute(f"SELECT COUNT(*) FROM {duplicados}").fetchone()[0]
+        if quantidade:
+            contagens[duplicados] = quantidade
+    return contagens
+
+
+def criar_tabelas_leituras(conn):
+    """
+    Tabelas de leituras (dados_placa_geral) e de placas completas
+    (placas_completas_slu_bh), com a coluna do arquivo TXT de origem.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS dados_placa_geral
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     dt_data DATE,
+                     ct_cota REAL,
+                     cd_este REAL,
+                     cd_norte REAL,
+                     lc_local TEXT,
+                     pl_placa TEXT,
+                     arquivo_origem TEXT)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS placas_completas_slu_bh
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     data TEXT,
+                     tipo TEXT,
+                     descricao TEXT,
+                     coordenada_este REAL,
+                     coordenada_norte REAL,
+                     elevacao REAL,
+                     placa TEXT,
+                     arquivo_origem TEXT)''')
+    _garantir_colunas(conn, 'dados_placa_geral', {'arquivo_origem': 'TEXT'})
+    _garantir_colunas(conn, 'placas_completas_slu_bh', {
+        'data': 'TEXT', 'tipo': 'TEXT', 'descricao': 'TEXT', 'coordenada_este': 'REAL',
+        'coordenada_norte': 'REAL', 'elevacao': 'REAL', 'placa': 'TEXT', 'arquivo_origem': 'TEXT',
+    })
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_dados_placa_geral_arquivo_origem "
+                 "ON dados_placa_geral (arquivo_origem)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_placas_completas_slu_bh_arquivo_origem "
+                 "ON placas_completas_slu_bh (arquivo_origem)")
+
+
+def criar_tabelas_controle(conn):
+    """
+    Registro dos arquivos TXT ('arquivos') e tabelas de controle das planilhas
+    (verificacao_planilhas da página 5 e ultima_linha_arquivos da página 7).
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS arquivos
+                    (nome_arquivo TEXT PRIMARY KEY,
+                     tipo TEXT,
+                     dia INTEGER,
+                     mes INTEGER,
+                     ano INTEGER,
+                     registros INTEGER)''')
+    _garantir_colunas(conn, 'arquivos', {
+        'processamento': "TEXT DEFAULT 'nao_processado'",
+        'tamanho': "INTEGER",
+        'mtime': "REAL",
+        'hash_conteudo': "TEXT",
+    })
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_arquivos_hash ON arquivos (hash_conteudo)")
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS verificacao_planilhas
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     nome_arquivo TEXT,
+                     nome_planilha TEXT,
+                     ultima_linha_valida INTEGER,
+                     data_registro TEXT,
+                     data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS ultima_linha_arquivos
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     nome_arquivo TEXT,
+                     nome_planilha TEXT,
+                     linha_informacao INTEGER,
+                     data_ultimo_registro TEXT,
+                     data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_verificacao_planilhas_planilha "
+                 "ON verificacao_planilhas (nome_arquivo, nome_planilha)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ultima_linha_arquivos_planilha "
+                 "ON ultima_linha_arquivos (nome_arquivo, nome_planilha)")
+
+
+def importar_registro_legado(conn, caminho_legado=BANCO_ARQUIVOS_LEGADO):
+    """
+    Copia a tabela 'arquivos' do antigo arquivos.db, se ele existir.
+    """
+    if not os.path.exists(caminho_legado):
+        return
+    legado = sqlite3.connect(caminho_legado)
+    try:
+        colunas_legado = _colunas(legado, 'arquivos')
+        colunas = [coluna for coluna in conn.execute("PRAGMA table_info(arquivos)")
+                   if coluna[1] in colunas_legado]
+        if not colunas:
+            return
+        nomes = [coluna[1] for coluna in colunas]
+        linhas = legado.execute(f"SELECT {', '.join(nomes)} FROM arquivos").fetchall()
+    finally:
+        legado.close()
+    conn.executemany(f"INSERT OR IGNORE INTO arquivos ({', '.join(nomes)}) "
+                     f"VALUES ({', '.join('?' for _ in nomes)})", linhas)
+
+
+def criar_chaves_naturais(conn):
+    """
+    Chaves únicas que permitem INSERT OR IGNORE e servem de índice às consultas
+    por placa e data:
+    - dados_placa_geral: (pl_placa, dt_data, cd_este, cd_norte, ct_cota), uma leitura;
+    - placas_completas_slu_bh: (tipo, placa, data, coordenada_este,
+      coordenada_norte, elevacao), uma leitura.
+    Linhas que já repetiam a chave vão para <tabela>_duplicados.
+    """
+    for tabela, chave in CHAVES_NATURAIS.items():
+        _isolar_duplicados(conn, tabela, chave)
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{tabela}_chave ON {tabela} ({', '.join(chave)})")
+
+
+def tabela_alteracoes(tabela):
+    return f"{tabela}_alteracoes"
+
+
+def criar_registro_alteracoes(conn):
+    """
+    Registro de alterações (changelog) das tabelas de leituras, mantido por
+    triggers: cada INSERT, UPDATE ou DELETE gera uma linha em
+    <tabela>_alteracoes com a operação ('I', 'U', 'D'), os valores novos e a
+    chave natural antiga (antigo_<coluna>). A sincronização aplica no destino
+    só as alterações com seq maior que a última já sincronizada.
+    """
+    for tabela, colunas in COLUNAS_LEITURAS.items():
+        chave = CHAVES_NATURAIS[tabela]
+        alteracoes = tabela_alteracoes(tabela)
+        tipos = {coluna[1]: coluna[2] for coluna in conn.execute(f"PRAGMA table_info({tabela})")}
+        definicoes = [f"{c} {tipos.get(c, '')}".strip() for c in colunas]
+        definicoes += [f"antigo_{c} {tipos.get(c, '')}".strip() for c in chave]
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {alteracoes}
+                         (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                          operacao TEXT NOT NULL,
+                          id_linha INTEGER,
+                          {", ".join(definicoes)},
+                          momento TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+        lista = ", ".join(colunas)
+        lista_antigos = ", ".join(f"antigo_{c}" for c in chave)
+        novos = ", ".join(f"NEW.{c}" for c in colunas)
+        antigos = ", ".join(f"OLD.{c}" for c in chave)
+        nulos_novos = ", ".join("NULL" for _ in colunas)
+        nulos_antigos = ", ".join("NULL" for _ in chave)
+        gatilhos = {
+            'insert': f"VALUES ('I', NEW.id, {novos}, {nulos_antigos})",
+            'update': f"VALUES ('U', NEW.id, {novos}, {antigos})",
+            'delete': f"VALUES ('D', OLD.id, {nulos_novos}, {antigos})",
+        }
+        for evento, valores in gatilhos.items():
+            conn.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{tabela}_{evento}
+                             AFTER {evento.upper()} ON {tabela}
+                             BEGIN
+                                 INSERT INTO {alteracoes} (operacao, id_linha, {lista}, {lista_antigos})
+                                 {valores};
+                             END''')
+
+
+def criar_controle_sincronizacao(conn):
+    """
+    Marca d'água da sincronização no banco de destino: último seq do registro
+    de alterações da origem já aplicado, por origem e tabela.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS controle_sincronizacao
+                    (origem TEXT NOT NULL,
+                     tabela TEXT NOT NULL,
+                     ultimo_seq INTEGER NOT NULL,
+                     atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     PRIMARY KEY (origem, tabela))''')
+
+
+# Abreviações de mês aceitas em datas como 14-fev-25 (português e inglês)
+MESES_ABREVIADOS = {
+    'jan': '01', 'fev': '02', 'feb': '02', 'mar': '03', 'abr': '04', 'apr': '04',
+    'mai': '05', 'may': '05', 'jun': '06', 'jul': '07', 'ago': '08', 'aug': '08',
+    'set': '09', 'sep': '09', 'out': '10', 'oct': '10', 'nov': '11', 'dez': '12', 'dec': '12',
+}
+
+
+def _dois_digitos(parte, tamanho):
+    # Dia ou mês com 1 dígito ganha o zero à esquerda
+    return parte if tamanho == 2 else f"'0' || {parte}"
+
+
+def _glob_numero(coluna, padrao):
+    # O padrão seguido do fim do texto ou de algo que não seja dígito (ex.: hora)
+    return f"({coluna} GLOB '{padrao}' OR {coluna} GLOB '{padrao}[^0-9]*')"
+
+
+def expressao_data_iso(coluna):
+    """
+    Expressão SQL que normaliza a data da coluna para AAAA-MM-DD (ordenável e
+    comparável como texto). Aceita, com ou sem hora, os formatos que as
+    páginas convertiam com strptime: AAAA-MM-DD e AAAA/MM/DD, DD/MM/AAAA e
+    DD-MM-AAAA (dia e mês com 1 ou 2 dígitos) e DD-mmm-AA ou DD-mmm-AAAA com
+    o mês abreviado (MESES_ABREVIADOS; ano com 2 dígitos como no %y: 69 a 99
+    são 19xx). Outros valores resultam em NULL.
+    """
+    d = '[0-9]'
+    casos = [
+        f"WHEN {coluna} GLOB '{d * 4}-{d * 2}-{d * 2}*' THEN substr({coluna}, 1, 10)",
+        f"WHEN {coluna} GLOB '{d * 4}/{d * 2}/{d * 2}*' THEN replace(substr({coluna}, 1, 10), '/', '-')",
+        f"WHEN {coluna} GLOB '{d * 2}[/-]{d * 2}[/-]{d * 4}*' "
+        f"THEN substr({coluna}, 7, 4) || '-' || substr({coluna}, 4, 2) || '-' || substr({coluna}, 1, 2)",
+    ]
+    for tamanho_1, tamanho_2 in ((1, 1), (1, 2), (2, 1)):
+        # AAAA-M-D: tamanho_1 é o do mês e tamanho_2 o do dia
+        mes = _dois_digitos(f"substr({coluna}, 6, {tamanho_1})", tamanho_1)
+        dia = _dois_digitos(f"substr({coluna}, {7 + tamanho_1}, {tamanho_2})", tamanho_2)
+        casos.append(f"WHEN {_glob_numero(coluna, f'{d * 4}[/-]{d * tamanho_1}[/-]{d * tamanho_2}')} "
+                     f"THEN substr({coluna}, 1, 4) || '-' || {mes} || '-' || {dia}")
+        # D/M/AAAA: tamanho_1 é o do dia e tamanho_2 o do mês
+        dia = _dois_digitos(f"substr({coluna}, 1, {tamanho_1})", tamanho_1)
+        mes = _dois_digitos(f"substr({coluna}, {tamanho_1 + 2}, {tamanho_2})", tamanho_2)
+        casos.append(f"WHEN {_glob_numero(coluna, f'{d * tamanho_1}[/-]{d * tamanho_2}[/-]{d * 4}')} "
+                     f"THEN substr({coluna}, {tamanho_1 + tamanho_2 + 3}, 4) || '-' || {mes} || '-' || {dia}")
+    letra = '[A-Za-z]'
+    for tamanho_dia in (1, 2):
+        dia = _dois_digitos(f"substr({coluna}, 1, {tamanho_dia})", tamanho_dia)
+        mes = (f"CASE lower(substr({coluna}, {tamanho_dia + 2}, 3)) "
+               + " ".join(f"WHEN '{abreviado}' THEN '{numero}'" for abreviado, numero in MESES_ABREVIADOS.items())
+               + " END")
+        inicio_ano = tamanho_dia + 6
+        casos.append(f"WHEN {_glob_numero(coluna, f'{d * tamanho_dia}-{letra * 3}-{d * 4}')} "
+                     f"THEN substr({coluna}, {inicio_ano}, 4) || '-' || {mes} || '-' || {dia}")
+        casos.append(f"WHEN {_glob_numero(coluna, f'{d * tamanho_dia}-{letra * 3}-{d * 2}')} "
+                     f"THEN CASE WHEN substr({coluna}, {inicio_ano}, 2) < '69' THEN '20' ELSE '19' END "
+                     f"|| substr({coluna}, {inicio_ano}, 2) || '-' || {mes} || '-' || {dia}")
+    return "CASE\n        " + "\n        ".join(casos) + "\n    END"
+
+
+def criar_datas_normalizadas(conn):
+    """
+    Coluna data_iso (data normalizada, AAAA-MM-DD) nas tabelas de leituras,
+    com índice. É uma coluna gerada: o SQLite a calcula a partir da coluna de
+    data em cada INSERT/UPDATE, sem trigger e sem passar pelo registro de
+    alterações, e o índice criado aqui preenche as linhas existentes.
+    Consultas por período ('últimos 5 meses', 'depois da última data') viram
+    buscas por faixa no índice, sem converter datas em Python.
+    """
+    for tabela, coluna in COLUNAS_DATA.items():
+        existentes = {c[1] for c in conn.execute(f"PRAGMA table_xinfo({tabela})")}
+        if COLUNA_DATA_ISO not in existentes:
+            conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {COLUNA_DATA_ISO} TEXT "
+                         f"GENERATED ALWAYS AS ({expressao_data_iso(coluna)}) VIRTUAL")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_{COLUNA_DATA_ISO} ON {tabela} ({COLUNA_DATA_ISO})")
+
+
+def criar_manifesto_planilhas(conn):
+    """
+    Manifesto das planilhas Excel: um registro por (arquivo, planilha) com a
+    última linha de dados, a data dessa linha e a impressão digital do fim dos
+    dados (manifesto_planilhas.impressao_digital). Todas as etapas que gravam
+    planilhas (páginas 5 a 9) leem e atualizam o mesmo registro.
+    É preenchido com o último registro de verificacao_planilhas (página 5) e a
+    última data de ultima_linha_arquivos (página 7); sem impressão digital,
+    esses registros são conferidos por varredura no primeiro uso.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS manifesto_planilhas
+                    (nome_arquivo TEXT NOT NULL,
+                     nome_planilha TEXT NOT NULL,
+                     ultima_linha INTEGER,
+                     ultima_data TEXT,
+                     impressao_digital TEXT,
+                     etapa TEXT,
+                     atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     PRIMARY KEY (nome_arquivo, nome_planilha))''')
+    conn.execute(f'''INSERT OR IGNORE INTO manifesto_planilhas
+                         (nome_arquivo, nome_planilha, ultima_linha, ultima_data, etapa)
+                     SELECT nome_arquivo, nome_planilha, ultima_linha_valida,
+                            {expressao_data_iso('data_registro')}, 'verificacao_planilhas'
+                     FROM verificacao_planilhas
+                     WHERE id IN (SELECT MAX(id) FROM verificacao_planilhas GROUP BY nome_arquivo, nome_planilha)''')
+    conn.execute(f'''INSERT INTO manifesto_planilhas
+                         (nome_arquivo, nome_planilha, ultima_linha, ultima_data, etapa)
+                     SELECT nome_arquivo, nome_planilha, linha_informacao,
+                            {expressao_data_iso('data_ultimo_registro')}, 'ultima_linha_arquivos'
+                     FROM ultima_linha_arquivos
+                     WHERE true
+                     ON CONFLICT (nome_arquivo, nome_planilha) DO UPDATE SET
+                         ultima_data = MAX(COALESCE(ultima_data, ''), COALESCE(excluded.ultima_data, ''))''')
+    conn.execute("UPDATE manifesto_planilhas SET ultima_data = NULL WHERE ultima_data = ''")
+
+
+def criar_indice_placa_data_iso(conn):
+    """
+    Índice (pl_placa, data_iso) de dados_placa_geral, na ordem em que a busca
+    de duplicados próximos percorre as leituras (placa e dia).
+    """
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_dados_placa_geral_placa_{COLUNA_DATA_ISO} "
+                 f"ON dados_placa_geral (pl_placa, {COLUNA_DATA_ISO})")
+
+
+def recriar_datas_normalizadas(conn):
+    """
+    Recria a coluna data_iso com a expressão atual de expressao_data_iso
+    (a expressão de uma coluna gerada não pode ser alterada): remove os
+    índices que usam a coluna, remove a coluna e cria de novo coluna e
+    índices, o que recalcula as datas das linhas existentes.
+    """
+    indices = []
+    for tabela in COLUNAS_DATA:
+        existentes = {c[1] for c in conn.execute(f"PRAGMA table_xinfo({tabela})")}
+        if COLUNA_DATA_ISO not in existentes:
+            continue
+        indices_tabela = [(nome, sql) for nome, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+            (tabela,)) if COLUNA_DATA_ISO in {c[2] for c in conn.execute(f"PRAGMA index_info({nome})")}]
+        for nome, _ in indices_tabela:
+            conn.execute(f"DROP INDEX {nome}")
+        conn.execute(f"ALTER TABLE {tabela} DROP COLUMN {COLUNA_DATA_ISO}")
+        indices += indices_tabela
+    criar_datas_normalizadas(conn)
+    for nome, sql in indices:
+        # sqlite_master guarda o CREATE INDEX sem o IF NOT EXISTS
+        conn.execute(sql.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1))
+
+
+def ampliar_chave_placas_completas(conn):
+    """
+    A chave (tipo, placa, data) de placas_completas_slu_bh deixava de fora a
+    segunda leitura de uma placa no mesmo dia. Troca a chave única pela leitura
+    inteira (CHAVES_NATURAIS), mantém (tipo, placa, data) como índice simples,
+    devolve à tabela as linhas isoladas em placas_completas_slu_bh_duplicados
+    que não repetem a chave nova e, se o banco tiver registro de alterações,
+    acrescenta as colunas antigo_* da chave nova e recria os triggers.
+    """
+    tabela = 'placas_completas_slu_bh'
+    chave = CHAVES_NATURAIS[tabela]
+    conn.execute(f"DROP INDEX IF EXISTS ux_{tabela}_chave")
+    criar_chaves_naturais(conn)
+    for tabela_indice, colunas in INDICES_CONSULTA.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela_indice}_{'_'.join(colunas)} "
+                     f"ON {tabela_indice} ({', '.join(colunas)})")
+
+    duplicados = f"{tabela}_duplicados"
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (duplicados,)).fetchone() is not None:
+        colunas = ['id'] + [c for c in COLUNAS_LEITURAS[tabela] if c in _colunas(conn, duplicados)]
+        lista = ", ".join(colunas)
+        conn.execute(f"INSERT OR IGNORE INTO {tabela} ({lista}) SELECT {lista} FROM {duplicados} ORDER BY id")
+        conn.execute(f"""DELETE FROM {duplicados}
+                         WHERE EXISTS (SELECT 1 FROM {tabela} t
+                                       WHERE t.id = {duplicados}.id
+                                         AND {' AND '.join(f't.{c} IS {duplicados}.{c}' for c in chave)})""")
+
+    alteracoes = tabela_alteracoes(tabela)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (alteracoes,)).fetchone() is not None:
+        tipos = {coluna[1]: coluna[2] for coluna in conn.execute(f"PRAGMA table_info({tabela})")}
+        _garantir_colunas(conn, alteracoes, {f"antigo_{c}": tipos.get(c, '') for c in chave})
+        for evento in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{tabela}_{evento}")
+        criar_registro_alteracoes(conn)
+
+
+# Migrações de cada banco: (versão, descrição, função). A versão aplicada fica
+# em PRAGMA user_version; cada migração roda uma única vez por banco.
+MIGRACOES_PRINCIPAL = [
+    (1, 'tabelas de leituras', criar_tabelas_leituras),
+    (2, 'registro de arquivos e controle das planilhas', criar_tabelas_controle),
+    (3, 'importa o antigo arquivos.db', importar_registro_legado),
+    (4, 'chaves naturais e índices por placa e data', criar_chaves_naturais),
+    (5, 'registro de alterações das leituras (triggers)', criar_registro_alteracoes),
+    (6, 'data normalizada e indexada das leituras', criar_datas_normalizadas),
+    (7, 'manifesto das planilhas Excel', criar_manifesto_planilhas),
+    (8, 'índice por placa e data normalizada', criar_indice_placa_data_iso),
+    (9, 'data normalizada aceita mais formatos', recriar_datas_normalizadas),
+    (10, 'chave de placas_completas_slu_bh pela leitura inteira', ampliar_chave_placas_completas),
+]
+
+MIGRACOES_COMPLETO = [
+    (1, 'tabelas de leituras', criar_tabelas_leituras),
+    (2, 'chaves naturais e índices por placa e data', criar_chaves_naturais),
+    (3, 'marca d\'água da sincronização', criar_controle_sincronizacao),
+    (4, 'data normalizada e indexada das leituras', criar_datas_normalizadas),
+    (5, 'data normalizada aceita mais formatos', recriar_datas_normalizadas),
+    (6, 'chave de placas_completas_slu_bh pela leitura inteira', ampliar_chave_placas_completas),
+]
+
+
+def aplicar_migracoes(conn, migracoes):
+    """
+    Aplica, em ordem, as migrações com versão maior que o PRAGMA user_version
+    do banco. Cada migração roda em sua própria transação junto com a
+    atualização do user_version. Retorna a versão final do banco.
+    """
+    isolamento = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        for versao, _, migracao in migracoes:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= versao:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Outra conexão pode ter migrado enquanto esta esperava o lock
+                if conn.execute("PRAGMA user_version").fetchone()[0] < versao:
+                    migracao(conn)
+                    conn.execute(f"PRAGMA user_version = {versao}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.isolation_level = isolamento
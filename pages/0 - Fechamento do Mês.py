@@ -0,0 +1,97 @@
+import streamlit as st
+import pandas as pd
+import os
+from arquivamento_mensal import (
+    abrir_conexao_historico,
+    fechar_mes,
+    listar_arquivos_mensais,
+    listar_meses_banco,
+    mes_atual,
+)
+from ingestao_txt import TRAVA_INGESTAO, abrir_conexao_ingestao
+
+def carregar_meses_banco():
+    # Linhas por mês de cada tabela no banco principal
+    conn = abrir_conexao_ingestao()
+    try:
+        df = pd.DataFrame(listar_meses_banco(conn), columns=['Tabela', 'Mês', 'Linhas'])
+    finally:
+        conn.close()
+    df['Mês'] = df['Mês'].fillna('data fora do padrão')
+    return df
+
+def main():
+    st.title("Fechamento do Mês")
+    st.write("""
+    Move os registros dos meses anteriores de `dados_placa_geral` e `placas_completas_slu_bh`
+    para bancos de arquivo mensal (pasta `banco_dados_arquivo`), deixando no banco principal
+    somente o mês em processamento. Execute antes da sequência 3 a 9.
+    """)
+
+    df_meses = carregar_meses_banco()
+    if df_meses.empty:
+        st.info("O banco principal não tem registros.")
+    else:
+        st.write("### Registros no banco principal")
+        st.dataframe(df_meses.pivot_table(index='Mês', columns='Tabela', values='Linhas',
+                                          aggfunc='sum', fill_value=0),
+                     use_container_width=True)
+
+    meses_validos = sorted(m for m in df_meses['Mês'].unique() if m != 'data fora do padrão')
+    opcoes = sorted(set(meses_validos) | {mes_atual()}, reverse=True)
+    mes_ativo = st.selectbox(
+        "Mês ativo (fica no banco principal)",
+        opcoes,
+        index=0,
+        help="Todos os meses anteriores a este serão movidos para os bancos de arquivo."
+    )
+
+    a_arquivar = df_meses[(df_meses['Mês'] != 'data fora do padrão') & (df_meses['Mês'] < mes_ativo)]
+    if a_arquivar.empty:
+        st.success("Nenhum mês anterior ao mês ativo no banco principal.")
+    else:
+        st.warning(f"{a_arquivar['Linhas'].sum()} registro(s) de {a_arquivar['Mês'].nunique()} mês(es) "
+                   f"serão movidos para os bancos de arquivo.")
+        compactar = st.checkbox("Compactar o banco principal após mover (VACUUM)", value=True)
+        if st.button("Fechar mês", type="primary"):
+            try:
+                with st.spinner("Movendo registros para os bancos de arquivo..."):
+                    with TRAVA_INGESTAO:
+                        movidos = fechar_mes(mes_ativo, compactar=compactar)
+                st.success(f"Fechamento concluído: {sum(linhas for _, _, linhas in movidos)} registro(s) movidos.")
+                st.dataframe(pd.DataFrame(movidos, columns=['Mês', 'Tabela', 'Linhas movidas']),
+                             use_container_width=True)
+            except Exception as e:
+                st.error(f"Erro no fechamento do mês, o mês com erro não foi alterado: {str(e)}")
+
+    # Bancos de arquivo existentes
+    st.write("### Bancos de arquivo mensal")
+    arquivos = listar_arquivos_mensais()
+    if not arquivos:
+        st.info("Nenhum mês arquivado.")
+        return
+
+    st.dataframe(pd.DataFrame(
+        [(mes, caminho, f"{os.path.getsize(caminho) / 1024 / 1024:.1f} MB") for mes, caminho in arquivos],
+        columns=['Mês', 'Arquivo', 'Tamanho']
+    ), use_container_width=True)
+
+    meses_consulta = st.multiselect("Consultar meses arquivados", [mes for mes, _ in arquivos])
+    if meses_consulta:
+        try:
+            conn = abrir_conexao_historico(meses_consulta)
+            try:
+                df_historico = pd.read_sql_query("""
+                    SELECT strftime('%Y-%m', dt_data) AS mes, COUNT(*) AS linhas,
+                           COUNT(DISTINCT pl_placa) AS placas
+                    FROM historico_dados_placa_geral
+                    GROUP BY mes
+                    ORDER BY mes""", conn)
+            finally:
+                conn.close()
+            st.dataframe(df_historico, use_container_width=True)
+        except Exception as e:
+            st.error(f"Erro ao consultar os bancos de arquivo: {str(e)}")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,30 @@ import sqlite3
 import pandas as pd
 import os
 from sqlite3 import Error
+from conexao_banco import BANCO_PRINCIPAL, obter_conexao
+from console_sql import (
+    INSTRUCOES_POR_VERIFICACAO,
+    LIMITE_LINHAS_PADRAO,
+    TEMPO_LIMITE_PADRAO,
+    cancelar_consulta,
+    executar_consulta,
+    listar_consultas_em_execucao,
+)
+from exportacao_tabelas import FORMATOS_EXPORTACAO, PARQUET_DISPONIVEL, exportar_tabela, ler_exportacao
+from importacao_tabelas import colunas_arquivo, importar_blocos, ler_blocos_arquivo
+from migracoes import contar_linhas_isoladas
+from sincronizacao import TABELAS_SINCRONIZADAS
+from consulta_tabelas import (
+    COLUNA_ROWID,
+    OPERADORES_FILTRO,
+    TAMANHOS_PAGINA,
+    aplicar_alteracoes,
+    atualizar_estatisticas,
+    buscar_pagina,
+    calcular_alteracoes,
+    contar_linhas,
+    estimar_linhas,
+)
 
 # Configuração inicial do Streamlit
 st.set_page_config(
@@ -15,7 +39,7 @@ st.set_page_config(
 # Função para conectar ao banco de dados
 def create_connection(db_file: str):
     try:
-        conn = sqlite3.connect(db_file)
+        conn = obter_conexao(db_file)
         return conn
     except Error as e:
         st.error(f"Erro ao conectar ao banco de dados: {e}")
@@ -42,13 +66,243 @@ def get_table_structure(conn, table_name):
         st.error(f"Erro ao obter estrutura da tabela: {e}")
         return []
 
-# Função para obter dados da tabela
-def get_table_data(conn, table_name):
+# Exclusões nas tabelas de leituras do banco principal chegam ao banco completo na próxima sincronização
+def warn_synced_deletes(db_file, table_name=None):
+    if os.path.abspath(db_file) != os.path.abspath(BANCO_PRINCIPAL):
+        return
+    if table_name is not None and table_name not in TABELAS_SINCRONIZADAS:
+        return
+    st.warning("Registros excluídos aqui de " + " e ".join(TABELAS_SINCRONIZADAS) + " também são "
+               "apagados do banco completo (banco_dados_completo, usado no relatório do Word) na próxima "
+               "sincronização (página 10). Para tirar os meses anteriores do banco principal, use a "
+               "página 0 (Fechamento do Mês), que guarda os registros nos bancos de arquivo mensal.")
+
+# Navegação paginada (keyset) com filtros e ordenação no SQLite
+def show_table_pages(conn, db_name, table_name, columns, editable=False):
+    with st.expander("Filtros e Ordenação", expanded=False):
+        num_filters = st.number_input("Número de filtros", min_value=0, max_value=5, value=0, key="num_filtros")
+        filters = []
+        for i in range(num_filters):
+            cols = st.columns(3)
+            with cols[0]:
+                coluna = st.selectbox(f"Coluna {i+1}", columns, key=f"filtro_coluna_{i}")
+            with cols[1]:
+                operador = st.selectbox(f"Operador {i+1}", list(OPERADORES_FILTRO), key=f"filtro_operador_{i}")
+            with cols[2]:
+                valor = st.text_input(f"Valor {i+1}", key=f"filtro_valor_{i}",
+                                      disabled=not OPERADORES_FILTRO[operador][1])
+            filters.append((coluna, operador, valor))
+
+        cols = st.columns(3)
+        with cols[0]:
+            order_by = st.selectbox("Ordenar por", [None] + columns,
+                                    format_func=lambda c: "(ordem de gravação)" if c is None else c)
+        with cols[1]:
+            descending = st.checkbox("Decrescente")
+        with cols[2]:
+            page_size = st.selectbox("Linhas por página", TAMANHOS_PAGINA, index=1)
+
+    # Volta à primeira página quando a tabela, os filtros ou a ordenação mudam
+    signature = (db_name, table_name, tuple(filters), order_by, descending, page_size)
+    if st.session_state.get('paginacao_assinatura') != signature:
+        st.session_state.paginacao_assinatura = signature
+        st.session_state.paginacao_cursores = [None]
+
+    cursors = st.session_state.paginacao_cursores
     try:
-        return pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-    except Error as e:
+        names, rows, next_cursor = buscar_pagina(conn, table_name, filters, order_by, descending,
+                                                 page_size, cursors[-1])
+    except (Error, ValueError) as e:
         st.error(f"Erro ao obter dados da tabela: {e}")
-        return pd.DataFrame()
+        return
+
+    estimate, source = estimar_linhas(conn, table_name)
+    cols = st.columns([3, 1, 1])
+    with cols[0]:
+        st.caption(f"Página {len(cursors)} · ≈ {estimate} linhas na tabela ({source})")
+    with cols[1]:
+        if st.button("Contar linhas do filtro" if filters else "Contar linhas"):
+            st.session_state.paginacao_contagem = (signature, contar_linhas(conn, table_name, filters))
+    with cols[2]:
+        if st.button("Atualizar estatísticas"):
+            atualizar_estatisticas(conn)
+            st.rerun()
+    counted = st.session_state.get('paginacao_contagem')
+    if counted and counted[0] == signature:
+        st.caption(f"{counted[1]} linha(s) atendem aos filtros.")
+
+    page = pd.DataFrame(rows, columns=names)
+    if editable:
+        edit_page(conn, table_name, columns, rows, page)
+    else:
+        st.dataframe(page.set_index(COLUNA_ROWID), use_container_width=True)
+        show_export(conn, table_name, columns, filters)
+
+    cols = st.columns(2)
+    with cols[0]:
+        if st.button("◀ Anterior", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with cols[1]:
+        if st.button("Próxima ▶", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+
+# Edição da página carregada: grava só as linhas inseridas, alteradas e excluídas
+def edit_page(conn, table_name, columns, rows, page):
+    st.caption("As alterações valem para a página atual; salve antes de mudar de página.")
+    edited_df = st.data_editor(
+        page,
+        num_rows="dynamic",
+        hide_index=True,
+        column_config={COLUNA_ROWID: st.column_config.NumberColumn("rowid", disabled=True)},
+        use_container_width=True,
+        key=f"editor_{st.session_state.get('edicoes_salvas', 0)}"
+    )
+
+    if st.button("Salvar Alterações"):
+        inserted, updated, deleted = calcular_alteracoes(columns, rows, edited_df)
+        if not (inserted or updated or deleted):
+            st.info("Nenhuma alteração para salvar.")
+            return
+        try:
+            totals = aplicar_alteracoes(conn, table_name, columns, inserted, updated, deleted)
+        except Error as e:
+            st.error(f"Erro ao salvar alterações, nada foi gravado: {e}")
+            return
+        st.session_state.edicoes_salvas = st.session_state.get('edicoes_salvas', 0) + 1
+        st.session_state.edicao_resultado = totals
+        st.rerun()
+
+    totals = st.session_state.pop('edicao_resultado', None)
+    if totals:
+        st.success(f"Alterações salvas com sucesso! {totals[0]} inserido(s), "
+                   f"{totals[1]} atualizado(s) e {totals[2]} excluído(s).")
+
+# Resultado do console SQL: dados, tempo, trabalho feito e plano da consulta
+def show_query_result(result, time_limit, row_limit):
+    if result['interrompida'] == 'tempo':
+        st.error(f"Consulta interrompida: passou do tempo limite de {time_limit} s. Nada foi gravado.")
+    elif result['interrompida'] == 'cancelada':
+        st.warning("Consulta cancelada. Nada foi gravado.")
+    elif result['linhas_afetadas'] is not None:
+        st.success(f"Query executada com sucesso! {max(result['linhas_afetadas'], 0)} linha(s) afetada(s).")
+
+    cols = st.columns(3)
+    cols[0].metric("Tempo", f"{result['tempo']:.3f} s")
+    cols[1].metric("Linhas retornadas", len(result['linhas']))
+    cols[2].metric("Instruções da VM (aprox.)", result['instrucoes'] or f"< {INSTRUCOES_POR_VERIFICACAO}",
+                   help="Trabalho feito pelo SQLite; cresce com as linhas percorridas.")
+
+    if result['colunas']:
+        if result['truncado']:
+            st.warning(f"Resultado limitado às primeiras {row_limit} linhas.")
+        st.dataframe(pd.DataFrame(result['linhas'], columns=result['colunas']), use_container_width=True)
+
+    if result['plano']:
+        with st.expander("Plano da consulta (EXPLAIN QUERY PLAN)", expanded=False):
+            st.code(result['plano'], language=None)
+
+# Importação em blocos de CSV/XLSX: mapeamento de colunas, validação e executemany
+def import_file(db_name, table_name, uploaded, separator, encoding, decimal):
+    try:
+        preview = colunas_arquivo(uploaded, uploaded.name, separator, encoding)
+    except Exception as e:
+        st.error(f"Erro ao ler o arquivo: {e}")
+        return
+    st.write("Primeiras linhas do arquivo:")
+    st.dataframe(preview, use_container_width=True)
+    
+    structure = get_table_structure(conn, table_name)
+    file_columns = list(preview.columns)
+    by_name = {str(col).strip().lower(): col for col in file_columns}
+    st.subheader("Mapeamento de Colunas")
+    mapping = {}
+    cols = st.columns(3)
+    for i, (_, name, col_type, *_rest) in enumerate(structure):
+        options = [None] + file_columns
+        default = options.index(by_name[name.lower()]) if name.lower() in by_name else 0
+        with cols[i % 3]:
+            chosen = st.selectbox(f"{name} ({col_type or 'sem tipo'})", options, index=default,
+                                  format_func=lambda c: "(não importar)" if c is None else c,
+                                  key=f"mapa_{table_name}_{name}")
+        if chosen is not None:
+            mapping[name] = chosen
+    
+    skip_existing = st.checkbox("Ignorar linhas que já existem (mesma chave única)", value=True)
+    if not st.button("Importar", type="primary", disabled=not mapping):
+        return
+    
+    progress_bar = st.progress(0.0)
+    status_text = st.empty()
+    
+    def update_progress(fraction, read, inserted, rejected):
+        if fraction is not None:
+            progress_bar.progress(fraction)
+        status_text.text(f"{read} linhas lidas · {inserted} inseridas · {rejected} rejeitadas")
+    
+    import_conn = obter_conexao(db_name, isolation_level=None)
+    try:
+        blocks = ler_blocos_arquivo(uploaded, uploaded.name, separador=separator, codificacao=encoding)
+        summary = importar_blocos(import_conn, table_name, blocks, mapping, decimal, skip_existing, update_progress)
+    except Exception as e:
+        st.error(f"Erro na importação, nenhuma linha foi gravada: {e}")
+        return
+    finally:
+        import_conn.close()
+    
+    progress_bar.progress(1.0)
+    st.success(f"Importação concluída: {summary['inseridas']} de {summary['lidas']} linhas inseridas em "
+               f"{table_name} ({summary['ignoradas']} já existiam).")
+    if summary['rejeitadas']:
+        st.warning(f"{summary['rejeitadas']} linha(s) rejeitadas na validação "
+                   f"(mostrando até {len(summary['amostra_rejeitadas'])}).")
+        st.dataframe(summary['amostra_rejeitadas'], use_container_width=True)
+        st.download_button("Baixar linhas rejeitadas (CSV)",
+                           summary['amostra_rejeitadas'].to_csv(index=False, sep=';').encode('utf-8'),
+                           file_name=f"rejeitadas_{table_name}.csv", mime="text/csv")
+
+# Exportação da tabela em lotes (CSV ou Parquet), sem montar um DataFrame da tabela inteira
+def show_export(conn, table_name, columns, filters):
+    with st.expander("Exportar", expanded=False):
+        selected_columns = st.multiselect("Colunas", columns, default=columns, key="exportar_colunas")
+        date_columns = [None] + columns
+        default_date = next((i for i, c in enumerate(date_columns) if c and 'data' in c.lower()), 0)
+        cols = st.columns(3)
+        with cols[0]:
+            date_column = st.selectbox("Coluna de data", date_columns, index=default_date,
+                                       format_func=lambda c: "(sem período)" if c is None else c,
+                                       key="exportar_coluna_data")
+        with cols[1]:
+            start = st.date_input("De", value=None, format="DD/MM/YYYY", key="exportar_inicio",
+                                  disabled=date_column is None)
+        with cols[2]:
+            end = st.date_input("Até", value=None, format="DD/MM/YYYY", key="exportar_fim",
+                                disabled=date_column is None)
+        export_format = st.radio("Formato", list(FORMATOS_EXPORTACAO), horizontal=True,
+                                 format_func=str.upper, key="exportar_formato")
+        if not PARQUET_DISPONIVEL:
+            st.caption("Parquet disponível após instalar o pacote pyarrow.")
+        use_filters = st.checkbox("Aplicar os filtros da navegação", value=bool(filters),
+                                  disabled=not filters, key="exportar_filtros")
+
+        if st.button("Gerar arquivo", disabled=not selected_columns):
+            try:
+                with st.spinner("Exportando em lotes..."):
+                    path, exported, mime = exportar_tabela(
+                        conn, table_name, export_format, selected_columns, date_column, start, end,
+                        filters if use_filters else ())
+                st.session_state.exportacao = (path, exported, mime,
+                                               f"{table_name}{FORMATOS_EXPORTACAO[export_format][0]}")
+            except Exception as e:
+                st.error(f"Erro ao exportar: {e}")
+
+        export = st.session_state.get('exportacao')
+        if export and os.path.exists(export[0]):
+            path, exported, mime, file_name = export
+            st.success(f"{exported} linha(s) exportadas ({os.path.getsize(path) / 1024 / 1024:.1f} MB).")
+            st.download_button("Baixar arquivo", lambda: ler_exportacao(path), file_name, mime,
+                               key="exportar_baixar")
 
 # Função para executar query SQL
 def execute_query(conn, query):
@@ -79,7 +333,8 @@ if conn is not None:
     # Menu principal
     operation = st.sidebar.selectbox(
         "Selecione a operação",
-        ["📊 Visualizar Tabelas", "➕ Criar Tabela", "✏️ Editar Dados", "❌ Excluir Tabela", "📝 SQL Query"]
+        ["📊 Visualizar Tabelas", "➕ Criar Tabela", "✏️ Editar Dados", "📥 Importar Arquivo", "❌ Excluir Tabela",
+         "📝 SQL Query"]
     )
 
     if operation == "📊 Visualizar Tabelas":
@@ -93,10 +348,9 @@ if conn is not None:
                 structure_df = pd.DataFrame(structure, columns=['ID', 'Nome', 'Tipo', 'NotNull', 'Default', 'PK'])
                 st.dataframe(structure_df)
 
-            # Dados da tabela em um expander
+            # Dados da tabela em um expander, uma página por vez
             with st.expander("Dados da Tabela", expanded=True):
-                data = get_table_data(conn, selected_table)
-                st.dataframe(data, use_container_width=True)
+                show_table_pages(conn, selected_db, selected_table, [row[1] for row in structure])
 
     elif operation == "➕ Criar Tabela":
         st.title("➕ Criar Nova Tabela")
@@ -139,11 +393,11 @@ if conn is not None:
         
         if tables:
             selected_table = st.selectbox("Selecione uma tabela para editar", tables)
-            data = get_table_data(conn, selected_table)
+            columns = [row[1] for row in get_table_structure(conn, selected_table)]
+            warn_synced_deletes(selected_db, selected_table)
             
             # Adicionar novo registro em um expander
             with st.expander("Adicionar Novo Registro", expanded=False):
-                columns = data.columns
                 new_data = {}
                 cols = st.columns(len(columns))
                 
@@ -152,29 +406,35 @@ if conn is not None:
                         new_data[col] = st.text_input(f"Novo {col}", key=f"novo_{col}")
                 
                 if st.button("Adicionar Registro"):
-                    cols_str = ", ".join(columns)
-                    vals_str = ", ".join([f"'{v}'" if v else "NULL" for v in new_data.values()])
-                    query = f"INSERT INTO {selected_table} ({cols_str}) VALUES ({vals_str})"
-                    if execute_query(conn, query):
+                    try:
+                        aplicar_alteracoes(conn, selected_table, columns,
+                                           [tuple(v if v else None for v in new_data.values())], {}, [])
                         st.success("Registro adicionado com sucesso!")
-                        st.experimental_rerun()
+                    except Error as e:
+                        st.error(f"Erro ao adicionar registro: {e}")
             
-            # Editar registros existentes em um expander
+            # Editar registros existentes em um expander, uma página por vez
             with st.expander("Registros Existentes", expanded=True):
-                edited_df = st.data_editor(
-                    data,
-                    num_rows="dynamic",
-                    use_container_width=True
-                )
-                
-                if st.button("Salvar Alterações"):
-                    execute_query(conn, f"DELETE FROM {selected_table}")
-                    for _, row in edited_df.iterrows():
-                        cols_str = ", ".join(columns)
-                        vals_str = ", ".join([f"'{v}'" if pd.notna(v) else "NULL" for v in row])
-                        query = f"INSERT INTO {selected_table} ({cols_str}) VALUES ({vals_str})"
-                        execute_query(conn, query)
-                    st.success("Alterações salvas com sucesso!")
+                show_table_pages(conn, selected_db, selected_table, columns, editable=True)
+
+    elif operation == "📥 Importar Arquivo":
+        st.title("📥 Importar CSV ou Excel")
+        
+        if tables:
+            selected_table = st.selectbox("Selecione a tabela de destino", tables)
+            uploaded = st.file_uploader("Arquivo CSV ou XLSX", type=["csv", "txt", "xlsx", "xlsm"])
+            
+            cols = st.columns(3)
+            with cols[0]:
+                separator = st.selectbox("Separador (CSV)", [";", ",", "\t"],
+                                         format_func=lambda s: "tabulação" if s == "\t" else s)
+            with cols[1]:
+                encoding = st.selectbox("Codificação (CSV)", ["utf-8", "latin-1"])
+            with cols[2]:
+                decimal = st.selectbox("Separador decimal", [",", "."])
+            
+            if uploaded:
+                import_file(selected_db, selected_table, uploaded, separator, encoding, decimal)
 
     elif operation == "❌ Excluir Tabela":
         st.title("❌ Excluir Tabela")
@@ -196,26 +456,46 @@ if conn is not None:
         st.title("📝 Editor SQL")
         
         with st.expander("Editor SQL", expanded=True):
+            warn_synced_deletes(selected_db)
             query = st.text_area("Digite sua query SQL", height=200)
+            cols = st.columns(3)
+            with cols[0]:
+                time_limit = st.number_input("Tempo limite (s)", min_value=1, max_value=300,
+                                             value=TEMPO_LIMITE_PADRAO)
+            with cols[1]:
+                row_limit = st.number_input("Máximo de linhas", min_value=1, max_value=100000,
+                                            value=LIMITE_LINHAS_PADRAO)
+            with cols[2]:
+                read_only = st.checkbox("Somente leitura", value=True,
+                                        help="Desmarque para executar INSERT, UPDATE, DELETE e outros comandos que gravam.")
             
-            if st.button("Executar Query"):
+            if st.button("Executar Query") and query.strip():
                 try:
-                    if query.lower().strip().startswith("select"):
-                        result = pd.read_sql_query(query, conn)
-                        st.dataframe(result)
-                    else:
-                        if execute_query(conn, query):
-                            st.success("Query executada com sucesso!")
-                            if not query.lower().startswith("select"):
-                                st.experimental_rerun()
+                    with st.spinner("Executando... (pode ser cancelada na barra lateral)"):
+                        result = executar_consulta(conn, query, tempo_limite=time_limit,
+                                                   limite_linhas=row_limit, somente_leitura=read_only)
+                    show_query_result(result, time_limit, row_limit)
                 except Exception as e:
                     st.error(f"Erro ao executar query: {e}")
 
+        # Consultas do console em execução (de qualquer sessão do aplicativo)
+        running = listar_consultas_em_execucao()
+        if running:
+            st.sidebar.markdown("---")
+            st.sidebar.subheader("Consultas em execução")
+            for query_id, sql, seconds in running:
+                st.sidebar.caption(f"#{query_id} · {seconds:.0f} s · {sql[:80]}")
+                if st.sidebar.button(f"Cancelar #{query_id}", key=f"cancelar_consulta_{query_id}"):
+                    cancelar_consulta(query_id)
+
     # Mostrar informações do banco de dados
     st.sidebar.markdown("---")
     st.sidebar.subheader("Informações do Banco")
     st.sidebar.info(f"Número de tabelas: {len(tables)}")
     st.sidebar.info(f"Tabelas: {', '.join(tables)}")
+    # Linhas repetidas que as migrações moveram ao criar as chaves únicas
+    for table_name, count in contar_linhas_isoladas(conn).items():
+        st.sidebar.warning(f"{count} linha(s) repetidas movidas para {table_name} pelas migrações.")
 
 else:
     st.error("Não foi possível conectar ao banco de dados!")
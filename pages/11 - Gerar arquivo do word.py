@@ -4,6 +4,7 @@ import pandas as pd
 import os
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from conexao_banco import BANCO_COMPLETO, obter_conexao
 
 # Bibliotecas para escrever no Word (python-docx)
 from docx import Document
@@ -18,7 +19,7 @@ from docx.oxml.ns import nsdecls, qn
 DIRETORIO_ARQUIVOS = "media/word"
 
 # Ajuste o caminho para seu banco de dados:
-CAMINHO_BD = "banco_dados_completo/banco_dados.db"
+CAMINHO_BD = BANCO_COMPLETO
 TABELA_BD = "placas_completas_slu_bh"
 
 # Dicionário que mapeia cada placa ao nome da Tabela que ela pertence
@@ -286,27 +287,27 @@ if st.button("Gerar Relatório"):
         with st.spinner("Iniciando processo..."):
             st.info("Conectando ao banco de dados...", icon="🔌")
 
-            # 1) Conectar ao banco e carregar dados
-            conn = sqlite3.connect(CAMINHO_BD)
-            df = pd.read_sql_query(f"SELECT * FROM {TABELA_BD}", conn)
+            # 1) Conectar ao banco e obter a data mais recente (índice de data_iso,
+            #    a data normalizada AAAA-MM-DD mantida pelo banco)
+            conn = obter_conexao(CAMINHO_BD)
+            data_maxima = conn.execute(f"SELECT MAX(data_iso) FROM {TABELA_BD}").fetchone()[0]
+            if data_maxima is None:
+                conn.close()
+                st.warning("Não foi encontrada data máxima válida no banco.", icon="⚠️")
+                st.stop()
+
+            # 2) Carregar só os últimos 5 meses (busca por faixa no mesmo índice)
+            cinco_meses_atras = datetime.fromisoformat(data_maxima) - relativedelta(months=5)
+            df_filtrado = pd.read_sql_query(f"SELECT * FROM {TABELA_BD} WHERE data_iso >= ?", conn,
+                                            params=(cinco_meses_atras.date().isoformat(),))
             conn.close()
+            df_filtrado['data_datetime'] = pd.to_datetime(df_filtrado['data_iso'], errors='coerce', format='%Y-%m-%d')
 
         st.success("Banco de dados carregado com sucesso!", icon="✅")
 
         # Barra de progresso
         progress_bar = st.progress(0, text="Processando dados...")
 
-        # 2) Obter a data mais recente e filtrar últimos 5 meses
-        # Converte a coluna 'data' em datetime (se estiver em formato yyyy-mm-dd)
-        df['data_datetime'] = pd.to_datetime(df['data'], errors='coerce', format='%Y-%m-%d')
-        data_maxima = df['data_datetime'].max()
-        if pd.isnull(data_maxima):
-            st.warning("Não foi encontrada data máxima válida no banco.", icon="⚠️")
-            st.stop()
-
-        cinco_meses_atras = data_maxima - relativedelta(months=5)
-        df_filtrado = df[df['data_datetime'] >= cinco_meses_atras].copy()
-
         # 3) Criar um agrupamento por Tabela (nome da tabela final),
         #    usando o mapeamento placa -> tabela
         df_filtrado['nome_tabela_final'] = df_filtrado['placa'].map(placa_to_table)
@@ -1,156 +1,68 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
 import os
-from datetime import datetime
-import re
+from datetime import date, datetime
+from ingestao_txt import TRAVA_INGESTAO, contar_linhas_arquivo, ingerir_arquivos, reprocessar_arquivo
+from registro_arquivos import MAPEAMENTO_TIPOS, PASTA_TXT, abrir_conexao_registro
 
 def verificar_coluna_processamento():
-    conn = sqlite3.connect('arquivos.db')
-    cursor = conn.cursor()
-    
-    # Verifica se a coluna existe
-    cursor.execute("PRAGMA table_info(arquivos)")
-    colunas = cursor.fetchall()
-    coluna_existe = any(coluna[1] == 'processamento' for coluna in colunas)
-    
-    if not coluna_existe:
-        try:
-            cursor.execute("ALTER TABLE arquivos ADD COLUMN processamento TEXT DEFAULT 'nao_processado'")
-            conn.commit()
-            st.success("Coluna 'processamento' adicionada com sucesso!")
-        except Exception as e:
-            st.error(f"Erro ao adicionar coluna: {str(e)}")
-    
-    conn.close()
-
-def formatar_placa(descricao, tipo_arquivo):
-    descricao = descricao.strip()
-    
-    if tipo_arquivo == "CELULA EMERGENCIAL":
-        if descricao.startswith('L'):
-            return f"PR {descricao[1:]}"
-    
-    elif tipo_arquivo == "INCLINOMETRO":
-        return descricao
-    
-    elif tipo_arquivo == "CELULA DE PESQUISA":
-        match = re.search(r'PR(\d+)', descricao)
-        if match:
-            numero = int(match.group(1))
-            return f"PR{numero:02d}"
-    
-    elif tipo_arquivo == "PAMPULHA":
-        if descricao.startswith('D'):
-            return descricao
-        elif descricao.startswith('A'):
-            numero = descricao[1:]
-            return f"PR A.{numero}"
-        else:
-            return f"PR {descricao}"
-    
-    return descricao
-
-def validar_registro(registro):
+    # A primeira conexão aplica as migrações: tabela 'arquivos' (com a coluna
+    # 'processamento') em banco_dados.db e importação do antigo arquivos.db
     try:
-        # Divide o registro por vírgulas
-        campos = registro.strip().split(',')
-        
-        if len(campos) < 5:
-            return None
-        
-        # Validações
-        numero = int(campos[0])
-        descricao = campos[1].strip()
-        este = float(campos[2])
-        norte = float(campos[3])
-        cota = float(campos[4])
-        
-        # Validação dos ranges
-        if not (599000 <= este <= 700000):
-            return None
-        if not (6999999 <= norte <= 8000000):
-            return None
-        if not (850 <= cota <= 999):
-            return None
-            
-        return {
-            'numero': numero,
-            'descricao': descricao,
-            'este': este,
-            'norte': norte,
-            'cota': cota
-        }
-    except:
-        return None
-
-def processar_arquivo(arquivo, tipo, data):
-    registros_validos = []
-    
-    try:
-        with open(arquivo, 'r', encoding='latin-1') as f:
-            linhas = f.readlines()
-            
-        # Pula a primeira linha se começar com M
-        inicio = 1 if linhas[0].startswith('M') else 0
-        
-        for linha in linhas[inicio:]:
-            registro = validar_registro(linha)
-            if registro:
-                registro['tipo'] = tipo
-                registro['data'] = data
-                registro['descricao'] = formatar_placa(registro['descricao'], tipo)
-                registros_validos.append(registro)
-                
-        return registros_validos
+        conn = abrir_conexao_registro()
+        conn.close()
     except Exception as e:
-        st.error(f"Erro ao processar arquivo {arquivo}: {str(e)}")
-        return []
+        st.error(f"Erro ao preparar o registro de arquivos: {str(e)}")
 
-def salvar_dados_processados(registros):
-    conn = sqlite3.connect('banco_dados.db')
-    cursor = conn.cursor()
-    
-    # Cria tabela se não existir
-    cursor.execute('''CREATE TABLE IF NOT EXISTS dados_placa_geral
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      dt_data DATE,
-                      ct_cota REAL,
-                      cd_este REAL,
-                      cd_norte REAL,
-                      lc_local TEXT,
-                      pl_placa TEXT)''')
-    
-    try:
-        for registro in registros:
-            cursor.execute('''INSERT INTO dados_placa_geral 
-                            (dt_data, ct_cota, cd_este, cd_norte, lc_local, pl_placa)
-                            VALUES (?, ?, ?, ?, ?, ?)''',
-                         (registro['data'], 
-                          registro['cota'],
-                          registro['este'],
-                          registro['norte'],
-                          registro['tipo'],
-                          registro['descricao']))
-        
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao salvar dados: {str(e)}")
-        return False
-    finally:
+def secao_reprocessar_arquivo():
+    # Apaga somente as linhas geradas por um arquivo e grava o arquivo de novo
+    conn = abrir_conexao_registro()
+    df_processados = pd.read_sql_query("""
+        SELECT nome_arquivo, tipo, dia, mes, ano
+        FROM arquivos
+        WHERE processamento = 'processado'
+        ORDER BY ano DESC, mes DESC, dia DESC, nome_arquivo""", conn)
+    
+    if df_processados.empty:
         conn.close()
-
-def marcar_como_processado(arquivo):
-    conn = sqlite3.connect('arquivos.db')
-    cursor = conn.cursor()
+        st.info("Nenhum arquivo processado para reprocessar.")
+        return
     
-    try:
-        cursor.execute("UPDATE arquivos SET processamento = 'processado' WHERE nome_arquivo = ?",
-                      (arquivo,))
-        conn.commit()
-    finally:
-        conn.close()
+    nome_arquivo = st.selectbox("Arquivo", df_processados['nome_arquivo'].tolist())
+    atual = df_processados[df_processados['nome_arquivo'] == nome_arquivo].iloc[0]
+    linhas = contar_linhas_arquivo(conn, nome_arquivo)
+    conn.close()
+    
+    st.write(f"Linhas deste arquivo: {linhas['dados_placa_geral']} em dados_placa_geral, "
+             f"{linhas['placas_completas_slu_bh']} em placas_completas_slu_bh")
+    if linhas['dados_placa_geral'] == 0:
+        st.warning("Nenhuma linha está ligada a este arquivo (gravado antes do controle de origem). "
+                   "Reprocessar vai gravar as leituras sem remover as antigas.")
+    
+    tipos = list(MAPEAMENTO_TIPOS.values())
+    col1, col2 = st.columns(2)
+    with col1:
+        tipo = st.selectbox("Tipo", tipos,
+                            index=tipos.index(atual['tipo']) if atual['tipo'] in tipos else 0,
+                            key="reprocessar_tipo")
+    with col2:
+        data = st.date_input("Data", value=date(int(atual['ano']), int(atual['mes']), int(atual['dia'])),
+                             format="DD/MM/YYYY", key="reprocessar_data")
+    
+    caminho = os.path.join(PASTA_TXT, nome_arquivo)
+    if st.button("Reprocessar arquivo"):
+        if not os.path.exists(caminho):
+            st.error(f"Arquivo não encontrado: {caminho}")
+            return
+        try:
+            with TRAVA_INGESTAO:
+                resultado = reprocessar_arquivo(nome_arquivo, caminho, tipo, data)
+            st.success(f"Arquivo {nome_arquivo} reprocessado: "
+                       f"{resultado['removidos']} linha(s) removida(s) e {resultado['gravados']} gravada(s) "
+                       f"em dados_placa_geral; {resultado['removidos_completas']} removida(s) e "
+                       f"{resultado['transferidos']} transferida(s) em placas_completas_slu_bh.")
+        except Exception as e:
+            st.error(f"Erro ao reprocessar o arquivo, nenhuma alteração foi salva: {str(e)}")
 
 def main():
     st.title("Processamento de Dados Topográficos")
@@ -158,13 +70,16 @@ def main():
     # Verifica/cria coluna de processamento
     verificar_coluna_processamento()
     
-    # Busca arquivos não processados
-    conn = sqlite3.connect('arquivos.db')
+    with st.expander("Reprocessar um arquivo já gravado"):
+        secao_reprocessar_arquivo()
+    
+    # Busca arquivos não processados (inclusive os que falharam no processamento automático)
+    conn = abrir_conexao_registro()
     df = pd.read_sql_query("""
         SELECT nome_arquivo, tipo, dia, mes, ano 
         FROM arquivos 
         WHERE processamento IS NULL 
-           OR processamento = 'nao_processado'""", conn)
+           OR processamento IN ('nao_processado', 'alterado', 'erro')""", conn)
     conn.close()
     
     if df.empty:
@@ -173,7 +88,16 @@ def main():
     
     st.write(f"### {len(df)} arquivo(s) para processar")
     
+    processos = st.number_input(
+        "Processos em paralelo",
+        min_value=1,
+        max_value=os.cpu_count() or 1,
+        value=min(os.cpu_count() or 1, len(df)),
+        help="Número de arquivos lidos e validados ao mesmo tempo. A gravação no banco é feita por uma única thread."
+    )
+    
     if st.button("Iniciar Processamento"):
+        arquivos = []
         for _, row in df.iterrows():
             arquivo = os.path.join('media/originais_txt', row['nome_arquivo'])
             
@@ -182,19 +106,37 @@ def main():
                 continue
                 
             data = datetime(row['ano'], row['mes'], row['dia']).date()
-            
-            st.write(f"Processando {row['nome_arquivo']}...")
-            
-            registros = processar_arquivo(arquivo, row['tipo'], data)
-            
-            if registros:
-                if salvar_dados_processados(registros):
-                    marcar_como_processado(row['nome_arquivo'])
-                    st.success(f"✅ {row['nome_arquivo']}: {len(registros)} registros processados")
-                else:
-                    st.error(f"❌ Erro ao salvar dados de {row['nome_arquivo']}")
-            else:
-                st.warning(f"⚠️ Nenhum registro válido encontrado em {row['nome_arquivo']}")
+            arquivos.append((row['nome_arquivo'], arquivo, row['tipo'], data))
+        
+        if not arquivos:
+            st.stop()
+        
+        progresso = st.progress(0, text="Iniciando processamento...")
+        
+        def ao_progresso(nome_arquivo, concluidos, total):
+            progresso.progress(concluidos / total, text=f"Arquivo {concluidos}/{total} analisado: {nome_arquivo}")
+        
+        with TRAVA_INGESTAO:
+            resultados, resumo = ingerir_arquivos(arquivos, int(processos), ao_progresso)
+        
+        progresso.progress(1.0, text="Processamento concluído")
+        
+        if resumo['erro']:
+            st.error(f"Erro ao gravar os dados, nenhuma alteração foi salva: {resumo['erro']}")
+        
+        # Resumo por arquivo
+        df_resultados = pd.DataFrame(resultados).rename(columns={
+            'arquivo': 'Arquivo',
+            'validos': 'Registros válidos',
+            'gravados': 'Registros gravados',
+            'tempo_analise': 'Leitura (s)',
+            'tempo_gravacao': 'Gravação (s)',
+            'situacao': 'Situação'
+        })
+        st.dataframe(df_resultados, use_container_width=True)
+        
+        st.info(f"{resumo['arquivos']} arquivo(s), {resumo['registros']} registros gravados "
+                f"em {resumo['segundos']:.2f} s ({resumo['registros_por_segundo']:,.0f} registros/s)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,35 +1,30 @@
 import streamlit as st
 import sqlite3
 import pandas as pd
+from conexao_banco import BANCO_PRINCIPAL, obter_conexao
+from ingestao_txt import (
+    TRAVA_INGESTAO,
+    amostra_leituras_a_transferir,
+    contar_leituras_a_transferir,
+    transferir_leituras,
+)
+from duplicados_proximos import (
+    COLUNAS_DUPLICADOS,
+    CRITERIOS_MANTER,
+    TOLERANCIA_PADRAO,
+    encontrar_duplicados_proximos,
+    remover_duplicados,
+)
+
+# Linhas exibidas na prévia dos dados a transferir
+LIMITE_AMOSTRA = 100
 
 def verificar_estrutura_banco():
-    """Verifica e cria a estrutura necessária do banco de dados"""
+    """Verifica a estrutura do banco de dados (criada pelas migrações ao abrir a conexão)"""
     try:
-        conn = sqlite3.connect('banco_dados.db')
+        conn = obter_conexao(BANCO_PRINCIPAL)
         cursor = conn.cursor()
 
-        # Verifica se a tabela existe
-        cursor.execute("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='placas_completas_slu_bh'
-        """)
-        
-        if not cursor.fetchone():
-            cursor.execute("""
-                CREATE TABLE placas_completas_slu_bh (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    data TEXT,
-                    tipo TEXT,
-                    descricao TEXT,
-                    coordenada_este REAL,
-                    coordenada_norte REAL,
-                    elevacao REAL,
-                    placa TEXT
-                )
-            """)
-            conn.commit()
-            st.success("Tabela placas_completas_slu_bh criada com sucesso!")
-        
         # Verifica se todas as colunas necessárias existem
         cursor.execute("PRAGMA table_info(placas_completas_slu_bh)")
         colunas_existentes = {row[1] for row in cursor.fetchall()}
@@ -37,18 +32,14 @@ def verificar_estrutura_banco():
         colunas_necessarias = {
             'id', 'data', 'tipo', 'descricao', 
             'coordenada_este', 'coordenada_norte', 
-            'elevacao', 'placa'
+            'elevacao', 'placa', 'arquivo_origem'
         }
         
         colunas_faltantes = colunas_necessarias - colunas_existentes
         
         if colunas_faltantes:
-            st.warning(f"Colunas faltantes: {', '.join(colunas_faltantes)}")
-            for coluna in colunas_faltantes:
-                tipo_coluna = "REAL" if coluna in ['coordenada_este', 'coordenada_norte', 'elevacao'] else "TEXT"
-                cursor.execute(f"ALTER TABLE placas_completas_slu_bh ADD COLUMN {coluna} {tipo_coluna}")
-            conn.commit()
-            st.success("Colunas adicionadas com sucesso!")
+            st.error(f"Colunas faltantes em placas_completas_slu_bh: {', '.join(sorted(colunas_faltantes))}")
+            return False
         
         return True
 
@@ -58,23 +49,62 @@ def verificar_estrutura_banco():
     finally:
         conn.close()
 
-def verificar_duplicados():
-    """Verifica registros duplicados na tabela dados_placa_geral"""
-    conn = sqlite3.connect('banco_dados.db')
-    query = """
-    SELECT cd_este, cd_norte, dt_data, pl_placa, COUNT(*) as contagem
-    FROM dados_placa_geral
-    GROUP BY cd_este, cd_norte, dt_data, pl_placa
-    HAVING COUNT(*) > 1
-    """
-    duplicados = pd.read_sql_query(query, conn)
-    conn.close()
-    return duplicados
+def verificar_duplicados(tolerancia=TOLERANCIA_PADRAO, manter='primeira'):
+    """Verifica registros duplicados ou quase iguais (até a tolerância, mesma placa e dia) em dados_placa_geral"""
+    conn = obter_conexao(BANCO_PRINCIPAL)
+    try:
+        duplicados = encontrar_duplicados_proximos(conn, tolerancia, manter)
+    finally:
+        conn.close()
+    return pd.DataFrame(duplicados, columns=COLUNAS_DUPLICADOS)
+
+def secao_duplicados():
+    """Detecção de duplicados com tolerância e remoção mantendo uma leitura por grupo"""
+    st.subheader("Registros Duplicados")
+    col1, col2 = st.columns(2)
+    with col1:
+        tolerancia_mm = st.number_input(
+            "Tolerância (mm)", min_value=0.1, value=TOLERANCIA_PADRAO * 1000, step=0.5,
+            help="Leituras da mesma placa e do mesmo dia a até esta distância (este, norte e cota) "
+                 "são consideradas a mesma medição."
+        )
+    with col2:
+        manter = st.selectbox(
+            "Leitura mantida em cada grupo", list(CRITERIOS_MANTER),
+            format_func=lambda criterio: {'primeira': 'A gravada primeiro',
+                                          'ultima': 'A gravada por último'}[criterio]
+        )
+
+    if st.button("Verificar Registros Duplicados"):
+        st.session_state.duplicados = verificar_duplicados(tolerancia_mm / 1000, manter)
+
+    duplicados = st.session_state.get('duplicados')
+    if duplicados is None:
+        return
+    if duplicados.empty:
+        st.success("Não foram encontrados registros duplicados!")
+        return
+
+    remover = duplicados[~duplicados['manter']]
+    st.warning(f"Encontrados {duplicados['grupo'].nunique()} grupo(s) de registros duplicados "
+               f"({len(duplicados)} leituras, {len(remover)} a remover):")
+    st.dataframe(duplicados, use_container_width=True)
+
+    if st.button("Remover duplicados (manter uma leitura por grupo)"):
+        try:
+            with TRAVA_INGESTAO:
+                resultado = remover_duplicados(remover['id'].tolist(),
+                                               duplicados[duplicados['manter']]['id'].tolist())
+            st.session_state.duplicados = None
+            st.success(f"{resultado['removidos']} leitura(s) removidas de dados_placa_geral "
+                       f"({resultado['removidos_completas']} em placas_completas_slu_bh).")
+        except Exception as e:
+            st.error(f"Erro ao remover os duplicados, nada foi alterado: {str(e)}")
 
 def verificar_colunas_disponiveis():
     """Verifica todas as colunas disponíveis nas tabelas"""
     try:
-        conn = sqlite3.connect('banco_dados.db')
+        conn = obter_conexao(BANCO_PRINCIPAL)
         cursor = conn.cursor()
 
         # Verifica colunas da tabela dados_placa_geral
@@ -109,102 +139,48 @@ def verificar_colunas_disponiveis():
 def criar_conexao_db():
     """Cria e retorna uma conexão com o banco de dados SQLite"""
     try:
-        conn = sqlite3.connect('banco_dados.db')
+        conn = obter_conexao(BANCO_PRINCIPAL)
         return conn
     except sqlite3.Error as e:
         st.error(f"Erro ao conectar ao banco de dados: {str(e)}")
         raise e
 
-def obter_dados_validos():
-    # Conexão com o banco de dados
-    conn = criar_conexao_db()
-    
-    # Consulta SQL corrigida - removendo a coluna obs3 que não existe
-    query = """
-    SELECT DISTINCT 
-        dt_data as data, 
-        lc_local as tipo, 
-        '' as descricao,  -- Usando string vazia como substituto para obs3
-        cd_este as coordenada_este, 
-        cd_norte as coordenada_norte, 
-        ct_cota as elevacao, 
-        pl_placa as placa,
-        pl_placa 
-    FROM dados_placa_geral 
-    WHERE cd_este IS NOT NULL 
-        AND cd_norte IS NOT NULL 
-        AND ct_cota IS NOT NULL 
-        AND lc_local IS NOT NULL 
-        AND pl_placa IS NOT NULL 
-        AND pl_placa NOT LIKE '%LEV%' 
-        AND pl_placa NOT LIKE '%TOP%'
+def obter_dados_validos(limite=LIMITE_AMOSTRA):
     """
-    
-    # Execute a consulta
-    dados_validos = pd.read_sql_query(query, conn)
-    conn.close()
-    return dados_validos
-
-def transferir_dados(dados_df):
-    """Transfere dados válidos para placas_completas_slu_bh"""
-    conn = sqlite3.connect('banco_dados.db')
-    cursor = conn.cursor()
-    
-    # Verificar se o DataFrame tem as colunas necessárias
-    colunas_esperadas = ['data', 'tipo', 'descricao', 'coordenada_este', 
-                         'coordenada_norte', 'elevacao', 'placa']
-    
-    # Verificar quais colunas existem no DataFrame
-    colunas_disponiveis = [col for col in colunas_esperadas if col in dados_df.columns]
-    
-    if len(colunas_disponiveis) < len(colunas_esperadas):
-        colunas_faltantes = set(colunas_esperadas) - set(dados_df.columns)
-        st.error(f"Colunas faltantes no DataFrame: {', '.join(colunas_faltantes)}")
+    Quantidade de leituras válidas que ainda não estão em placas_completas_slu_bh
+    (as que a transferência vai inserir) e uma prévia das primeiras 'limite'.
+    Retorna (total, DataFrame da prévia).
+    """
+    conn = criar_conexao_db()
+    try:
+        total = contar_leituras_a_transferir(conn)
+        colunas, linhas = amostra_leituras_a_transferir(conn, limite)
+    finally:
         conn.close()
-        return 0
-    
-    # Exibir as colunas disponíveis no DataFrame para debug
-    st.info(f"Colunas disponíveis no DataFrame: {', '.join(dados_df.columns)}")
-    
-    total_registros = len(dados_df)
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for idx, row in dados_df.iterrows():
+    return total, pd.DataFrame(linhas, columns=colunas)
+
+def transferir_dados():
+    """
+    Transfere dados válidos para placas_completas_slu_bh com um único INSERT ... SELECT no banco.
+    Retorna (pendentes contados na mesma transação, antes do INSERT; registros transferidos).
+    """
+    conn = obter_conexao(BANCO_PRINCIPAL, isolation_level=None)
+    try:
+        # Colunas adicionais só são copiadas se também existirem no destino
+        colunas_destino = {row[1] for row in conn.execute("PRAGMA table_info(placas_completas_slu_bh)")}
+        colunas_adicionais = [col for col in st.session_state.get('colunas_adicionais', [])
+                              if col in colunas_destino]
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            colunas = colunas_esperadas.copy()
-            valores = [row[col] for col in colunas]
-            
-            if 'colunas_adicionais' in st.session_state:
-                colunas_adicionais_disponiveis = [col for col in st.session_state.colunas_adicionais 
-                                                if col in dados_df.columns]
-                if colunas_adicionais_disponiveis:
-                    colunas.extend(colunas_adicionais_disponiveis)
-                    valores.extend([row[col] for col in colunas_adicionais_disponiveis])
-            
-            placeholders = ','.join(['?' for _ in valores])
-            query = f"""
-                INSERT INTO placas_completas_slu_bh 
-                ({','.join(colunas)})
-                VALUES ({placeholders})
-            """
-            cursor.execute(query, valores)
-            
-            # Atualiza progresso
-            progress = (idx + 1) / total_registros
-            progress_bar.progress(progress)
-            status_text.text(f"Processando... {idx+1}/{total_registros} registros")
-        
-        except Exception as e:
-            st.error(f"Erro ao processar registro {idx+1}: {str(e)}")
-            st.error(f"Dados do registro: {row.to_dict()}")
-            conn.close()
-            return idx  # Retorna o número de registros processados até o erro
-    
-    conn.commit()
-    conn.close()
-    status_text.text("Transferência concluída!")
-    return total_registros
+            total_pendentes = contar_leituras_a_transferir(conn)
+            total_transferidos = transferir_leituras(conn, colunas_adicionais=colunas_adicionais)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+    return total_pendentes, total_transferidos
 
 def main():
     st.title("Verificação e Transferência de Dados das Placas")
@@ -218,7 +194,7 @@ def main():
     st.write("""
     ### O que este processo faz:
     1. Verifica e cria a estrutura necessária do banco de dados
-    2. Verifica registros duplicados na tabela dados_placa_geral
+    2. Verifica registros duplicados ou quase iguais (dentro da tolerância) na tabela dados_placa_geral
     3. Identifica dados válidos que podem ser transferidos
     4. Transfere apenas dados que tenham as informações mínimas:
         - Data do registro
@@ -228,6 +204,7 @@ def main():
         - Elevação
         - Identificação da placa
     5. Exclui informações de levantamentos topográficos
+    6. Não transfere de novo registros que já estão no destino (mesmo tipo, placa, data, coordenadas e elevação)
     """)
 
     # Verifica estrutura do banco
@@ -236,13 +213,7 @@ def main():
         return
 
     # Verifica duplicados
-    if st.button("Verificar Registros Duplicados"):
-        duplicados = verificar_duplicados()
-        if not duplicados.empty:
-            st.warning("Encontrados registros duplicados:")
-            st.dataframe(duplicados)
-        else:
-            st.success("Não foram encontrados registros duplicados!")
+    secao_duplicados()
 
     # Adicione uma nova seção para análise de colunas
     st.subheader("Análise de Colunas Disponíveis")
@@ -257,7 +228,7 @@ def main():
             (info_colunas['Não Nulos (%)'] > 50) & 
             (~info_colunas['Coluna'].isin(['id', 'data', 'tipo', 'descricao', 
                                          'coordenada_este', 'coordenada_norte', 
-                                         'elevacao', 'placa']))
+                                         'elevacao', 'placa', 'arquivo_origem']))
         ]
         
         if not colunas_complementares.empty:
@@ -276,10 +247,12 @@ def main():
 
     # Mostra dados válidos
     st.subheader("Dados Válidos para Transferência")
-    dados_validos = obter_dados_validos()
-    st.dataframe(dados_validos)
+    total_validos, amostra_validos = obter_dados_validos()
+    st.dataframe(amostra_validos)
+    if total_validos > len(amostra_validos):
+        st.caption(f"Prévia com os primeiros {len(amostra_validos)} registros.")
     
-    st.write(f"Total de registros válidos encontrados: {len(dados_validos)}")
+    st.write(f"Total de registros válidos a transferir: {total_validos}")
 
     # Botão de confirmação e processamento
     col1, col2 = st.columns(2)
@@ -293,13 +266,19 @@ def main():
             if st.checkbox("Confirmar transferência dos dados"):
                 try:
                     with st.spinner('Transferindo dados...'):
-                        total_transferidos = transferir_dados(dados_validos)
+                        total_pendentes, total_transferidos = transferir_dados()
                         st.session_state.processo_concluido = True
                         st.success(f"""
                             Transferência concluída com sucesso!
                             - Total de registros transferidos: {total_transferidos}
                             - Data/Hora: {pd.Timestamp.now().strftime('%d/%m/%Y %H:%M:%S')}
                         """)
+                        if total_transferidos == 0 and total_pendentes == 0:
+                            st.info("Nenhum registro novo: todos os dados válidos já estavam em placas_completas_slu_bh.")
+                        elif total_transferidos != total_pendentes:
+                            st.warning(f"{total_pendentes} registro(s) pendentes, {total_transferidos} transferido(s): "
+                                       f"{abs(total_pendentes - total_transferidos)} registro(s) de diferença "
+                                       f"entre a contagem e a gravação.")
                 except Exception as e:
                     st.error(f"Erro durante a transferência: {str(e)}")
                 finally:
@@ -3,10 +3,14 @@
 import streamlit as st
 import sqlite3
 import os
+from bisect import bisect_left, bisect_right
+from copy import copy
 from openpyxl import load_workbook
-from openpyxl.cell.cell import MergedCell
+from openpyxl.cell.cell import Cell, MergedCell
 from datetime import datetime
 import pandas as pd
+from conexao_banco import obter_conexao
+from manifesto_planilhas import atualizar_manifesto, montar_registro
 
 # Caso precise fazer parse manual de datas em pt-BR (ex: "09/set/24"):
 # import locale
@@ -178,25 +182,17 @@ PLANILHAS_MAPEAMENTO = [
 # Nome da tabela onde serão armazenados os resultados (ajuste conforme necessário):
 TABELA_RESULTADOS = "verificacao_planilhas"
 
+# Etapa gravada no manifesto das planilhas
+ETAPA_MANIFESTO = "pagina_5"
+
 def criar_tabela_if_not_exists():
     """
-    Cria a tabela de resultados no banco de dados se ela ainda não existir.
+    Garante a tabela de resultados: ela é criada pelas migrações do banco,
+    aplicadas na primeira conexão.
     """
     # Obter o caminho absoluto do banco de dados
     banco_absoluto = os.path.abspath(BANCO_DADOS)
-    conexao = sqlite3.connect(banco_absoluto)
-    c = conexao.cursor()
-    c.execute(f"""
-        CREATE TABLE IF NOT EXISTS {TABELA_RESULTADOS} (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome_arquivo TEXT,
-            nome_planilha TEXT,
-            ultima_linha_valida INTEGER,
-            data_registro TEXT,
-            data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-    conexao.commit()
+    conexao = obter_conexao(banco_absoluto)
     conexao.close()
 
 
@@ -317,6 +313,79 @@ def linha_esta_vazia(ws, row):
     return True
 
 
+def compactar_linhas(ws, linhas_remover):
+    """
+    Remove de uma vez as linhas informadas, subindo as linhas de baixo para
+    fechar os buracos. Diferente de chamar ws.delete_rows uma vez por linha
+    (cada chamada desloca todas as células abaixo), as células são
+    renumeradas em uma única passada, levando junto estilo, comentário e
+    hyperlink. Altura das linhas e células mescladas também acompanham o
+    deslocamento; uma mesclagem que perde linhas é encolhida e a que fica sem
+    linhas é desfeita.
+    Retorna a quantidade de linhas removidas.
+    """
+    remover = sorted(set(linhas_remover))
+    if not remover:
+        return 0
+    primeira = remover[0]
+    apagar = set(remover)
+    
+    def nova_linha(row):
+        return row - bisect_right(remover, row)
+    
+    # 1) Células: renumera as que ficam abaixo da primeira removida
+    celulas = {}
+    for (row, col), cell in ws._cells.items():
+        if row < primeira:
+            celulas[row, col] = cell
+        elif row not in apagar:
+            cell.row = nova_linha(row)
+            celulas[cell.row, col] = cell
+            if getattr(cell, "hyperlink", None) is not None:
+                cell.hyperlink.ref = cell.coordinate
+    ws._cells.clear()
+    ws._cells.update(celulas)
+    ws._current_row = ws.max_row if ws._cells else 0
+    
+    # 2) Altura e demais propriedades das linhas
+    deslocadas = [(row, dim) for row, dim in ws.row_dimensions.items() if row >= primeira]
+    for row, _ in deslocadas:
+        del ws.row_dimensions[row]
+    for row, dim in deslocadas:
+        if row not in apagar:
+            dim.index = nova_linha(row)
+            ws.row_dimensions[dim.index] = dim
+    
+    # 3) Células mescladas: a faixa vai da primeira à última linha mantida.
+    #    Todas as faixas afetadas saem do conjunto antes de qualquer uma mudar
+    #    de posição e só voltam depois (o add ignora uma faixa contida em outra
+    #    que ainda esteja no conjunto).
+    afetadas = [faixa for faixa in ws.merged_cells.ranges if faixa.max_row >= primeira]
+    for faixa in afetadas:
+        ws.merged_cells.remove(faixa)
+    for faixa in afetadas:
+        inicio = bisect_left(remover, faixa.min_row)
+        fim = bisect_right(remover, faixa.max_row)
+        mantidas = (faixa.max_row - faixa.min_row + 1) - (fim - inicio)
+        if mantidas <= 0:
+            continue
+        faixa.min_row = faixa.min_row - inicio
+        faixa.max_row = faixa.min_row + mantidas - 1
+        # Se a linha do topo foi removida, a nova célula do topo vira uma célula comum
+        topo = ws._cells.get((faixa.min_row, faixa.min_col))
+        if topo is None or isinstance(topo, MergedCell):
+            celula = Cell(ws, row=faixa.min_row, column=faixa.min_col)
+            if topo is not None:
+                celula._style = copy(topo._style)
+            ws._cells[faixa.min_row, faixa.min_col] = celula
+            topo = celula
+        faixa.start_cell = topo
+        if faixa.size['rows'] > 1 or faixa.size['columns'] > 1:
+            ws.merged_cells.add(faixa)
+    
+    return len(remover)
+
+
 def ler_data_da_celula(cell):
     """
     Tenta retornar um objeto datetime se a célula realmente for data (ou for
@@ -333,25 +402,24 @@ def ler_data_da_celula(cell):
         return try_parse_date_ptbr(str(val).strip())
 
 
-def processar_arquivo_e_planilha(nome_arquivo, nome_planilha):
+def agrupar_por_arquivo(mapeamento):
     """
-    Abre o arquivo Excel, localiza a planilha, encontra a primeira data de 2024
-    na coluna A, processa até 100 linhas após essa data, apaga as vazias e remove
-    duplicidades nos últimos 10 registros. Retorna (ultima_linha_valida, data_ultima_linha)
-    para gravação em banco.
+    Agrupa o PLANILHAS_MAPEAMENTO por arquivo, mantendo a ordem da lista:
+    {nome_arquivo: [nome_planilha, ...]}.
+    """
+    grupos = {}
+    for _, nome_arquivo, nome_planilha in mapeamento:
+        grupos.setdefault(nome_arquivo, []).append(nome_planilha)
+    return grupos
+
+
+def processar_planilha(ws, nome_arquivo, nome_planilha):
+    """
+    Processa uma planilha já aberta: encontra a primeira data de 2024 na
+    coluna A, processa até 100 linhas após essa data, apaga as vazias e remove
+    duplicidades nos últimos 10 registros. Não salva o arquivo.
+    Retorna (ultima_linha_valida, data_ultima_linha, planilha alterada).
     """
-    caminho = os.path.join(DIRETORIO_ARQUIVOS, nome_arquivo)
-    
-    # Carrega o workbook com openpyxl:
-    wb = load_workbook(filename=caminho, data_only=False, keep_vba=True, keep_links=True)
-    
-    if nome_planilha not in wb.sheetnames:
-        # Se a planilha não existir, avisar e sair
-        st.warning(f"Planilha '{nome_planilha}' não encontrada em '{nome_arquivo}' :exclamation:")
-        return None, None
-    
-    ws = wb[nome_planilha]
-    
     # 1) Encontrar primeira data >= 01/jan/2024 na coluna A
     primeira_data_2024_row = None
     # Vamos considerar que não sabemos até onde vai a planilha, mas iremos até o "max_row" do sheet.
@@ -367,21 +435,16 @@ def processar_arquivo_e_planilha(nome_arquivo, nome_planilha):
     
     if not primeira_data_2024_row:
         st.info(f"Não há data de 2024 na planilha '{nome_planilha}' em '{nome_arquivo}'.")
-        wb.close()
-        return None, None
+        return None, None, False
     
     # 2) A partir dessa linha, verificar até 100 linhas abaixo
     #    e remover as que estiverem completamente vazias de A a J.
     linha_inicial = primeira_data_2024_row
     linha_final = min(primeira_data_2024_row + 100, max_row)
     
-    # Precisamos checar as linhas de baixo para cima, ao remover dinamicamente
-    # (para não alterar a numeração das linhas que ainda não checamos).
-    linhas_removidas = 0
-    for row in range(linha_final, linha_inicial - 1, -1):
-        if linha_esta_vazia(ws, row):
-            ws.delete_rows(row, 1)
-            linhas_removidas += 1
+    # Todas as linhas vazias são encontradas primeiro e removidas juntas
+    linhas_vazias = [row for row in range(linha_inicial, linha_final + 1) if linha_esta_vazia(ws, row)]
+    linhas_removidas = compactar_linhas(ws, linhas_vazias)
     
     st.info(f"{linhas_removidas} linha(s) em branco removidas na planilha {nome_planilha} do arquivo {nome_arquivo}.")
     
@@ -405,9 +468,7 @@ def processar_arquivo_e_planilha(nome_arquivo, nome_planilha):
     ultimas_linhas.reverse()  # ordem crescente
     if not ultimas_linhas:
         # Não há linhas para analisar
-        wb.save(caminho)
-        wb.close()
-        return None, None
+        return None, None, linhas_removidas > 0
     
     # 4) Remover duplicidades dentro dessas últimas linhas. Se duas linhas tiverem
     #    A-J exatamente iguais (tratando vazios/zeros como iguais, datas etc.).
@@ -432,9 +493,8 @@ def processar_arquivo_e_planilha(nome_arquivo, nome_planilha):
         else:
             assinaturas.append(assinatura)
     
-    # Remover as linhas duplicadas (também de baixo para cima)
-    for r in sorted(linhas_duplicadas, reverse=True):
-        ws.delete_rows(r, 1)
+    # Remover as linhas duplicadas, todas juntas
+    compactar_linhas(ws, linhas_duplicadas)
     
     if linhas_duplicadas:
         st.warning(f"{len(linhas_duplicadas)} linha(s) duplicadas removidas na planilha '{nome_planilha}'.")
@@ -458,28 +518,69 @@ def processar_arquivo_e_planilha(nome_arquivo, nome_planilha):
                 data_ultima_linha = str(ws.cell(row=row, column=1).value)
             break
     
-    # Salvar as alterações no Excel (preservando formatação existente o máximo possível)
-    wb.save(caminho)
-    wb.close()
+    alterada = linhas_removidas > 0 or bool(linhas_duplicadas)
+    return ultima_linha_valida, data_ultima_linha, alterada
+
+
+def processar_arquivo(nome_arquivo, nomes_planilhas, ao_concluir_planilha=None):
+    """
+    Abre o arquivo Excel uma única vez, processa todas as suas planilhas com
+    processar_planilha e salva uma única vez, só se alguma planilha mudou.
+    ao_concluir_planilha(nome_planilha) é chamado após cada planilha.
+    Retorna a lista de (nome_planilha, ultima_linha_valida, data_ultima_linha,
+    registro do manifesto ou None).
+    """
+    caminho = os.path.join(DIRETORIO_ARQUIVOS, nome_arquivo)
+    
+    # Carrega o workbook com openpyxl:
+    wb = load_workbook(filename=caminho, data_only=False, keep_vba=True, keep_links=True)
+    resultados = []
+    alterado = False
+    try:
+        for nome_planilha in nomes_planilhas:
+            if nome_planilha not in wb.sheetnames:
+                # Se a planilha não existir, avisar e seguir para a próxima
+                st.warning(f"Planilha '{nome_planilha}' não encontrada em '{nome_arquivo}' :exclamation:")
+                resultados.append((nome_planilha, None, None, None))
+            else:
+                ws = wb[nome_planilha]
+                ultima_linha, data_ult_linha, alterada = processar_planilha(ws, nome_arquivo, nome_planilha)
+                registro = montar_registro(ws, nome_arquivo, nome_planilha, ultima_linha) if ultima_linha else None
+                resultados.append((nome_planilha, ultima_linha, data_ult_linha, registro))
+                alterado = alterado or alterada
+            if ao_concluir_planilha:
+                ao_concluir_planilha(nome_planilha)
+        
+        # Salvar as alterações no Excel (preservando formatação existente o máximo possível)
+        if alterado:
+            wb.save(caminho)
+    finally:
+        wb.close()
     
-    return ultima_linha_valida, data_ultima_linha
+    return resultados
 
 
-def inserir_registro_no_banco(nome_arquivo, nome_planilha, ultima_linha, data_registro):
+def inserir_registros_no_banco(registros, registros_manifesto):
     """
-    Insere no banco de dados sqlite o registro de última linha e data.
+    Insere no banco de dados sqlite os registros de última linha e data
+    (nome_arquivo, nome_planilha, ultima_linha, data_registro) de todas as
+    planilhas e atualiza o manifesto das planilhas, em uma única transação.
     """
+    if not registros:
+        return
     # Obter o caminho absoluto do banco de dados
     banco_absoluto = os.path.abspath(BANCO_DADOS)
-    conexao = sqlite3.connect(banco_absoluto)
-    c = conexao.cursor()
-    c.execute(f"""
-        INSERT INTO {TABELA_RESULTADOS} 
-        (nome_arquivo, nome_planilha, ultima_linha_valida, data_registro)
-        VALUES (?, ?, ?, ?)
-    """, (nome_arquivo, nome_planilha, ultima_linha, data_registro))
-    conexao.commit()
-    conexao.close()
+    conexao = obter_conexao(banco_absoluto)
+    try:
+        with conexao:
+            conexao.executemany(f"""
+                INSERT INTO {TABELA_RESULTADOS} 
+                (nome_arquivo, nome_planilha, ultima_linha_valida, data_registro)
+                VALUES (?, ?, ?, ?)
+            """, registros)
+            atualizar_manifesto(conexao, registros_manifesto, ETAPA_MANIFESTO)
+    finally:
+        conexao.close()
 
 
 def main():
@@ -491,21 +592,38 @@ def main():
         
         total_planilhas = len(PLANILHAS_MAPEAMENTO)
         progresso = st.progress(0, text="Iniciando verificação de planilhas...")
+        concluidas = 0
         
-        for idx, (id_planilha, nome_arquivo, nome_planilha) in enumerate(PLANILHAS_MAPEAMENTO, start=1):
-            with st.spinner(f"Processando arquivo '{nome_arquivo}', planilha '{nome_planilha}'..."):
-                st.info(f"Lendo planilha {idx}/{total_planilhas} - [**{nome_planilha}**] do arquivo [**{nome_arquivo}**].")
-                
-                ultima_linha, data_ult_linha = processar_arquivo_e_planilha(nome_arquivo, nome_planilha)
+        def ao_concluir_planilha(nome_planilha):
+            nonlocal concluidas
+            concluidas += 1
+            progresso.progress(concluidas / total_planilhas,
+                               text=f"Progresso: {concluidas}/{total_planilhas} planilhas")
+        
+        # Cada arquivo é aberto e salvo uma única vez, com todas as suas planilhas
+        registros = []
+        registros_manifesto = []
+        for nome_arquivo, nomes_planilhas in agrupar_por_arquivo(PLANILHAS_MAPEAMENTO).items():
+            with st.spinner(f"Processando arquivo '{nome_arquivo}' ({len(nomes_planilhas)} planilhas)..."):
+                st.info(f"Lendo {len(nomes_planilhas)} planilha(s) do arquivo [**{nome_arquivo}**].")
+                try:
+                    resultados = processar_arquivo(nome_arquivo, nomes_planilhas, ao_concluir_planilha)
+                except Exception as e:
+                    st.error(f"Erro ao processar arquivo '{nome_arquivo}':", icon="🚫")
+                    st.exception(e)
+                    continue
                 
-                if ultima_linha is not None:
-                    # gravar no banco
-                    inserir_registro_no_banco(nome_arquivo, nome_planilha, ultima_linha, data_ult_linha)
-                    st.success(f"Atualizado no banco: Última linha válida = {ultima_linha}, Data = {data_ult_linha}.", icon="💾")
-                else:
-                    st.warning(f"Não foi possível determinar última linha válida em '{nome_planilha}' / '{nome_arquivo}'.")
-            
-            progresso.progress(idx / total_planilhas, text=f"Progresso: {idx}/{total_planilhas} planilhas")
+                for nome_planilha, ultima_linha, data_ult_linha, registro in resultados:
+                    if ultima_linha is not None:
+                        registros.append((nome_arquivo, nome_planilha, ultima_linha, data_ult_linha))
+                        registros_manifesto.append(registro)
+                        st.success(f"[**{nome_planilha}**] Última linha válida = {ultima_linha}, Data = {data_ult_linha}.", icon="💾")
+                    else:
+                        st.warning(f"Não foi possível determinar última linha válida em '{nome_planilha}' / '{nome_arquivo}'.")
+        
+        # Todas as planilhas gravadas no banco (e no manifesto) em uma única transação
+        inserir_registros_no_banco(registros, registros_manifesto)
+        st.success(f"{len(registros)} registro(s) de última linha gravados no banco.", icon="💾")
         
         st.success("Processamento finalizado para todos os arquivos!", icon="🎉")
 
@@ -2,7 +2,20 @@ import streamlit as st
 import sqlite3
 import os
 from openpyxl import load_workbook
-from datetime import datetime, date
+from datetime import date
+from conexao_banco import obter_conexao
+from manifesto_planilhas import atualizar_manifesto, ler_manifesto, localizar_fim_dados, montar_registro
+
+# Planilhas do Inclinômetro.xlsx e o valor gravado em cada uma
+# (índice em (coordenada_este, coordenada_norte, elevacao))
+ABAS_INCLINOMETRO = {
+    "Coordenada NORTE": 1,
+    "Coordenada ESTE": 0,
+    "Cota": 2,
+}
+
+# Etapa gravada no manifesto das planilhas
+ETAPA_MANIFESTO = "pagina_6"
 
 ###############################################################################
 #                            FUNÇÕES DE APOIO                                 #
@@ -14,31 +27,12 @@ def obter_conexao_banco(caminho_banco):
     Caso não consiga, retorna None.
     """
     try:
-        conn = sqlite3.connect(caminho_banco)
+        conn = obter_conexao(caminho_banco)
         return conn
     except Exception as e:
         st.error(f"Erro ao conectar ao banco: {e}")
         return None
 
-def converter_data_para_date(data_str):
-    """
-    Tenta converter a string de data para um objeto date, 
-    usando vários formatos. Retorna None se não conseguir.
-    """
-    formatos = [
-        "%Y-%m-%d",  # 2025-02-14
-        "%d/%m/%Y",  # 14/02/2025
-        "%d-%m-%Y",  # 14-02-2025
-        "%d-%b-%y",  # 14-fev-25
-        "%d-%b-%Y",  # 14-fev-2025
-    ]
-    for fmt in formatos:
-        try:
-            return datetime.strptime(data_str, fmt).date()
-        except ValueError:
-            pass
-    return None
-
 def calcular_dias(data_linha, data_ref=date(2016,4,13)):
     """
     Retorna quantos dias se passaram entre data_linha e 13/04/2016.
@@ -74,41 +68,55 @@ def main():
         if not conn:
             return
         
-        # Novo trecho: buscar última linha válida para cada planilha
+        # 3. Abrir o arquivo Inclinômetro.xlsx
+        caminho_xlsx = os.path.join(DIRETORIO_EXCEL, NOME_ARQUIVO)
+        if not os.path.exists(caminho_xlsx):
+            st.error(f"Arquivo '{NOME_ARQUIVO}' não encontrado em '{DIRETORIO_EXCEL}'.")
+            conn.close()
+            return
+        
+        wb = load_workbook(caminho_xlsx)
+        
+        # Verifica se as 3 planilhas existem
+        for aba in ABAS_INCLINOMETRO:
+            if aba not in wb.sheetnames:
+                st.error(f"Planilha '{aba}' não existe em '{NOME_ARQUIVO}'.")
+                conn.close()
+                return
+        
+        # 4. Última linha e última data de cada planilha, pelo manifesto das
+        #    planilhas (conferido pela impressão digital; se não conferir, varre a planilha)
         try:
-            cur2 = conn.cursor()
-            sql_validas = """
-                SELECT nome_planilha, ultima_linha_valida 
-                FROM verificacao_planilhas
-                WHERE nome_arquivo = ?
-                AND nome_planilha IN ('Coordenada NORTE', 'Coordenada ESTE', 'Cota')
-                ORDER BY data_processamento DESC
-            """
-            cur2.execute(sql_validas, (NOME_ARQUIVO,))
-            linhas_validas = {}
-            for registro in cur2.fetchall():
-                planilha = registro[0]
-                if planilha not in linhas_validas:  # pega somente registro mais recente
-                    linhas_validas[planilha] = registro[1]
+            manifesto = ler_manifesto(conn, NOME_ARQUIVO)
         except Exception as e:
-            st.error("Erro ao ler linha válida:", icon="🚫")
+            st.error("Erro ao ler o manifesto das planilhas:", icon="🚫")
             st.exception(e)
             conn.close()
             return
         
-        base_norte = linhas_validas.get("Coordenada NORTE", 0) + 1
-        base_este  = linhas_validas.get("Coordenada ESTE", 0) + 1
-        base_cota  = linhas_validas.get("Cota", 0) + 1
+        proxima_linha = {}
+        ultima_data = {}
+        for aba in ABAS_INCLINOMETRO:
+            linha, data_aba = localizar_fim_dados(wb[aba], manifesto.get((NOME_ARQUIVO, aba)))
+            proxima_linha[aba] = linha + 1
+            ultima_data[aba] = data_aba or ""
         
-        # 3. Ler registros de INCLINÔMETRO
+        # 5. Ler registros de INCLINÔMETRO posteriores à planilha mais atrasada
         try:
             cur = conn.cursor()
+            # data_iso: data já normalizada pelo banco (AAAA-MM-DD); datas inválidas ficam NULL
             cur.execute("""
-                SELECT id, data, tipo, descricao, coordenada_este, coordenada_norte, elevacao, placa
+                SELECT id, data_iso, tipo, descricao, coordenada_este, coordenada_norte, elevacao, placa
                 FROM placas_completas_slu_bh
-                WHERE tipo = 'INCLINOMETRO'
-            """)
+                WHERE tipo = 'INCLINOMETRO' AND data_iso > ?
+                ORDER BY data_iso
+            """, (min(ultima_data.values()),))
             rows = cur.fetchall()
+            # Registros cuja data o banco não reconhece (data_iso NULL) não entram na consulta acima
+            sem_data = cur.execute("""
+                SELECT COUNT(*) FROM placas_completas_slu_bh
+                WHERE tipo = 'INCLINOMETRO' AND data_iso IS NULL
+            """).fetchone()[0]
         except Exception as e:
             st.error("Erro ao consultar registros de INCLINÔMETRO:", icon="🚫")
             st.exception(e)
@@ -116,21 +124,26 @@ def main():
             return
         
         st.success(f"Foram carregados {len(rows)} registros de INCLINÔMETRO.", icon="✅")
+        if sem_data:
+            st.warning(f"{sem_data} registro(s) de INCLINÔMETRO com data em formato não reconhecido foram ignorados.", icon="⚠️")
         if not rows:
             conn.close()
             return
         
-        # 4. Agrupar por data, depois por placa
+        # 6. Agrupar por data, depois por placa
         #    Precisamos armazenar TANTO a coordenada_norte, ESTE quanto a ELEVACAO 
         #    para cada data e placa.
         #    Estrutura: 
         #    dados_por_data[ data ] [ placa ] = (coordenada_este, coordenada_norte, elevacao)
         dados_por_data = {}
+        datas_invalidas = 0
         
         for row in rows:
-            (row_id, data_str, tipo, descricao, este, norte, elev, placa) = row
-            data_dt = converter_data_para_date(data_str)
-            if not data_dt:
+            (row_id, data_iso, tipo, descricao, este, norte, elev, placa) = row
+            try:
+                data_dt = date.fromisoformat(data_iso)
+            except ValueError:  # ex.: 2025-02-30
+                datas_invalidas += 1
                 continue
             
             placa_up = placa.strip().upper()
@@ -140,29 +153,11 @@ def main():
             # Armazena os 3 valores
             dados_por_data[data_dt][placa_up] = (este, norte, elev)
         
-        # 5. Ordenar as datas
-        lista_datas_ordenadas = sorted(dados_por_data.keys())
-        
-        # 6. Abrir o arquivo Inclinômetro.xlsx
-        caminho_xlsx = os.path.join(DIRETORIO_EXCEL, NOME_ARQUIVO)
-        if not os.path.exists(caminho_xlsx):
-            st.error(f"Arquivo '{NOME_ARQUIVO}' não encontrado em '{DIRETORIO_EXCEL}'.")
-            conn.close()
-            return
-        
-        wb = load_workbook(caminho_xlsx)
+        if datas_invalidas:
+            st.warning(f"{datas_invalidas} registro(s) de INCLINÔMETRO com data inexistente no calendário foram ignorados.", icon="⚠️")
         
-        # Verifica se as 3 planilhas existem
-        abas_necessarias = ["Coordenada NORTE", "Coordenada ESTE", "Cota"]
-        for aba in abas_necessarias:
-            if aba not in wb.sheetnames:
-                st.error(f"Planilha '{aba}' não existe em '{NOME_ARQUIVO}'.")
-                conn.close()
-                return
-        
-        ws_norte = wb["Coordenada NORTE"]
-        ws_este  = wb["Coordenada ESTE"]
-        ws_cota  = wb["Cota"]
+        # Datas já vêm ordenadas do banco
+        lista_datas_ordenadas = list(dados_por_data.keys())
         
         st.info(f"Inserindo dados em {len(lista_datas_ordenadas)} datas distintas.", icon="ℹ️")
         
@@ -178,10 +173,11 @@ def main():
             "I5": 10
         }
         
-        # 7. Inserir em cada planilha 1 linha por data
-        #    - ws_norte => coordenada_norte
-        #    - ws_este  => coordenada_este
-        #    - ws_cota  => elevacao
+        # 7. Inserir em cada planilha 1 linha por data, só as datas posteriores
+        #    à última data daquela planilha
+        #    - Coordenada NORTE => coordenada_norte
+        #    - Coordenada ESTE  => coordenada_este
+        #    - Cota             => elevacao
         
         progresso = st.progress(0, text="Iniciando gravação...")
         total_datas = len(lista_datas_ordenadas)
@@ -191,65 +187,44 @@ def main():
             contador += 1
             # Calcula dias
             dias = calcular_dias(data_dt)
-            
-            # Substituir uso de max_row pelo valor da última linha obtida
-            row_norte = base_norte
-            row_este  = base_este
-            row_cota  = base_cota
-            
-            ws_norte.cell(row_norte, 1).value = data_dt
-            ajustar_formatacao_celula(ws_norte.cell(row_norte, 1), eh_data=True)
-            
-            ws_norte.cell(row_norte, 2).value = dias
-            ajustar_formatacao_celula(ws_norte.cell(row_norte, 2), eh_data=False)
-            
-            # Cria nova linha na planilha ESTE
-            ws_este.cell(row_este, 1).value = data_dt
-            ajustar_formatacao_celula(ws_este.cell(row_este, 1), eh_data=True)
-            
-            ws_este.cell(row_este, 2).value = dias
-            ajustar_formatacao_celula(ws_este.cell(row_este, 2), eh_data=False)
-            
-            # Cria nova linha na planilha COTA
-            ws_cota.cell(row_cota, 1).value = data_dt
-            ajustar_formatacao_celula(ws_cota.cell(row_cota, 1), eh_data=True)
-            
-            ws_cota.cell(row_cota, 2).value = dias
-            ajustar_formatacao_celula(ws_cota.cell(row_cota, 2), eh_data=False)
-            
-            # Para cada placa daquela data, colocar o valor certo nas 3 planilhas
             dict_placas = dados_por_data[data_dt]
             
-            for placa_up, tupla_vals in dict_placas.items():
-                # tupla_vals = (este, norte, elev)
-                este_val, norte_val, elev_val = tupla_vals
+            for aba, indice_valor in ABAS_INCLINOMETRO.items():
+                if data_dt.isoformat() <= ultima_data[aba]:
+                    continue
+                ws = wb[aba]
+                row_aba = proxima_linha[aba]
                 
-                if placa_up in map_placa_col:
-                    col = map_placa_col[placa_up]
-                    
-                    # NORTE => grava 'norte_val'
-                    ws_norte.cell(row_norte, col).value = norte_val
-                    ajustar_formatacao_celula(ws_norte.cell(row_norte, col), eh_data=False)
-                    
-                    # ESTE => grava 'este_val'
-                    ws_este.cell(row_este, col).value = este_val
-                    ajustar_formatacao_celula(ws_este.cell(row_este, col), eh_data=False)
-                    
-                    # COTA => grava 'elev_val'
-                    ws_cota.cell(row_cota, col).value = elev_val
-                    ajustar_formatacao_celula(ws_cota.cell(row_cota, col), eh_data=False)
-            
-            base_norte += 1
-            base_este  += 1
-            base_cota  += 1
+                ws.cell(row_aba, 1).value = data_dt
+                ajustar_formatacao_celula(ws.cell(row_aba, 1), eh_data=True)
+                
+                ws.cell(row_aba, 2).value = dias
+                ajustar_formatacao_celula(ws.cell(row_aba, 2), eh_data=False)
+                
+                # Para cada placa daquela data, colocar o valor certo na planilha
+                for placa_up, tupla_vals in dict_placas.items():
+                    # tupla_vals = (este, norte, elev)
+                    if placa_up in map_placa_col:
+                        col = map_placa_col[placa_up]
+                        ws.cell(row_aba, col).value = tupla_vals[indice_valor]
+                        ajustar_formatacao_celula(ws.cell(row_aba, col), eh_data=False)
+                
+                proxima_linha[aba] += 1
             
             progresso.progress(int((contador / total_datas)*100),
                                text=f"Inserindo data {contador}/{total_datas}")
         
-        # 8. Salvar
+        # 8. Salvar e atualizar o manifesto das 3 planilhas
         wb.save(caminho_xlsx)
         st.success(f"{total_datas} registros de data gravados nas 3 planilhas!", icon="✅")
         
+        try:
+            atualizar_manifesto(conn, [montar_registro(wb[aba], NOME_ARQUIVO, aba, proxima_linha[aba] - 1)
+                                       for aba in ABAS_INCLINOMETRO], ETAPA_MANIFESTO)
+        except Exception as e:
+            st.error("Erro ao atualizar o manifesto das planilhas:", icon="🚫")
+            st.exception(e)
+        
         # Fecha o banco
         conn.close()
         st.info("Conexão ao banco encerrada.", icon="ℹ️")
@@ -1,10 +1,35 @@
 import sqlite3
 import os
-from datetime import datetime, date
+from datetime import date
 import streamlit as st
 from openpyxl import load_workbook
 from openpyxl.cell.cell import MergedCell
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE, BUILTIN_FORMATS_REVERSE
 import re
+from conexao_banco import obter_conexao
+from manifesto_planilhas import atualizar_manifesto, ler_manifesto, localizar_fim_dados, montar_registro
+
+# Etapa gravada no manifesto das planilhas
+ETAPA_MANIFESTO = "pagina_7"
+
+# Formatos das células gravadas: data (ex.: 30-ago-24, conforme o locale do Office) e números
+FORMATOS_NUMERO = {True: 'dd-mmm-yy', False: '#,##0.000'}
+
+# Regras de destino dos registros, na ordem em que são testadas:
+# (tipo, prefixos da placa, placas exatas, arquivo, planilha com o nome da placa em maiúsculas)
+REGRAS_DESTINO = [
+    ("CELULA EMERGENCIAL", ("PR ",), (), "Placa de Recalque Emergencial.xlsx", False),
+    ("CELULA DE PESQUISA", ("PR",), (), "Recalques Celula Pesquisa.xlsx", True),
+    ("PAMPULHA", ("PR 1.",), ("D1", "D2"), "Placa de Recalque AC 01.xlsx", False),
+    ("PAMPULHA", ("PR 3.",), (), "Placa de Recalque AC 03.xlsx", False),
+    ("PAMPULHA", ("PR 4.",), (), "Placa de Recalque AC 04.xlsx", False),
+    ("PAMPULHA", ("PR 5.",), (), "Placa de Recalque AC 05.xlsx", False),
+    ("PAMPULHA", ("PR A.",), (), "Placa de Recalque AMPLIAÇÃO.xlsx", False),
+]
+
+# Registros citados por problema no resumo de registros ignorados
+MAX_IDS_RESUMO = 20
 
 ################################################################################
 #                          FUNÇÕES DE APOIO                                    #
@@ -16,61 +41,22 @@ def obter_conexao_banco(caminho_banco):
     Retorna o objeto de conexão, ou None em caso de erro.
     """
     try:
-        conn = sqlite3.connect(caminho_banco)
+        conn = obter_conexao(caminho_banco)
         return conn
     except Exception as e:
         st.error(f"Não foi possível conectar ao banco: {e}", icon="🚫")
         st.exception(e)
         return None
 
-def buscar_ultimas_datas_por_arquivo_planilha(conn):
+def converter_data_iso(data_iso):
     """
-    Lê na tabela 'ultima_linha_arquivos' as informações de última data
-    de cada arquivo e planilha. Retorna um dicionário no formato:
-        {
-          (nome_arquivo, nome_planilha): (linha_informacao, data_datetime)
-        }
-    Se não houver registro, retorna dicionário vazio.
+    Converte a coluna 'data_iso' do banco (data normalizada AAAA-MM-DD) para um objeto date.
+    Retorna None se a data estiver vazia ou não existir no calendário.
     """
-    d = {}
     try:
-        # Verificar se a tabela existe
-        cur = conn.cursor()
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='ultima_linha_arquivos'")
-        if not cur.fetchone():
-            st.warning("A tabela 'ultima_linha_arquivos' não existe. Usando valores padrão.", icon="⚠️")
-            return d
-            
-        cur.execute("""
-            SELECT nome_arquivo, nome_planilha, linha_informacao, data_ultimo_registro
-            FROM ultima_linha_arquivos
-        """)
-        rows = cur.fetchall()
-        for (arq, plan, linha, data_str) in rows:
-            try:
-                data_dt = datetime.strptime(data_str, "%d/%m/%Y").date()
-            except:
-                try:
-                    data_dt = datetime.strptime(data_str, "%Y-%m-%d").date()
-                except:
-                    data_dt = date(1900, 1, 1)
-            d[(arq, plan)] = (linha, data_dt)
-    except Exception as e:
-        st.error("Erro ao buscar últimos registros no banco de dados:", icon="🚫")
-        st.exception(e)
-    return d
-
-def converter_str_para_date(data_str):
-    """
-    Converte a coluna 'data' do banco (em formato yyyy-mm-dd ou dd/mm/aaaa) para um objeto date.
-    Retorna None se não conseguir converter.
-    """
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%Y/%m/%d"):
-        try:
-            return datetime.strptime(data_str, fmt).date()
-        except ValueError:
-            pass
-    return None
+        return date.fromisoformat(data_iso)
+    except (TypeError, ValueError):
+        return None
 
 def calcular_dias_desde_referencia(data_linha, data_referencia):
     """
@@ -79,177 +65,140 @@ def calcular_dias_desde_referencia(data_linha, data_referencia):
     """
     return (data_linha - data_referencia).days
 
-def ajustar_formatacao_celula(celula, eh_data=False):
+def resolver_formatos_numero(wb):
+    """
+    Registra uma única vez no arquivo os formatos usados nas células gravadas
+    e retorna {eh_data: id do formato}, para não repetir a busca a cada célula.
+    """
+    formatos = {}
+    for eh_data, formato in FORMATOS_NUMERO.items():
+        if formato in BUILTIN_FORMATS_REVERSE:
+            formatos[eh_data] = BUILTIN_FORMATS_REVERSE[formato]
+        else:
+            formatos[eh_data] = wb._number_formats.add(formato) + BUILTIN_FORMATS_MAX_SIZE
+    return formatos
+
+def ajustar_formatacao_celula(celula, eh_data=False, formatos=None):
     """
     Ajusta a formatação da célula segundo padrão brasileiro (pt-BR).
     - Se eh_data=True: tenta formatar a célula como data (dd-mmm-yy).
     - Caso contrário, formata com 3 casas decimais e usa vírgula como decimal (se o Excel permitir).
+    'formatos' é o resultado de resolver_formatos_numero (ids já registrados no arquivo).
     """
-    if eh_data:
-        celula.number_format = 'dd-mmm-yy'  # Ex.: 30-ago-24 (dependendo do locale do Office)
+    if formatos is None:
+        celula.number_format = FORMATOS_NUMERO[eh_data]
     else:
-        celula.number_format = '#,##0.000'
+        if not celula._style:
+            celula._style = StyleArray()
+        celula._style.numFmtId = formatos[eh_data]
     return
 
 def definir_arquivo_e_planilha(tipo, placa):
     """
-    Dada a coluna 'tipo' e 'placa', retorna (arquivo_destino, planilha_destino) segundo as regras:
+    Dada a coluna 'tipo' e 'placa', retorna (arquivo_destino, planilha_destino) segundo as REGRAS_DESTINO:
       - CELULA EMERGENCIAL
-      - INCLINOMETRO
       - CELULA DE PESQUISA
       - PAMPULHA
     Caso não se encaixe em nenhuma regra, retorna (None, None).
+    A mesma regra é aplicada no SQL por expressoes_destino_sql.
     """
     placa_strip = placa.strip().upper()
     tipo_up = tipo.strip().upper()
-    
-    # 1) CELULA EMERGENCIAL
-    if tipo_up == "CELULA EMERGENCIAL":
-        # Verifica se placa começa com "PR "
-        if placa_strip.startswith("PR "):
-            arquivo = sanitize_filename("Placa de Recalque Emergencial.xlsx")
-            planilha = placa.strip()  # ex.: "PR 3.4"
-            return (arquivo, planilha)
-        else:
-            return (None, None)
-    
-    
-    # 3) CELULA DE PESQUISA
-    if tipo_up == "CELULA DE PESQUISA":
-        # placa começa com "PR"
-        if placa_strip.startswith("PR"):
-            arquivo = sanitize_filename("Recalques Celula Pesquisa.xlsx")
-            planilha = placa_strip  # "PR03"
-            return (arquivo, planilha)
-        else:
-            return (None, None)
-    
-    # 4) PAMPULHA
-    if tipo_up == "PAMPULHA":
-        # placa que começa com "PR 1." ou é "D1" ou "D2" => AC 01
-        if placa_strip.startswith("PR 1.") or placa_strip in ["D1", "D2"]:
-            return (sanitize_filename("Placa de Recalque AC 01.xlsx"), placa.strip())
-        # placa que começa com "PR 3." => AC 03
-        if placa_strip.startswith("PR 3."):
-            return (sanitize_filename("Placa de Recalque AC 03.xlsx"), placa.strip())
-        # placa que começa com "PR 4." => AC 04
-        if placa_strip.startswith("PR 4."):
-            return (sanitize_filename("Placa de Recalque AC 04.xlsx"), placa.strip())
-        # placa que começa com "PR 5." => AC 05
-        if placa_strip.startswith("PR 5."):
-            return (sanitize_filename("Placa de Recalque AC 05.xlsx"), placa.strip())
-        # placa que começa com "PR A." => AMPLIAÇÃO
-        if placa_strip.startswith("PR A."):
-            return (sanitize_filename("Placa de Recalque AMPLIAÇÃO.xlsx"), placa.strip())
-        return (None, None)
-    
+    for tipo_regra, prefixos, exatas, arquivo, planilha_maiuscula in REGRAS_DESTINO:
+        if tipo_up == tipo_regra and (placa_strip.startswith(prefixos) or placa_strip in exatas):
+            return (sanitize_filename(arquivo), placa_strip if planilha_maiuscula else placa.strip())
     return (None, None)
 
-def encontrar_ultima_linha_valida_banco(conn, nome_arquivo, nome_planilha, ws):
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT ultima_linha_valida
-        FROM verificacao_planilhas
-        WHERE nome_arquivo = ? AND nome_planilha = ?
-        ORDER BY data_processamento DESC
-        LIMIT 1
-    """, (nome_arquivo, nome_planilha))
-    row = cursor.fetchone()
-    if row:
-        return row[0]
-    ultima_linha = ws.max_row
-    while ultima_linha > 0 and ws.cell(ultima_linha, 1).value is None:
-        ultima_linha -= 1
-    return ultima_linha
+def _texto_sql(texto):
+    return "'" + texto.replace("'", "''") + "'"
 
-def inserir_registro_padrao(ws, conn, arquivo, planilha, data_reg, coord_este, coord_norte, elevacao):
+def expressoes_destino_sql():
     """
-    Insere um novo registro no Excel na próxima linha disponível.
+    Expressões SQL (CASE) que calculam o arquivo e a planilha de destino a
+    partir das colunas 'tipo' e 'placa', com as mesmas REGRAS_DESTINO de
+    definir_arquivo_e_planilha. Sem regra, as duas expressões dão NULL.
+    Retorna (expressão do arquivo, expressão da planilha).
     """
-    # Determinar a última linha preenchida na planilha
-    ultima_linha_valida = ws.max_row
-    while ultima_linha_valida > 0 and ws.cell(ultima_linha_valida, 1).value is None:
-        ultima_linha_valida -= 1
+    # trim do SQLite só remove espaços: inclui tabulação e quebras de linha, como o strip()
+    placa = "trim(placa, char(32, 9, 10, 13))"
+    placa_up = f"upper({placa})"
+    tipo_up = "upper(trim(tipo, char(32, 9, 10, 13)))"
+    casos_arquivo = []
+    casos_planilha = []
+    for tipo_regra, prefixos, exatas, arquivo, planilha_maiuscula in REGRAS_DESTINO:
+        testes = [f"substr({placa_up}, 1, {len(prefixo)}) = {_texto_sql(prefixo)}" for prefixo in prefixos]
+        if exatas:
+            testes.append(f"{placa_up} IN ({', '.join(_texto_sql(exata) for exata in exatas)})")
+        condicao = f"{tipo_up} = {_texto_sql(tipo_regra)} AND ({' OR '.join(testes)})"
+        casos_arquivo.append(f"WHEN {condicao} THEN {_texto_sql(sanitize_filename(arquivo))}")
+        casos_planilha.append(f"WHEN {condicao} THEN {placa_up if planilha_maiuscula else placa}")
+    return (f"CASE {' '.join(casos_arquivo)} END",
+            f"CASE {' '.join(casos_planilha)} END")
 
-    # Próxima linha disponível
-    new_row = ultima_linha_valida + 1
+def buscar_registros_pendentes(conn):
+    """
+    Busca em placas_completas_slu_bh só o que ainda não está nas planilhas: o
+    destino de cada registro é calculado no SQL e a data (data_iso) é
+    comparada com a última data da planilha de destino no manifesto; planilhas
+    sem registro no manifesto recebem todo o histórico.
+    Também retorna os registros sem data válida ou sem destino, para o resumo.
+    Retorna a lista de (id, data, data_iso, coordenada_este, coordenada_norte,
+    elevacao, arquivo, planilha).
+    """
+    arquivo, planilha = expressoes_destino_sql()
+    return conn.execute(f"""
+        WITH destinos AS (
+            SELECT id, data, data_iso, coordenada_este, coordenada_norte, elevacao,
+                   {arquivo} AS arquivo, {planilha} AS planilha
+            FROM placas_completas_slu_bh
+        )
+        SELECT d.id, d.data, d.data_iso, d.coordenada_este, d.coordenada_norte, d.elevacao,
+               d.arquivo, d.planilha
+        FROM destinos d
+        LEFT JOIN manifesto_planilhas m
+               ON m.nome_arquivo = d.arquivo AND m.nome_planilha = d.planilha
+        WHERE d.data_iso IS NULL OR d.arquivo IS NULL
+           OR d.data_iso > COALESCE(m.ultima_data, '')
+    """).fetchall()
 
-    # Inserir os dados na nova linha
-    ws.cell(new_row, 1).value = data_reg
-    ajustar_formatacao_celula(ws.cell(new_row, 1), eh_data=True)
+def resumir_ignorados(descricao, ids):
+    """
+    Uma linha do resumo de registros ignorados: quantidade e os primeiros IDs.
+    """
+    amostra = ", ".join(str(row_id) for row_id in ids[:MAX_IDS_RESUMO])
+    resto = f" e mais {len(ids) - MAX_IDS_RESUMO}" if len(ids) > MAX_IDS_RESUMO else ""
+    return f"- {len(ids)} {descricao} (IDs: {amostra}{resto})"
 
-    ws.cell(new_row, 2).value = elevacao
-    ajustar_formatacao_celula(ws.cell(new_row, 2), eh_data=False)
+def inserir_registro_padrao(ws, linha, data_reg, coord_este, coord_norte, elevacao, formatos=None):
+    """
+    Insere um registro no Excel na linha indicada (cursor de gravação da planilha).
+    """
+    ws.cell(linha, 1).value = data_reg
+    ajustar_formatacao_celula(ws.cell(linha, 1), eh_data=True, formatos=formatos)
 
-    ws.cell(new_row, 3).value = coord_este
-    ajustar_formatacao_celula(ws.cell(new_row, 3), eh_data=False)
+    ws.cell(linha, 2).value = elevacao
+    ajustar_formatacao_celula(ws.cell(linha, 2), eh_data=False, formatos=formatos)
 
-    ws.cell(new_row, 4).value = coord_norte
-    ajustar_formatacao_celula(ws.cell(new_row, 4), eh_data=False)
+    ws.cell(linha, 3).value = coord_este
+    ajustar_formatacao_celula(ws.cell(linha, 3), eh_data=False, formatos=formatos)
 
-def sanitize_filename(filename):
-    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+    ws.cell(linha, 4).value = coord_norte
+    ajustar_formatacao_celula(ws.cell(linha, 4), eh_data=False, formatos=formatos)
 
-def criar_tabela_ultima_linha_if_not_exists(conn):
+def inserir_registros_em_bloco(ws, ultima_linha, registros, formatos=None):
     """
-    Cria a tabela 'ultima_linha_arquivos' no banco de dados se ela ainda não existir.
+    Grava os registros (já ordenados por data) em bloco, logo abaixo de
+    ultima_linha: o cursor avança uma linha por registro, sem procurar de novo
+    o fim dos dados. Retorna a última linha gravada.
     """
-    try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS ultima_linha_arquivos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome_arquivo TEXT,
-                nome_planilha TEXT,
-                linha_informacao INTEGER,
-                data_ultimo_registro TEXT,
-                data_processamento TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao criar tabela 'ultima_linha_arquivos': {e}", icon="🚫")
-        st.exception(e)
-        return False
+    for reg in registros:
+        ultima_linha += 1
+        inserir_registro_padrao(ws, ultima_linha, reg["data_dt"], reg["coord_este"],
+                                reg["coord_norte"], reg["elevacao"], formatos)
+    return ultima_linha
 
-def atualizar_ultima_linha_arquivos(conn, arquivo, planilha, linha, data_ultimo):
-    """
-    Atualiza (ou insere) na tabela ultima_linha_arquivos o registro de última
-    linha processada e data do último registro inserido.
-    """
-    try:
-        data_str = data_ultimo.strftime("%Y-%m-%d")
-        cursor = conn.cursor()
-        
-        # Verificar se já existe um registro para este arquivo/planilha
-        cursor.execute("""
-            SELECT id FROM ultima_linha_arquivos
-            WHERE nome_arquivo = ? AND nome_planilha = ?
-        """, (arquivo, planilha))
-        
-        row = cursor.fetchone()
-        if row:
-            # Atualiza o registro existente
-            cursor.execute("""
-                UPDATE ultima_linha_arquivos
-                SET linha_informacao = ?, data_ultimo_registro = ?, data_processamento = CURRENT_TIMESTAMP
-                WHERE nome_arquivo = ? AND nome_planilha = ?
-            """, (linha, data_str, arquivo, planilha))
-        else:
-            # Insere um novo registro
-            cursor.execute("""
-                INSERT INTO ultima_linha_arquivos 
-                (nome_arquivo, nome_planilha, linha_informacao, data_ultimo_registro)
-                VALUES (?, ?, ?, ?)
-            """, (arquivo, planilha, linha, data_str))
-        
-        conn.commit()
-        return True
-    except Exception as e:
-        st.error(f"Erro ao atualizar tabela de controle: {e}", icon="🚫")
-        st.exception(e)
-        return False
+def sanitize_filename(filename):
+    return re.sub(r'[<>:"/\\|?*]', '_', filename)
 
 ################################################################################
 #                             CÓDIGO PRINCIPAL                                 #
@@ -272,91 +221,68 @@ def main():
         
         st.info("Conexão ao banco estabelecida com sucesso!", icon="ℹ️")
         
-        # 1.1) Verificar e criar tabela de controle se necessário
-        if not criar_tabela_ultima_linha_if_not_exists(conn):
-            st.error("Não foi possível preparar as tabelas necessárias. Abortando processo.", icon="🚫")
-            conn.close()
-            return
-            
-        # 2) Obter as últimas datas registradas (controladas em 'ultima_linha_arquivos')
-        ultimas_datas = buscar_ultimas_datas_por_arquivo_planilha(conn)
-        st.info("Leitura das últimas datas registradas concluída.", icon="ℹ️")
-        
-        # 3) Buscar registros na tabela 'placas_completas_slu_bh'
+        # 2) Buscar na tabela 'placas_completas_slu_bh' só os registros posteriores à última
+        #    data de cada planilha de destino (manifesto das planilhas)
         st.status("Buscando registros no banco...", state="running", expanded=False)
         try:
-            cur = conn.cursor()
-            # IMPORTANTE: Aqui corrigimos o nome da tabela!
-            cur.execute("""
-                SELECT id, data, tipo, descricao, coordenada_este, coordenada_norte, elevacao, placa 
-                FROM placas_completas_slu_bh
-            """)
-            todos_registros = cur.fetchall()
+            pendentes = buscar_registros_pendentes(conn)
         except Exception as e:
             st.error("Erro ao consultar a tabela 'placas_completas_slu_bh' no banco de dados!", icon="🚫")
             st.exception(e)
             return
         
-        st.success(f"Foram lidos {len(todos_registros)} registros do banco.", icon="✅")
+        st.success(f"Foram lidos {len(pendentes)} registros do banco.", icon="✅")
         
-        # 4) Filtrar e classificar registros
+        # 3) Separar os registros a gravar dos que não têm data válida ou destino
         registros_validos = []
-        for row in todos_registros:
-            row_id, data_str, tipo, desc, este, norte, elev, placa = row
-            data_dt = converter_str_para_date(data_str)
+        datas_invalidas = []
+        sem_destino = []
+        for row_id, data_str, data_iso, este, norte, elev, arquivo_dest, planilha_dest in pendentes:
+            data_dt = converter_data_iso(data_iso)
             if not data_dt:
-                st.warning(f"O registro ID={row_id} tem data inválida: '{data_str}'. Ignorando...", icon="⚠️")
+                datas_invalidas.append(row_id)
                 continue
-            
-            # Descobrir destino
-            arquivo_dest, planilha_dest = definir_arquivo_e_planilha(tipo, placa)
             if not arquivo_dest or not planilha_dest:
-                st.warning(f"Registro ID={row_id} não se encaixa em nenhuma regra de destino. Ignorando...", icon="⚠️")
-                continue
-            
-            # Verificar se data_dt > última data do (arquivo_dest, planilha_dest)
-            ultima_data_conhecida, linha_informacao = ultimas_datas.get((arquivo_dest, planilha_dest), (0, date(1900,1,1)))
-            if not isinstance(ultima_data_conhecida, date):
-                ultima_data_conhecida = date(1900, 1, 1)
-            if data_dt <= ultima_data_conhecida:
-                # Não grava, pois não é posterior
+                sem_destino.append(row_id)
                 continue
             
             registros_validos.append({
                 "id": row_id,
                 "data_dt": data_dt,
-                "tipo": tipo,
-                "placa": placa,
                 "coord_este": este,
                 "coord_norte": norte,
                 "elevacao": elev,
                 "arquivo": arquivo_dest,
-                "planilha": planilha_dest,
-                "linha_informacao": linha_informacao
+                "planilha": planilha_dest
             })
         
+        # 4) Um único resumo dos registros ignorados
+        if datas_invalidas or sem_destino:
+            linhas_resumo = []
+            if datas_invalidas:
+                linhas_resumo.append(resumir_ignorados("registro(s) com data inválida", datas_invalidas))
+            if sem_destino:
+                linhas_resumo.append(resumir_ignorados("registro(s) sem regra de destino", sem_destino))
+            st.warning("Registros ignorados:\n" + "\n".join(linhas_resumo), icon="⚠️")
+        
         st.info(f"Temos {len(registros_validos)} registros que precisam ser gravados.", icon="ℹ️")
         if not registros_validos:
             st.warning("Nenhum registro a gravar. Encerrando...", icon="⚠️")
             conn.close()
             return
         
-        # 5) Agrupar por (arquivo, planilha)
+        # 5) Agrupar por arquivo e, dentro dele, por planilha
         from collections import defaultdict
-        grupos = defaultdict(list)
+        grupos = defaultdict(lambda: defaultdict(list))
         for reg in registros_validos:
-            chave = (reg["arquivo"], reg["planilha"])
-            grupos[chave].append(reg)
+            grupos[reg["arquivo"]][reg["planilha"]].append(reg)
         
-        # 6) Gravar em cada arquivo/planilha
-        total_grupos = len(grupos)
+        # 6) Gravar em cada arquivo (aberto e salvo uma única vez) e em cada planilha
+        total_grupos = sum(len(planilhas) for planilhas in grupos.values())
         progresso_geral = st.progress(0, text="Iniciando gravação nos arquivos...")
         cont_grupos = 0
         
-        for (arquivo_excel, planilha_excel), regs_grupo in grupos.items():
-            cont_grupos += 1
-            st.info(f"Iniciando processamento do arquivo '{arquivo_excel}' / planilha '{planilha_excel}'", icon="ℹ️")
-            
+        for arquivo_excel, planilhas in grupos.items():
             # O arquivo já deve estar sanitizado na função definir_arquivo_e_planilha, mas vamos garantir
             arquivo_excel = sanitize_filename(arquivo_excel)
             caminho_arq = os.path.join(DIRETORIO_EXCEL, arquivo_excel)
@@ -367,47 +293,51 @@ def main():
                     continue
                 
                 wb = load_workbook(caminho_arq)
+                formatos = resolver_formatos_numero(wb)
+                manifesto = ler_manifesto(conn, arquivo_excel)
+                registros_manifesto = []
                 
-                # Remover a parte do código que faz a transferência dos dados do Inclinômetro
-                # if planilha_excel == "INCLINÔMETRO" and arquivo_excel == "Inclinômetro.xlsx":
-                #     st.warning(f"Registros para Inclinômetro não serão processados. Ignorando...", icon="⚠️")
-                #     continue
+                for planilha_excel, regs_grupo in planilhas.items():
+                    cont_grupos += 1
+                    st.info(f"Iniciando processamento do arquivo '{arquivo_excel}' / planilha '{planilha_excel}'", icon="ℹ️")
+                    
+                    if planilha_excel not in wb.sheetnames:
+                        st.error(f"Planilha '{planilha_excel}' não encontrada em '{arquivo_excel}'. Não gravado.", icon="🚫")
+                        continue
+                    
+                    ws = wb[planilha_excel]
+                    # Cursor de gravação: fim dos dados pelo manifesto (ou uma única varredura);
+                    # a última data conferida na planilha é a que vale
+                    ultima_linha, ultima_data_planilha = localizar_fim_dados(
+                        ws, manifesto.get((arquivo_excel, planilha_excel)))
+                    regs_ordenados = sorted((reg for reg in regs_grupo
+                                             if reg["data_dt"].isoformat() > (ultima_data_planilha or "")),
+                                            key=lambda x: x["data_dt"])
+                    if not regs_ordenados:
+                        st.info(f"'{arquivo_excel}' / '{planilha_excel}' já está atualizada.", icon="ℹ️")
+                        continue
+                    
+                    with st.spinner(f"Gravando {len(regs_ordenados)} pontos em '{arquivo_excel}' / '{planilha_excel}'..."):
+                        ultima_linha = inserir_registros_em_bloco(ws, ultima_linha, regs_ordenados, formatos)
+                    registros_manifesto.append(montar_registro(ws, arquivo_excel, planilha_excel, ultima_linha,
+                                                               regs_ordenados[-1]["data_dt"].isoformat()))
+                    
+                    progresso_geral.progress(int((cont_grupos / total_grupos) * 100),
+                                             text=f"Progresso geral: {cont_grupos}/{total_grupos}")
                 
-                # Planilha comum
-                if planilha_excel not in wb.sheetnames:
-                    st.error(f"Planilha '{planilha_excel}' não encontrada em '{arquivo_excel}'. Não gravado.", icon="🚫")
+                if not registros_manifesto:
                     continue
-                
-                ws = wb[planilha_excel]
-                regs_ordenados = sorted(regs_grupo, key=lambda x: x["data_dt"])
-                
-                with st.spinner(f"Gravando {len(regs_ordenados)} pontos em '{arquivo_excel}' / '{planilha_excel}'..."):
-                    for reg in regs_ordenados:
-                        inserir_registro_padrao(
-                            ws,
-                            conn,
-                            arquivo_excel,
-                            planilha_excel,
-                            reg["data_dt"],
-                            reg["coord_este"],
-                            reg["coord_norte"],
-                            reg["elevacao"]
-                        )
                 wb.save(caminho_arq)
                 
-                # Atualizar a tabela de controle com a última data processada
-                ultima_linha = encontrar_ultima_linha_valida_banco(conn, arquivo_excel, planilha_excel, ws)
-                data_ultimo_reg = regs_ordenados[-1]["data_dt"] if regs_ordenados else date.today()
-                atualizar_ultima_linha_arquivos(conn, arquivo_excel, planilha_excel, ultima_linha, data_ultimo_reg)
+                # Atualizar o manifesto com a última linha e a última data gravadas em cada planilha
+                atualizar_manifesto(conn, registros_manifesto, ETAPA_MANIFESTO)
                 
-                st.success(f"Registros gravados em '{arquivo_excel}' / '{planilha_excel}'.", icon="✅")
+                for registro in registros_manifesto:
+                    st.success(f"Registros gravados em '{arquivo_excel}' / '{registro[1]}'.", icon="✅")
             except Exception as e:
                 st.error(f"Erro ao processar arquivo '{arquivo_excel}':", icon="🚫")
                 st.exception(e)
                 continue
-            
-            progresso_geral.progress(int((cont_grupos / total_grupos) * 100),
-                                     text=f"Progresso geral: {cont_grupos}/{total_grupos}")
         
         st.success("Processo de gravação concluído com êxito!", icon="✅")
         conn.close()
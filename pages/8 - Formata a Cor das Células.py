@@ -5,6 +5,11 @@ from openpyxl import load_workbook
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, numbers
 from collections import defaultdict
 import streamlit as st
+from conexao_banco import BANCO_PRINCIPAL, obter_conexao
+from manifesto_planilhas import atualizar_manifesto, ler_manifesto, localizar_fim_dados, montar_registro
+
+# Etapa gravada no manifesto das planilhas
+ETAPA_MANIFESTO = "pagina_8"
 
 # Configuração do logging
 log_filename = f'excel_processing_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
@@ -124,11 +129,16 @@ def format_column_as_integer(worksheet, column):
             except ValueError:
                 pass  # Ignora células que não podem ser convertidas para inteiro
 
-def process_excel_file(filepath, progress_bar=None, status_text=None):
+def process_excel_file(filepath, progress_bar=None, status_text=None, conn=None):
     """
     Processa um arquivo Excel, aplicando formatações nas últimas 3 linhas com dados na coluna A e nas 50 células vazias após a última linha com dados.
+    Com 'conn', a última linha de cada aba vem do manifesto das planilhas (sem varrer a coluna A)
+    e o manifesto é atualizado depois de salvar.
     """
     try:
+        filename = os.path.basename(filepath)
+        manifest = ler_manifesto(conn, filename) if conn is not None else {}
+        manifest_records = []
         workbook = load_workbook(filepath)
         if status_text:
             status_text.write(f"Processando arquivo: {filepath}")
@@ -145,9 +155,13 @@ def process_excel_file(filepath, progress_bar=None, status_text=None):
                 progress_bar.progress(progress)
             
             # Verifica se o arquivo é "Inclinômetro.xlsx" e formata a coluna B como inteiro
-            if os.path.basename(filepath) == "Inclinômetro.xlsx":
+            if filename == "Inclinômetro.xlsx":
                 format_column_as_integer(worksheet, 'B')
             
+            # Última linha com dados na coluna A (manifesto ou uma única varredura)
+            last_row, _ = localizar_fim_dados(worksheet, manifest.get((filename, sheet_name)))
+            last_row = max(last_row, 1)
+            
             # Para cada coluna de A até J
             for col_letter in 'ABCDEFGHIJ':
                 template_cell, count, total_formats = find_most_common_format(worksheet, col_letter)
@@ -156,12 +170,6 @@ def process_excel_file(filepath, progress_bar=None, status_text=None):
                     if status_text:
                         status_text.write(f"Formatando coluna {col_letter}... (Formatos encontrados: {total_formats})")
                     
-                    # Encontra a última linha com dados na coluna A
-                    last_row = 1
-                    for row in range(1, worksheet.max_row + 1):
-                        if worksheet['A' + str(row)].value is not None:
-                            last_row = row
-                    
                     # Aplica formatação nas últimas 3 linhas com dados na coluna A
                     for row in range(last_row - 2, last_row + 1):
                         cell = worksheet[f'{col_letter}{row}']
@@ -187,12 +195,18 @@ def process_excel_file(filepath, progress_bar=None, status_text=None):
                 else:
                     if status_text:
                         status_text.warning(f"Nenhum formato encontrado para coluna {col_letter}")
+            
+            manifest_records.append(montar_registro(worksheet, filename, sheet_name, last_row))
         
         # Salva o arquivo
         workbook.save(filepath)
         if status_text:
             status_text.success(f"Arquivo salvo com sucesso: {filepath}")
         
+        # Atualiza o manifesto das planilhas (depois de salvar)
+        if conn is not None:
+            atualizar_manifesto(conn, manifest_records, ETAPA_MANIFESTO)
+        
     except Exception as e:
         if status_text:
             status_text.error(f"Erro ao processar arquivo {filepath}: {str(e)}")
@@ -245,13 +259,14 @@ def main():
             progress_bar = st.progress(0)
             status_text = st.empty()
             
+            conn = obter_conexao(BANCO_PRINCIPAL)
             try:
                 # Processa cada arquivo
                 for idx, filename in enumerate(excel_files):
                     filepath = os.path.join(directory, filename)
                     status_text.write(f"Processando arquivo {idx+1} de {len(excel_files)}: {filename}")
                     
-                    process_excel_file(filepath, progress_bar, status_text)
+                    process_excel_file(filepath, progress_bar, status_text, conn)
                     
                     # Atualiza barra de progresso geral
                     progress = (idx + 1) / len(excel_files)
@@ -262,6 +277,8 @@ def main():
             except Exception as e:
                 st.error(f"Erro durante o processamento: {str(e)}")
                 logging.error(f"Erro durante a execução: {str(e)}")
+            finally:
+                conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,6 +4,17 @@ import os
 from datetime import datetime
 import streamlit as st
 import pandas as pd
+from conexao_banco import BANCO_PRINCIPAL, obter_conexao
+from manifesto_planilhas import (
+    atualizar_manifesto,
+    ler_manifesto,
+    localizar_fim_dados,
+    montar_registro,
+    procurar_ultima_linha,
+)
+
+# Etapa gravada no manifesto das planilhas
+ETAPA_MANIFESTO = "pagina_9"
 
 def parse_date(value):
     """Converte strings no formato 'dd-mmm-aa' para datetime"""
@@ -52,11 +63,11 @@ def find_last_row(sheet, column='A'):
                 return row
     return 1
 
-def get_last_data_rows(sheet, count=20):
+def get_last_data_rows(sheet, count=20, last_row=None):
     """Retorna uma lista com os índices das últimas 'count' linhas que possuem dados
-    nas colunas B, C ou D."""
+    nas colunas B, C ou D, procurando a partir de last_row (ou do max_row da planilha)."""
     data_rows = []
-    for row in range(sheet.max_row, 0, -1):
+    for row in range(last_row or sheet.max_row, 0, -1):
         # Verifica se alguma das colunas B, C ou D possui valor
         if any(sheet.cell(row=row, column=col).value is not None for col in [2, 3, 4]):
             data_rows.append(row)
@@ -64,9 +75,9 @@ def get_last_data_rows(sheet, count=20):
             break
     return sorted(data_rows)
 
-def format_cells(workbook, sheet):
+def format_cells(workbook, sheet, last_row=None):
     """Formata as células das últimas 20 linhas com dados de coordenadas e cotas e retorna as linhas formatadas"""
-    rows_to_format = get_last_data_rows(sheet, count=20)
+    rows_to_format = get_last_data_rows(sheet, count=20, last_row=last_row)
     
     for row in rows_to_format:
         if row <= 0:
@@ -120,6 +131,7 @@ def main():
         total_files = len(excel_files)
         progress_bar = st.progress(0)
         status_text = st.empty()
+        conn = obter_conexao(BANCO_PRINCIPAL)
         
         for file_index, file_name in enumerate(excel_files):
             try:
@@ -127,11 +139,18 @@ def main():
                 file_path = os.path.join(pasta_planilhas, file_name)
                 workbook = openpyxl.load_workbook(file_path)
                 total_sheets = len(workbook.sheetnames)
+                manifest = ler_manifesto(conn, file_name)
+                manifest_records = []
                 
                 for sheet_index, sheet_name in enumerate(workbook.sheetnames):
                     status_text.text(f"Processando {file_name} - Aba: {sheet_name}")
                     sheet = workbook[sheet_name]
-                    formatted_rows = format_cells(workbook, sheet)
+                    # Última linha com dados pelo manifesto das planilhas (sem varrer desde o max_row)
+                    last_row, _ = localizar_fim_dados(sheet, manifest.get((file_name, sheet_name)))
+                    # O manifesto segue a coluna A; linhas abaixo dela com dados só em B-D também são formatadas
+                    start_row = max([last_row] + [procurar_ultima_linha(sheet, col) for col in (2, 3, 4)])
+                    formatted_rows = format_cells(workbook, sheet, start_row)
+                    manifest_records.append(montar_registro(sheet, file_name, sheet_name, last_row))
                     
                     # Armazena a informação de cada linha formatada
                     for row in formatted_rows:
@@ -146,10 +165,13 @@ def main():
                     progress_bar.progress(progress)
                 
                 workbook.save(file_path)
+                # Atualiza o manifesto das planilhas (depois de salvar)
+                atualizar_manifesto(conn, manifest_records, ETAPA_MANIFESTO)
                 
             except Exception as e:
                 st.error(f"Erro ao processar {file_name}: {str(e)}")
         
+        conn.close()
         progress_bar.progress(1.0)
         status_text.text("Processamento concluído!")
         st.success("Todos os arquivos foram processados com sucesso!")
@@ -0,0 +1,423 @@
+import hashlib
+import os
+import re
+import threading
+from datetime import date
+from functools import lru_cache
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from conexao_banco import obter_conexao
+from ingestao_txt import BANCO_LEITURAS, TRAVA_INGESTAO, ingerir_arquivos
+
+# Pasta monitorada e banco do registro de arquivos (o mesmo das leituras)
+PASTA_TXT = 'media/originais_txt'
+BANCO_REGISTRO = BANCO_LEITURAS
+
+# Segundos sem novos eventos na pasta antes de processar (evita ler arquivo ainda sendo copiado)
+ESPERA_EVENTOS = 5
+
+MAPEAMENTO_TIPOS = {
+    "EM": "CELULA EMERGENCIAL",
+    "IC": "INCLINOMETRO",
+    "LV": "LEVANTAMENTO TOPOGRÁFICO",
+    "PA": "PAMPULHA",
+    "PE": "CELULA DE PESQUISA"
+}
+
+
+def transform_tipo(tipo):
+    """
+    Converte o prefixo do arquivo (ou o próprio nome do arquivo, ex.:
+    'EM100225M.TXT' ou 'pa_15-01-25.txt') no tipo de informação.
+    Prefixos desconhecidos são devolvidos em maiúsculas.
+    """
+    tipo = os.path.basename(tipo).strip().upper()
+    for prefixo, valor in MAPEAMENTO_TIPOS.items():
+        if tipo.startswith(prefixo):
+            return valor
+    return tipo
+
+
+def abrir_conexao_registro(caminho=BANCO_REGISTRO):
+    """
+    Abre o banco de dados do registro 'arquivos' (tabela criada pelas migrações).
+    """
+    return obter_conexao(caminho)
+
+
+def calcular_hash(caminho, tamanho_bloco=1024 * 1024):
+    """
+    Calcula o SHA-256 do conteúdo do arquivo, lendo em blocos.
+    """
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def _ler_metadados_arquivo(caminho, tamanho, mtime, tamanho_bloco=1024 * 1024):
+    """
+    Lê o arquivo uma única vez e devolve (número de linhas, primeira linha).
+    O cache é indexado por (caminho, tamanho, mtime): enquanto o arquivo não
+    muda, ele não é lido de novo nos reruns do Streamlit.
+    """
+    linhas = 0
+    ultimo = b'\n'
+    primeira_linha = b''
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            if not linhas and not primeira_linha:
+                primeira_linha = bloco.split(b'\n', 1)[0]
+            linhas += bloco.count(b'\n')
+            ultimo = bloco[-1:]
+    if ultimo != b'\n':
+        linhas += 1
+    return linhas, primeira_linha.decode('latin-1').strip()
+
+
+def contar_linhas(caminho):
+    """
+    Conta as linhas do arquivo (mesmo resultado de len(f.readlines())),
+    usando o cache por (tamanho, mtime).
+    """
+    info = os.stat(caminho)
+    return _ler_metadados_arquivo(caminho, info.st_size, info.st_mtime)[0]
+
+
+def _montar_data(dia, mes, ano):
+    if ano < 100:
+        ano += 2000
+    try:
+        return date(ano, mes, dia)
+    except ValueError:
+        return None
+
+
+def inferir_data_nome(nome_arquivo):
+    """
+    Tenta obter a data do levantamento a partir do nome do arquivo.
+    Aceita ddmmaaaa, ddmmaa (EM100225M.TXT -> 10/02/2025) e as formas
+    sem zero à esquerda dmmaa/ddmaa (EM27125M.TXT -> 27/01/2025) e dmaa.
+    Retorna None se não houver data reconhecível ou se ela for ambígua.
+    """
+    nome = os.path.splitext(nome_arquivo)[0]
+    for digitos in re.findall(r'\d+', nome):
+        if len(digitos) == 8:
+            candidatos = [(digitos[:2], digitos[2:4], digitos[4:])]
+        elif len(digitos) == 6:
+            candidatos = [(digitos[:2], digitos[2:4], digitos[4:])]
+        elif len(digitos) == 5:
+            candidatos = [(digitos[:1], digitos[1:3], digitos[3:]),
+                          (digitos[:2], digitos[2:3], digitos[3:])]
+        elif len(digitos) == 4:
+            candidatos = [(digitos[:1], digitos[1:2], digitos[2:])]
+        else:
+            continue
+        datas = {_montar_data(int(d), int(m), int(a)) for d, m, a in candidatos} - {None}
+        if len(datas) == 1:
+            return datas.pop()
+    return None
+
+
+def inferir_data_cabecalho(linha):
+    """
+    Procura uma data (dd/mm/aaaa, dd-mm-aa, dd.mm.aaaa) na linha de cabeçalho
+    'M' exportada pela estação total. Retorna None se a linha não for de
+    cabeçalho ou não contiver data.
+    """
+    if not linha.startswith('M'):
+        return None
+    match = re.search(r'(?<!\d)(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})(?!\d)', linha)
+    if not match:
+        return None
+    dia, mes, ano = (int(parte) for parte in match.groups())
+    return _montar_data(dia, mes, ano)
+
+
+def inferir_registro(pasta, nome_arquivo):
+    """
+    Monta a sugestão de cadastro de um arquivo TXT:
+    tipo pelo prefixo do nome, data pelo nome ou pela linha de cabeçalho 'M'
+    e número de linhas. Retorna um dicionário com nome_arquivo, tipo, data,
+    origem_data ('nome', 'cabeçalho' ou None) e registros.
+    """
+    caminho = os.path.join(pasta, nome_arquivo)
+    info = os.stat(caminho)
+    registros, primeira_linha = _ler_metadados_arquivo(caminho, info.st_size, info.st_mtime)
+
+    data = inferir_data_nome(nome_arquivo)
+    origem_data = 'nome' if data else None
+    if data is None:
+        data = inferir_data_cabecalho(primeira_linha)
+        origem_data = 'cabeçalho' if data else None
+
+    return {
+        'nome_arquivo': nome_arquivo,
+        'tipo': inferir_tipo_nome(nome_arquivo),
+        'data': data,
+        'origem_data': origem_data,
+        'registros': registros,
+    }
+
+
+def inferir_tipo_nome(nome_arquivo):
+    """
+    Retorna o tipo do arquivo a partir do prefixo do nome, ou None se o prefixo
+    não corresponder a um tipo conhecido.
+    """
+    tipo = transform_tipo(nome_arquivo)
+    return tipo if tipo in MAPEAMENTO_TIPOS.values() else None
+
+
+def arquivo_duplicado(conn, hash_conteudo):
+    """
+    Verifica se já existe arquivo registrado com o mesmo conteúdo.
+    """
+    return conn.execute("SELECT 1 FROM arquivos WHERE hash_conteudo = ? LIMIT 1",
+                        (hash_conteudo,)).fetchone() is not None
+
+
+def sincronizar_pasta(conn, pasta=PASTA_TXT):
+    """
+    Compara os arquivos .txt da pasta com o registro 'arquivos':
+    - nome, tamanho e mtime iguais: arquivo inalterado, não é lido;
+    - nome conhecido com conteúdo diferente: registro atualizado e arquivo
+      marcado como 'alterado' (na próxima gravação as leituras da versão
+      anterior são apagadas e substituídas pelas da nova, na mesma transação);
+    - nome novo com conteúdo já registrado: marcado como 'duplicado';
+    - nome novo com tipo e data reconhecíveis (nome ou cabeçalho 'M'): registrado
+      para processamento.
+    Arquivos novos sem tipo/data reconhecíveis ficam para a confirmação na página principal.
+    Lê e grava o registro em uma transação BEGIN IMMEDIATE: a página principal
+    (a cada rerun) e o observador da pasta sincronizam ao mesmo tempo, e sem a
+    trava os dois veriam o mesmo arquivo como novo e tentariam inseri-lo.
+    Retorna um dicionário com as listas de nomes de cada situação.
+    """
+    resultado = {'novos': [], 'alterados': [], 'duplicados': [], 'pendentes': []}
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _sincronizar_registro(conn, pasta, resultado)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return resultado
+
+
+def _sincronizar_registro(conn, pasta, resultado):
+    # Corpo de sincronizar_pasta, dentro da transação aberta por ela
+    registrados = {
+        nome: (tamanho, mtime, hash_conteudo)
+        for nome, tamanho, mtime, hash_conteudo in conn.execute(
+            "SELECT nome_arquivo, tamanho, mtime, hash_conteudo FROM arquivos")
+    }
+
+    for nome in sorted(os.listdir(pasta)):
+        if not nome.lower().endswith('.txt'):
+            continue
+        caminho = os.path.join(pasta, nome)
+        info = os.stat(caminho)
+
+        if nome in registrados:
+            tamanho, mtime, hash_registrado = registrados[nome]
+            if tamanho == info.st_size and mtime == info.st_mtime:
+                continue
+            hash_atual = calcular_hash(caminho)
+            if hash_atual == hash_registrado:
+                # Só a data de modificação mudou
+                conn.execute("UPDATE arquivos SET tamanho = ?, mtime = ? WHERE nome_arquivo = ?",
+                             (info.st_size, info.st_mtime, nome))
+                continue
+            if hash_registrado is None and tamanho is None:
+                # Registro antigo, sem metadados: apenas completa o cadastro
+                conn.execute("""UPDATE arquivos SET tamanho = ?, mtime = ?, hash_conteudo = ?
+                                WHERE nome_arquivo = ?""",
+                             (info.st_size, info.st_mtime, hash_atual, nome))
+                continue
+            conn.execute("""UPDATE arquivos
+                            SET tamanho = ?, mtime = ?, hash_conteudo = ?, registros = ?,
+                                processamento = 'alterado'
+                            WHERE nome_arquivo = ?""",
+                         (info.st_size, info.st_mtime, hash_atual, contar_linhas(caminho), nome))
+            resultado['alterados'].append(nome)
+            continue
+
+        sugestao = inferir_registro(pasta, nome)
+        tipo, data = sugestao['tipo'], sugestao['data']
+        if not (tipo and data):
+            resultado['pendentes'].append(nome)
+            continue
+
+        hash_atual = calcular_hash(caminho)
+        if arquivo_duplicado(conn, hash_atual):
+            situacao = 'duplicado'
+            resultado['duplicados'].append(nome)
+        else:
+            situacao = 'nao_processado'
+            resultado['novos'].append(nome)
+
+        conn.execute("""INSERT INTO arquivos
+                        (nome_arquivo, tipo, dia, mes, ano, registros, processamento,
+                         tamanho, mtime, hash_conteudo)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                     (nome, tipo, data.day, data.month, data.year,
+                      sugestao['registros'], situacao,
+                      info.st_size, info.st_mtime, hash_atual))
+
+
+def registrar_arquivos(conn, itens, pasta=PASTA_TXT):
+    """
+    Grava no registro 'arquivos', em uma única transação, os arquivos
+    confirmados pelo usuário. Cada item é um dicionário com nome_arquivo,
+    tipo, data (date) e registros.
+    Retorna dicionário {nome_arquivo: situação}, onde a situação é
+    'nao_processado', 'duplicado' (conteúdo já registrado) ou 'existente'.
+    """
+    situacoes = {}
+    hashes_lote = set()
+    # BEGIN IMMEDIATE antes de consultar: o observador pode registrar o mesmo arquivo ao mesmo tempo
+    conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        for item in itens:
+            nome = item['nome_arquivo']
+            if conn.execute("SELECT 1 FROM arquivos WHERE nome_arquivo = ?", (nome,)).fetchone():
+                situacoes[nome] = 'existente'
+                continue
+
+            caminho = os.path.join(pasta, nome)
+            info = os.stat(caminho)
+            hash_conteudo = calcular_hash(caminho)
+            if hash_conteudo in hashes_lote or arquivo_duplicado(conn, hash_conteudo):
+                situacao = 'duplicado'
+            else:
+                situacao = 'nao_processado'
+            hashes_lote.add(hash_conteudo)
+
+            data = item['data']
+            conn.execute("""INSERT INTO arquivos
+                            (nome_arquivo, tipo, dia, mes, ano, registros, processamento,
+                             tamanho, mtime, hash_conteudo)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                         (nome, item['tipo'], data.day, data.month, data.year,
+                          item['registros'], situacao,
+                          info.st_size, info.st_mtime, hash_conteudo))
+            situacoes[nome] = situacao
+    return situacoes
+
+
+def marcar_com_erro(conn, nomes):
+    """
+    Marca como 'erro' os arquivos que falharam na leitura ou na gravação, para
+    que o observador não tente de novo a cada evento da pasta. Voltam a ser
+    gravados quando o conteúdo muda ('alterado') ou pela página 3.
+    """
+    with conn:
+        conn.executemany("""UPDATE arquivos SET processamento = 'erro'
+                            WHERE nome_arquivo = ?
+                              AND (processamento IS NULL
+                                   OR processamento IN ('nao_processado', 'alterado'))""",
+                         [(nome,) for nome in nomes])
+
+
+def ingerir_pendentes(pasta=PASTA_TXT, processos=1):
+    """
+    Grava no banco de leituras todos os arquivos registrados como
+    'nao_processado' ou 'alterado' (estes têm as leituras anteriores substituídas).
+    Arquivos que falham na leitura ou na gravação são marcados como 'erro'
+    (marcar_com_erro) e a função levanta RuntimeError com os nomes e os erros,
+    depois de gravar os demais.
+    Retorna lista de (nome_arquivo, registros gravados).
+    """
+    conn = abrir_conexao_registro()
+    try:
+        pendentes = conn.execute("""
+            SELECT nome_arquivo, tipo, dia, mes, ano
+            FROM arquivos
+            WHERE (processamento IS NULL OR processamento IN ('nao_processado', 'alterado'))
+              AND dia IS NOT NULL AND mes IS NOT NULL AND ano IS NOT NULL""").fetchall()
+    finally:
+        conn.close()
+
+    arquivos = [
+        (nome, os.path.join(pasta, nome), tipo, date(ano, mes, dia))
+        for nome, tipo, dia, mes, ano in pendentes
+        if os.path.exists(os.path.join(pasta, nome))
+    ]
+    if not arquivos:
+        return []
+
+    with TRAVA_INGESTAO:
+        resultados, resumo = ingerir_arquivos(arquivos, processos)
+    if resumo['erro']:
+        raise RuntimeError(resumo['erro'])
+
+    falhas = [r for r in resultados if r['situacao'].startswith('erro')]
+    if falhas:
+        conn = abrir_conexao_registro()
+        try:
+            marcar_com_erro(conn, [r['arquivo'] for r in falhas])
+        finally:
+            conn.close()
+        raise RuntimeError("; ".join(f"{r['arquivo']}: {r['situacao']}" for r in falhas))
+    return [(r['arquivo'], r['gravados']) for r in resultados]
+
+
+class ObservadorPastaTxt(FileSystemEventHandler):
+    """
+    Recebe os eventos do watchdog na pasta de TXT e, após ESPERA_EVENTOS
+    segundos sem novos eventos, registra e grava os arquivos novos ou alterados.
+    """
+
+    def __init__(self, pasta=PASTA_TXT, espera=ESPERA_EVENTOS):
+        super().__init__()
+        self.pasta = pasta
+        self.espera = espera
+        self.ultimo_resultado = None
+        self.ultimo_erro = None
+        self._timer = None
+        self._trava = threading.Lock()
+
+    def on_any_event(self, event):
+        if event.event_type in ('opened', 'closed_no_write'):
+            return
+        caminho = getattr(event, 'dest_path', '') or event.src_path
+        if event.is_directory or not str(caminho).lower().endswith('.txt'):
+            return
+        with self._trava:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.espera, self.processar)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def processar(self):
+        try:
+            conn = abrir_conexao_registro()
+            try:
+                resultado = sincronizar_pasta(conn, self.pasta)
+            finally:
+                conn.close()
+            resultado['gravados'] = ingerir_pendentes(self.pasta)
+            if resultado['novos'] or resultado['alterados'] or resultado['gravados']:
+                self.ultimo_resultado = resultado
+            self.ultimo_erro = None
+        except Exception as e:
+            self.ultimo_erro = str(e)
+
+
+def iniciar_observador(pasta=PASTA_TXT):
+    """
+    Inicia o observador da pasta de TXT em segundo plano.
+    Retorna (observer, handler).
+    """
+    handler = ObservadorPastaTxt(pasta)
+    observer = Observer()
+    observer.daemon = True
+    observer.schedule(handler, pasta, recursive=False)
+    observer.start()
+    return observer, handler
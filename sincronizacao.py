@@ -0,0 +1,268 @@
+import os
+
+from conexao_banco import BANCO_COMPLETO, BANCO_PRINCIPAL, obter_conexao
+from migracoes import CHAVES_NATURAIS, COLUNAS_LEITURAS, tabela_alteracoes
+
+# Tabelas sincronizadas: colunas copiadas e chave natural (mesma dos índices únicos das migrações)
+TABELAS_SINCRONIZADAS = {
+    tabela: {'colunas': COLUNAS_LEITURAS[tabela], 'chave': CHAVES_NATURAIS[tabela]}
+    for tabela in COLUNAS_LEITURAS
+}
+
+# Colunas que não contam como diferença entre origem e destino
+COLUNAS_SEM_CONFLITO = ('arquivo_origem',)
+
+
+def _colunas_tabela(conn, esquema, tabela):
+    return [coluna[1] for coluna in conn.execute(f"PRAGMA {esquema}.table_info({tabela})")]
+
+
+def _condicao(colunas, origem='o', destino='d'):
+    # IS compara também valores nulos e continua usando o índice da chave
+    return " AND ".join(f"{destino}.{coluna} IS {origem}.{coluna}" for coluna in colunas)
+
+
+def sincronizar_tabela(conn, tabela, esquema_origem='origem'):
+    """
+    Copia para a tabela do banco principal da conexão (destino) as linhas da
+    mesma tabela no banco anexado 'esquema_origem' cuja chave natural ainda
+    não existe no destino, com um único INSERT ... SELECT ... WHERE NOT EXISTS.
+    Não controla transação.
+    Retorna {'origem', 'inseridos', 'ignorados', 'conflitos'}:
+    - ignorados: a chave já existe no destino com os mesmos valores;
+    - conflitos: a chave já existe no destino com valores diferentes (o destino
+      é mantido).
+    """
+    definicao = TABELAS_SINCRONIZADAS[tabela]
+    colunas_destino = _colunas_tabela(conn, 'main', tabela)
+    colunas_origem = _colunas_tabela(conn, esquema_origem, tabela)
+    colunas = [c for c in definicao['colunas'] if c in colunas_destino and c in colunas_origem]
+    chave = definicao['chave']
+    valores = [c for c in colunas if c not in chave and c not in COLUNAS_SEM_CONFLITO]
+
+    mesma_chave = f"SELECT 1 FROM main.{tabela} d WHERE {_condicao(chave)}"
+    mesmos_valores = f"{mesma_chave} AND {_condicao(valores)}" if valores else mesma_chave
+
+    origem, ignorados, conflitos = conn.execute(f"""
+        SELECT COUNT(*),
+               COALESCE(SUM(EXISTS ({mesmos_valores})), 0),
+               COALESCE(SUM(EXISTS ({mesma_chave}) AND NOT EXISTS ({mesmos_valores})), 0)
+        FROM {esquema_origem}.{tabela} o""").fetchone()
+
+    lista_colunas = ", ".join(colunas)
+    inseridos = conn.execute(f"""
+        INSERT OR IGNORE INTO main.{tabela} ({lista_colunas})
+        SELECT {", ".join(f"o.{c}" for c in colunas)}
+        FROM {esquema_origem}.{tabela} o
+        WHERE NOT EXISTS ({mesma_chave})""").rowcount
+
+    return {'origem': origem, 'inseridos': inseridos, 'ignorados': ignorados, 'conflitos': conflitos}
+
+
+def listar_conflitos(conn, tabela, esquema_origem='origem', limite=100):
+    """
+    Lista (até 'limite') as linhas da origem cuja chave existe no destino com
+    valores diferentes. Retorna (nomes das colunas, linhas) com os valores de
+    origem e destino lado a lado.
+    """
+    definicao = TABELAS_SINCRONIZADAS[tabela]
+    colunas_destino = _colunas_tabela(conn, 'main', tabela)
+    colunas_origem = _colunas_tabela(conn, esquema_origem, tabela)
+    chave = definicao['chave']
+    valores = [c for c in definicao['colunas']
+               if c in colunas_destino and c in colunas_origem
+               and c not in chave and c not in COLUNAS_SEM_CONFLITO]
+    if not valores:
+        return [], []
+
+    selecao = [f"o.{c}" for c in chave]
+    selecao += [f"o.{c} AS {c}_origem, d.{c} AS {c}_destino" for c in valores]
+    cursor = conn.execute(f"""
+        SELECT {", ".join(selecao)}
+        FROM {esquema_origem}.{tabela} o
+        JOIN main.{tabela} d ON {_condicao(chave)}
+        WHERE NOT ({_condicao(valores)})
+        LIMIT ?""", (limite,))
+    return [descricao[0] for descricao in cursor.description], cursor.fetchall()
+
+
+def _ultimo_seq_origem(conn, tabela, esquema_origem='origem'):
+    # sqlite_sequence guarda o maior seq já usado, mesmo depois de limpar o registro
+    linha = conn.execute(f"SELECT seq FROM {esquema_origem}.sqlite_sequence WHERE name = ?",
+                         (tabela_alteracoes(tabela),)).fetchone()
+    return linha[0] if linha else 0
+
+
+def ler_marca(conn, origem, tabela):
+    """
+    Último seq do registro de alterações da origem já aplicado no destino, ou None.
+    """
+    linha = conn.execute("SELECT ultimo_seq FROM main.controle_sincronizacao WHERE origem = ? AND tabela = ?",
+                         (origem, tabela)).fetchone()
+    return linha[0] if linha else None
+
+
+def gravar_marca(conn, origem, tabela, ultimo_seq):
+    conn.execute("""INSERT INTO main.controle_sincronizacao (origem, tabela, ultimo_seq, atualizado_em)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (origem, tabela)
+                    DO UPDATE SET ultimo_seq = excluded.ultimo_seq, atualizado_em = excluded.atualizado_em""",
+                 (origem, tabela, ultimo_seq))
+
+
+def aplicar_alteracoes(conn, tabela, desde_seq, esquema_origem='origem'):
+    """
+    Aplica no destino, em ordem, as alterações da origem com seq > desde_seq:
+    - 'I': insere a linha (ignorada se a chave já existir);
+    - 'U': atualiza a linha do destino com a chave antiga (ou insere, se não existir);
+    - 'D': apaga a linha do destino com a chave antiga.
+    Não controla transação.
+    Retorna (último seq aplicado, contagens).
+    """
+    definicao = TABELAS_SINCRONIZADAS[tabela]
+    colunas_destino = _colunas_tabela(conn, 'main', tabela)
+    colunas = [c for c in definicao['colunas'] if c in colunas_destino]
+    chave = definicao['chave']
+    valores = [c for c in colunas if c not in chave and c not in COLUNAS_SEM_CONFLITO]
+
+    lista_colunas = ", ".join(colunas)
+    inserir = (f"INSERT OR IGNORE INTO main.{tabela} ({lista_colunas}) "
+               f"VALUES ({', '.join('?' for _ in colunas)})")
+    atualizar = (f"UPDATE OR IGNORE main.{tabela} SET {', '.join(f'{c} = ?' for c in colunas)} "
+                 f"WHERE {' AND '.join(f'{c} IS ?' for c in chave)}")
+    apagar = f"DELETE FROM main.{tabela} WHERE {' AND '.join(f'{c} IS ?' for c in chave)}"
+    mesma_chave = f"SELECT {', '.join(valores) or '1'} FROM main.{tabela} WHERE {' AND '.join(f'{c} IS ?' for c in chave)}"
+
+    contagens = {'alteracoes': 0, 'inseridos': 0, 'atualizados': 0, 'removidos': 0,
+                 'ignorados': 0, 'conflitos': 0}
+    ultimo_seq = desde_seq
+    cursor = conn.execute(f"""
+        SELECT seq, operacao, {", ".join(colunas)}, {", ".join(f"antigo_{c}" for c in chave)}
+        FROM {esquema_origem}.{tabela_alteracoes(tabela)}
+        WHERE seq > ?
+        ORDER BY seq""", (desde_seq,))
+    for linha in cursor.fetchall():
+        seq, operacao = linha[0], linha[1]
+        novos = dict(zip(colunas, linha[2:2 + len(colunas)]))
+        antiga = list(linha[2 + len(colunas):])
+        ultimo_seq = seq
+        contagens['alteracoes'] += 1
+
+        if operacao == 'D':
+            contagens['removidos'] += conn.execute(apagar, antiga).rowcount
+            continue
+
+        if operacao == 'U' and conn.execute(atualizar, [novos[c] for c in colunas] + antiga).rowcount:
+            contagens['atualizados'] += 1
+            continue
+
+        if conn.execute(inserir, [novos[c] for c in colunas]).rowcount:
+            contagens['inseridos'] += 1
+            continue
+
+        # A chave nova já existe no destino: igual (ignorada) ou com valores diferentes (conflito)
+        existente = conn.execute(mesma_chave, [novos[c] for c in chave]).fetchone()
+        if existente is not None and list(existente) != [novos[c] for c in valores] and valores:
+            contagens['conflitos'] += 1
+        else:
+            contagens['ignorados'] += 1
+
+    return ultimo_seq, contagens
+
+
+def sincronizar_tabela_incremental(conn, tabela, origem, esquema_origem='origem'):
+    """
+    Sincroniza a tabela pelo registro de alterações: aplica só o que mudou
+    desde a marca d'água gravada no destino. Sem marca (primeira vez) ou com a
+    origem recriada (seq menor que a marca), faz a cópia completa por chave
+    natural e grava a marca. A origem não é alterada: as alterações aplicadas
+    são limpas depois, por limpar_alteracoes_aplicadas.
+    Não controla transação.
+    """
+    ultimo_seq = _ultimo_seq_origem(conn, tabela, esquema_origem)
+    marca = ler_marca(conn, origem, tabela)
+
+    if marca is None or marca > ultimo_seq:
+        resultado = sincronizar_tabela(conn, tabela, esquema_origem)
+        resultado.update({'modo': 'completa', 'alteracoes': None, 'atualizados': 0, 'removidos': 0})
+        marca_nova = ultimo_seq
+    else:
+        marca_nova, resultado = aplicar_alteracoes(conn, tabela, marca, esquema_origem)
+        resultado['modo'] = 'incremental'
+        resultado['origem'] = None
+
+    gravar_marca(conn, origem, tabela, marca_nova)
+    return resultado
+
+
+def limpar_alteracoes_aplicadas(conn, tabela, origem, esquema_origem='origem'):
+    """
+    Apaga do registro de alterações da origem o que já foi aplicado no
+    destino: seq até a marca d'água lida do destino (já confirmada).
+    Deve rodar em uma transação separada, depois do COMMIT do destino: uma
+    transação entre bancos anexados não é atômica em modo WAL, e apagar na
+    mesma transação poderia perder alterações que não chegaram ao destino.
+    Retorna o número de alterações apagadas.
+    """
+    marca = ler_marca(conn, origem, tabela)
+    if marca is None:
+        return 0
+    return conn.execute(f"DELETE FROM {esquema_origem}.{tabela_alteracoes(tabela)} WHERE seq <= ?",
+                        (marca,)).rowcount
+
+
+def sincronizar_bancos(caminho_origem=BANCO_PRINCIPAL, caminho_destino=BANCO_COMPLETO, tabelas=None,
+                       conflitos_por_tabela=0, incremental=True):
+    """
+    Sincroniza as tabelas (todas de TABELAS_SINCRONIZADAS, se None) do banco de
+    origem para o de destino, anexando a origem à conexão do destino, com
+    todas as tabelas do destino em uma única transação:
+    - incremental=True: aplica só as alterações registradas desde a última
+      sincronização (sincronizar_tabela_incremental); depois do COMMIT, as
+      alterações aplicadas são apagadas da origem em outra transação;
+    - incremental=False: um INSERT ... SELECT por tabela sobre a chave natural.
+    Com conflitos_por_tabela > 0, inclui no resultado de cada tabela a amostra
+    de conflitos ('colunas_conflito' e 'amostra_conflitos').
+    Retorna {tabela: resultado}.
+    """
+    if not os.path.exists(caminho_origem):
+        raise FileNotFoundError(f"Banco de dados de origem não encontrado: {caminho_origem}")
+
+    # Garante na origem as migrações (chaves, índices e registro de alterações) antes de anexá-la
+    obter_conexao(caminho_origem).close()
+    origem = os.path.basename(caminho_origem)
+
+    resultados = {}
+    conn = obter_conexao(caminho_destino, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS origem", (os.path.abspath(caminho_origem),))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for tabela in tabelas or TABELAS_SINCRONIZADAS:
+                if incremental:
+                    resultados[tabela] = sincronizar_tabela_incremental(conn, tabela, origem)
+                else:
+                    resultados[tabela] = sincronizar_tabela(conn, tabela)
+                    resultados[tabela]['modo'] = 'completa'
+                if conflitos_por_tabela and resultados[tabela]['conflitos']:
+                    colunas, linhas = listar_conflitos(conn, tabela, limite=conflitos_por_tabela)
+                    resultados[tabela]['colunas_conflito'] = colunas
+                    resultados[tabela]['amostra_conflitos'] = linhas
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        
+        if incremental:
+            # Só depois do destino confirmado; se falhar, a próxima sincronização limpa
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for tabela in tabelas or TABELAS_SINCRONIZADAS:
+                    limpar_alteracoes_aplicadas(conn, tabela, origem)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    return resultados
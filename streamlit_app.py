@@ -1,60 +1,68 @@
 import streamlit as st
 import os
 import pandas as pd
-from datetime import datetime
 import sqlite3
-
-def transform_tipo(tipo):
-    tipo = tipo.upper()
-    mapeamento = {
-        "EM": "CELULA EMERGENCIAL",
-        "IC": "INCLINOMETRO",
-        "LV": "LEVANTAMENTO TOPOGRÁFICO",
-        "PA": "PAMPULHA",
-        "PE": "CELULA DE PESQUISA"
-    }
-    
-    for prefixo, valor in mapeamento.items():
-        if tipo.startswith(prefixo):
-            return valor
-    return tipo
+import threading
+from conexao_banco import BANCO_COMPLETO, BANCO_PRINCIPAL, obter_conexao
+from exportacao_tabelas import exportar_tabela, ler_exportacao
+from migracoes import contar_linhas_isoladas
+from registro_arquivos import (
+    abrir_conexao_registro,
+    inferir_registro,
+    iniciar_observador,
+    registrar_arquivos,
+    sincronizar_pasta,
+)
 
 def init_db():
-    conn = sqlite3.connect('arquivos.db')
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS arquivos
-                 (nome_arquivo TEXT PRIMARY KEY, 
-                  tipo TEXT, 
-                  dia INTEGER, 
-                  mes INTEGER, 
-                  ano INTEGER,
-                  registros INTEGER)''')
-    conn.commit()
+    # Abre o banco uma vez: as migrações criam/atualizam a tabela 'arquivos'
+    conn = abrir_conexao_registro()
     conn.close()
 
-def verificar_arquivo_existente(nome_arquivo):
-    conn = sqlite3.connect('arquivos.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM arquivos WHERE nome_arquivo = ?", (nome_arquivo,))
-    resultado = c.fetchone()
-    conn.close()
-    return resultado is not None
+def avisar_linhas_isoladas():
+    # Linhas repetidas que as migrações tiraram das tabelas de leituras ao criar as chaves únicas
+    for caminho in (BANCO_PRINCIPAL, BANCO_COMPLETO):
+        if not os.path.exists(caminho):
+            continue
+        conn = obter_conexao(caminho)
+        try:
+            isoladas = contar_linhas_isoladas(conn)
+        finally:
+            conn.close()
+        for tabela, quantidade in isoladas.items():
+            st.warning(f"{quantidade} linha(s) repetidas foram movidas para a tabela {tabela} do banco "
+                       f"{caminho} ao criar as chaves únicas. Confira-as antes de apagar a tabela.")
+
+@st.cache_resource
+def iniciar_monitoramento(pasta):
+    # Um único observador por processo: registra e grava os TXT novos ou alterados
+    return iniciar_observador(pasta)
 
-def salvar_arquivo_db(dados):
-    conn = sqlite3.connect('arquivos.db')
-    c = conn.cursor()
+# Colunas do registro de arquivos e os nomes exibidos na tela e no CSV
+ROTULOS_ARQUIVOS = {
+    'nome_arquivo': 'Nome do Arquivo',
+    'tipo': 'Tipo de Informação',
+    'dia': 'Dia',
+    'mes': 'Mês',
+    'ano': 'Ano',
+    'registros': 'Número de Registros'
+}
+
+def exportar_arquivos_csv():
+    # Gerado só no clique do download, lendo o banco em lotes
+    conn = abrir_conexao_registro()
     try:
-        c.execute("""INSERT INTO arquivos (nome_arquivo, tipo, dia, mes, ano, registros) 
-                     VALUES (?, ?, ?, ?, ?, ?)""", dados)
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+        caminho, _, _ = exportar_tabela(conn, 'arquivos', colunas=list(ROTULOS_ARQUIVOS),
+                                        cabecalhos=ROTULOS_ARQUIVOS)
     finally:
         conn.close()
+    try:
+        return ler_exportacao(caminho)
+    finally:
+        os.remove(caminho)
 
 def buscar_arquivos_db():
-    conn = sqlite3.connect('arquivos.db')
+    conn = abrir_conexao_registro()
     try:
         df = pd.read_sql_query("""
             SELECT nome_arquivo, tipo, dia, mes, ano, registros 
@@ -87,6 +95,33 @@ except Exception as e:
 
 # Inicializa o banco de dados
 init_db()
+avisar_linhas_isoladas()
+
+# Registra os arquivos novos ou alterados (arquivos inalterados não são lidos)
+observer, monitor = iniciar_monitoramento(folder_path)
+conn_registro = abrir_conexao_registro()
+try:
+    resumo = sincronizar_pasta(conn_registro, folder_path)
+finally:
+    conn_registro.close()
+
+if resumo['novos'] or resumo['alterados']:
+    # Grava em segundo plano os arquivos que chegaram com o app parado
+    threading.Thread(target=monitor.processar, daemon=True).start()
+    st.info(f"Arquivos registrados automaticamente: {', '.join(resumo['novos'] + resumo['alterados'])}")
+if resumo['duplicados']:
+    st.warning(f"Arquivos com conteúdo idêntico a outro já registrado (ignorados): {', '.join(resumo['duplicados'])}")
+if monitor.ultimo_erro:
+    st.error(f"Erro no processamento automático: {monitor.ultimo_erro}")
+conn_registro = abrir_conexao_registro()
+try:
+    arquivos_com_erro = [nome for nome, in conn_registro.execute(
+        "SELECT nome_arquivo FROM arquivos WHERE processamento = 'erro'")]
+finally:
+    conn_registro.close()
+if arquivos_com_erro:
+    st.warning(f"Arquivos que falharam no processamento automático (grave-os de novo na página 3): "
+               f"{', '.join(arquivos_com_erro)}")
 
 # Busca arquivos já processados
 df_existentes = buscar_arquivos_db()
@@ -95,7 +130,7 @@ arquivos_processados = df_existentes['nome_arquivo'].tolist() if not df_existent
 # Debug: Exibe informações na tela
 st.write("DEBUG: Arquivos listados na pasta:", filenames)
 st.write("DEBUG: Arquivos já processados no banco:", arquivos_processados)
-nao_reconhecidos = [f for f in filenames if "_" not in f]
+nao_reconhecidos = resumo['pendentes']
 if nao_reconhecidos:
     st.write("DEBUG: Arquivos não reconhecidos:", nao_reconhecidos)
 
@@ -108,151 +143,113 @@ if not arquivos_para_processar:
     st.write("### Arquivos Processados")
     
     # Renomeia as colunas para exibição
-    df_exibicao = df_existentes.rename(columns={
-        'nome_arquivo': 'Nome do Arquivo',
-        'tipo': 'Tipo de Informação',
-        'dia': 'Dia',
-        'mes': 'Mês',
-        'ano': 'Ano',
-        'registros': 'Número de Registros'
-    })
+    df_exibicao = df_existentes.rename(columns=ROTULOS_ARQUIVOS)
     
     st.dataframe(df_exibicao)
     
-    # Opção para download
-    csv = df_exibicao.to_csv(index=False).encode('utf-8')
+    # Opção para download (CSV gerado em lotes a partir do banco, no clique)
     st.download_button(
         "Download CSV",
-        csv,
+        exportar_arquivos_csv,
         "dados_processados.csv",
         "text/csv",
         key='download-csv'
     )
     st.stop()
 
-# Se houver arquivos para processar, mostra o formulário apenas para eles
+# Se houver arquivos para processar, mostra a grade de confirmação apenas para eles
 st.write(f"### {len(arquivos_para_processar)} arquivo(s) para processar")
+st.caption("Tipo e data foram sugeridos pelo nome do arquivo (ou pela linha de cabeçalho 'M'). "
+           "Confira, corrija o que for necessário e confirme todos de uma vez.")
+
+tipos_disponiveis = [
+    "CELULA EMERGENCIAL",
+    "INCLINOMETRO",
+    "LEVANTAMENTO TOPOGRÁFICO",
+    "PAMPULHA",
+    "CELULA DE PESQUISA"
+]
+
+# Monta as sugestões (contagem de linhas em cache por tamanho/mtime do arquivo)
+sugestoes = []
+for filename in arquivos_para_processar:
+    try:
+        sugestao = inferir_registro(folder_path, filename)
+    except Exception as e:
+        st.error(f"Erro ao ler o arquivo {filename}: {str(e)}")
+        continue
+    sugestoes.append({
+        "confirmar": bool(sugestao["tipo"] and sugestao["data"]),
+        "nome_arquivo": filename,
+        "tipo": sugestao["tipo"],
+        "data": sugestao["data"],
+        "origem_data": sugestao["origem_data"] or "não encontrada",
+        "registros": sugestao["registros"],
+    })
 
-# Criar um formulário para entrada de dados
 with st.form("dados_arquivos"):
-    data = []
-    
-    for filename in arquivos_para_processar:
-        st.write(f"#### Arquivo: {filename}")
-        
-        # Extrai o tipo do arquivo
-        tipo = filename.split("_")[0] if "_" in filename else "Desconhecido"
-        tipo_formatado = transform_tipo(tipo)
-        
-        # Adicionar select box para confirmar tipo
-        tipos_disponiveis = [
-            "CELULA EMERGENCIAL",
-            "INCLINOMETRO",
-            "LEVANTAMENTO TOPOGRÁFICO",
-            "PAMPULHA",
-            "CELULA DE PESQUISA"
-        ]
-        tipo_confirmado = st.selectbox(
-            "Confirmar tipo de arquivo",
-            tipos_disponiveis,
-            index=tipos_disponiveis.index(tipo_formatado) if tipo_formatado in tipos_disponiveis else 0,
-            key=f"tipo_{filename}"
-        )
-        
-        # Cria colunas para input de data
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            dia = st.text_input(
-                "Dia",
-                key=f"dia_{filename}",
-                placeholder="DD",
-                help="Digite o dia (01-31)"
-            )
-        
-        with col2:
-            mes = st.text_input(
-                "Mês",
-                key=f"mes_{filename}",
-                placeholder="MM",
-                help="Digite o mês (01-12)"
-            )
-        
-        with col3:
-            ano = st.text_input(
-                "Ano",
-                key=f"ano_{filename}",
-                placeholder="AAAA",
-                help="Digite o ano (ex: 2024)"
-            )
-        
-        # Lê o número de registros do arquivo
-        filepath = os.path.join(folder_path, filename)
-        try:
-            with open(filepath, 'r', encoding="latin-1") as f:
-                num_registros = len(f.readlines())
-        except Exception as e:
-            st.error(f"Erro ao ler o arquivo {filename}: {str(e)}")
-            num_registros = 0
-        
-        # Armazena os dados temporariamente
-        data.append({
-            "filename": filename,
-            "tipo": tipo_confirmado,
-            "dia": dia,
-            "mes": mes,
-            "ano": ano,
-            "registros": num_registros
-        })
-        
-        st.divider()
+    grade = st.data_editor(
+        pd.DataFrame(sugestoes),
+        column_config={
+            "confirmar": st.column_config.CheckboxColumn("Confirmar"),
+            "nome_arquivo": st.column_config.TextColumn("Nome do Arquivo", disabled=True),
+            "tipo": st.column_config.SelectboxColumn("Tipo de Informação", options=tipos_disponiveis),
+            "data": st.column_config.DateColumn("Data", format="DD/MM/YYYY"),
+            "origem_data": st.column_config.TextColumn("Data obtida de", disabled=True),
+            "registros": st.column_config.NumberColumn("Número de Registros", disabled=True),
+        },
+        hide_index=True,
+        use_container_width=True,
+        key="grade_arquivos"
+    )
     
-    # Botão para processar todos os arquivos
+    # Botão para registrar todos os arquivos confirmados
     submitted = st.form_submit_button("Processar Arquivos")
 
-# Processa os dados quando o formulário for submetido
+# Registra os arquivos quando o formulário for submetido
 if submitted:
-    # Inicializa o banco de dados
-    init_db()
+    confirmados = grade[grade["confirmar"]]
+    incompletos = confirmados[confirmados["tipo"].isna() | confirmados["data"].isna()]
+    for filename in incompletos["nome_arquivo"]:
+        st.warning(f"Tipo ou data incompleta para o arquivo {filename}")
     
-    processed_data = []
-    saving_status = []
+    itens = [
+        {
+            "nome_arquivo": linha.nome_arquivo,
+            "tipo": linha.tipo,
+            "data": pd.Timestamp(linha.data).date(),
+            "registros": int(linha.registros),
+        }
+        for linha in confirmados.drop(incompletos.index).itertuples(index=False)
+    ]
     
-    for item in data:
+    if itens:
+        # Um único commit para todos os arquivos confirmados
+        conn_registro = abrir_conexao_registro()
         try:
-            # Valida a data
-            if item["dia"] and item["mes"] and item["ano"]:
-                date_str = f"{item['dia']}/{item['mes']}/{item['ano']}"
-                datetime.strptime(date_str, '%d/%m/%Y')  # Valida a data
-                
-                dados_arquivo = [
-                    item["filename"],
-                    item["tipo"],
-                    int(item["dia"]),
-                    int(item["mes"]),
-                    int(item["ano"]),
-                    item["registros"]
-                ]
-                
-                # Verifica se o arquivo já existe no banco
-                if not verificar_arquivo_existente(item["filename"]):
-                    if salvar_arquivo_db(dados_arquivo):
-                        saving_status.append(f"✅ Arquivo {item['filename']} salvo com sucesso!")
-                    else:
-                        saving_status.append(f"❌ Erro ao salvar {item['filename']}")
-                else:
-                    saving_status.append(f"⚠️ Arquivo {item['filename']} já existe no banco")
-                
-                processed_data.append(dados_arquivo)
+            situacoes = registrar_arquivos(conn_registro, itens, folder_path)
+        except Exception as e:
+            st.error(f"Erro ao salvar os arquivos no banco: {str(e)}")
+            situacoes = {}
+        finally:
+            conn_registro.close()
+        
+        saving_status = []
+        for nome, situacao in situacoes.items():
+            if situacao == 'duplicado':
+                saving_status.append(f"⚠️ Arquivo {nome} tem conteúdo idêntico a outro já registrado e não será processado")
+            elif situacao == 'existente':
+                saving_status.append(f"⚠️ Arquivo {nome} já existe no banco")
             else:
-                st.warning(f"Data incompleta para o arquivo {item['filename']}")
-        except ValueError:
-            st.error(f"Data inválida para o arquivo {item['filename']}")
-    
-    if processed_data:
-        # Cria e exibe o DataFrame
+                saving_status.append(f"✅ Arquivo {nome} salvo com sucesso!")
+        
+        if 'nao_processado' in situacoes.values():
+            # Grava em segundo plano as leituras dos arquivos recém-registrados
+            threading.Thread(target=monitor.processar, daemon=True).start()
+        
         df = pd.DataFrame(
-            processed_data,
+            [[item["nome_arquivo"], item["tipo"], item["data"].day, item["data"].month,
+              item["data"].year, item["registros"]] for item in itens],
             columns=["Nome do Arquivo", "Tipo de Informação", "Dia", "Mês", "Ano", "Número de Registros"]
         )
         st.write("### Resultado do Processamento")
@@ -272,5 +269,3 @@ if submitted:
         st.write("### Status do Salvamento no Banco de Dados")
         for status in saving_status:
             st.write(status)
-
-
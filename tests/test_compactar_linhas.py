@@ -0,0 +1,61 @@
+import importlib.util
+import os
+
+from openpyxl import Workbook, load_workbook
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_spec = importlib.util.spec_from_file_location(
+    "pagina_5", os.path.join(RAIZ, "pages", "5 - Verifica_registro_duplicado.py"))
+pagina_5 = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(pagina_5)
+
+
+def _planilha(linhas=12):
+    wb = Workbook()
+    ws = wb.active
+    for row in range(1, linhas + 1):
+        ws.cell(row, 1).value = f"A{row}"
+    return wb, ws
+
+
+def _faixas(ws):
+    return sorted(str(faixa) for faixa in ws.merged_cells.ranges)
+
+
+def test_mesclagens_abaixo_das_linhas_removidas_sao_deslocadas():
+    wb, ws = _planilha()
+    ws.merge_cells("B3:C6")
+    ws.merge_cells("B8:B9")
+    ws.merge_cells("D10:E11")
+
+    assert pagina_5.compactar_linhas(ws, [3, 4, 7]) == 3
+
+    assert _faixas(ws) == ["B3:C4", "B5:B6", "D7:E8"]
+    assert [ws.cell(row, 1).value for row in range(1, 10)] == [
+        "A1", "A2", "A5", "A6", "A8", "A9", "A10", "A11", "A12"]
+
+
+def test_mesclagens_sobrevivem_ao_salvar(tmp_path):
+    wb, ws = _planilha()
+    ws.merge_cells("B2:B3")
+    ws.merge_cells("C5:D6")
+    ws.merge_cells("B8:B9")
+    ws["C5"] = "mesclada"
+
+    pagina_5.compactar_linhas(ws, [1, 4, 7])
+    caminho = tmp_path / "compactada.xlsx"
+    wb.save(caminho)
+
+    ws = load_workbook(caminho).active
+    assert _faixas(ws) == ["B1:B2", "B5:B6", "C3:D4"]
+    assert ws["C3"].value == "mesclada"
+
+
+def test_mesclagem_sem_linhas_mantidas_e_desfeita():
+    wb, ws = _planilha()
+    ws.merge_cells("B3:B4")
+    ws.merge_cells("B6:C7")
+
+    pagina_5.compactar_linhas(ws, [3, 4])
+
+    assert _faixas(ws) == ["B4:C5"]